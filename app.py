@@ -1,11 +1,46 @@
-import gradio as gr
-from components.gradio_ui import gradio_ui
+import os
+from components.logging_config import setup_logging
 
-demo = gradio_ui()
+def create_demo():
+    """Gradioアプリを作成する
 
-# Enable queueing for better performance
-demo.queue(max_size=20, default_concurrency_limit=32)
+    PDF抽出のワーカープロセス（spawn）はこのファイルを読み込み直すため、
+    Gradioの読み込みとUIの構築はモジュールの読み込み時には行わない。
+    """
+    from components.artifact_store import start_artifact_janitor
+    from components.gradio_ui import gradio_ui
+
+    setup_logging()
+    # 一時ファイル・ジョブ・キャッシュ済みエピソードのディスク使用量をバックグラウンドで管理する
+    start_artifact_janitor()
+    demo = gradio_ui()
+
+    # Enable queueing for better performance
+    demo.queue(max_size=20, default_concurrency_limit=32)
+    return demo
+
+def main() -> None:
+    from components.metrics import metrics_asgi_app
+
+    demo = create_demo()
+    metrics_app = metrics_asgi_app()
+    if metrics_app is None:
+        demo.launch()
+    else:
+        # /metricsを公開するため、GradioをFastAPIアプリにマウントして起動する
+        import gradio as gr
+        import uvicorn
+        from fastapi import FastAPI
+
+        app = FastAPI()
+        app.mount("/metrics", metrics_app)
+        app = gr.mount_gradio_app(app, demo, path="/")
+        uvicorn.run(
+            app,
+            host=os.getenv("GRADIO_SERVER_NAME", "127.0.0.1"),
+            port=int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+        )
 
 # Launch the Gradio app
 if __name__ == "__main__":
-    demo.launch()
+    main()
@@ -0,0 +1,182 @@
+"""
+スタンドインサーバーを使ったエンドツーエンドのベンチマーク
+
+process_feedback_and_regenerate をスタンドインサーバーに対して実行し、ステージごとの
+レイテンシ、セグメント数ごとのスループット、ピークメモリを計測する。実際のAPIは呼ばない。
+
+使い方:
+    python -m benchmarks.run_benchmark --segments 10,50,200 --repeat 3
+    DIALOGUE_STREAMING=true AUDIO_ASSEMBLY_MODE=stream_copy python -m benchmarks.run_benchmark --output bench.json
+
+ステージのレイテンシはサーバー側で記録したリクエストの時刻から求める。
+    prepare  : 開始から最初のLLMリクエストまで（テキスト抽出・分割）
+    dialogue : 最初のLLMリクエストから最後のLLMレスポンスまで
+    tts      : 最初の音声リクエストから最後の音声レスポンスまで
+    assemble : 最後の音声レスポンスから完了まで（結合・後処理）
+音声の結合にはFFmpegが必要。
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+from .stub_server import StubConfig, StubServer, start_stub_server
+
+def _stage_latencies(events: List[Dict[str, Any]], started: float, finished: float) -> Dict[str, float]:
+    """サーバーのイベントからステージごとのレイテンシを求める"""
+    chat = [e for e in events if e["kind"] == "chat"]
+    speech = [e for e in events if e["kind"] == "speech"]
+    stages = {"total": finished - started}
+    if chat:
+        stages["prepare"] = min(e["started"] for e in chat) - started
+        stages["dialogue"] = max(e["finished"] for e in chat) - min(e["started"] for e in chat)
+    if speech:
+        stages["tts"] = max(e["finished"] for e in speech) - min(e["started"] for e in speech)
+        stages["assemble"] = finished - max(e["finished"] for e in speech)
+    return {name: round(seconds, 3) for name, seconds in stages.items()}
+
+def run_once(server: StubServer, generate, input_file: str, jobs_dir: str, segments: int) -> Dict[str, Any]:
+    """1回分の生成を実行して計測結果を返す"""
+    from components.instruction_templates import get_template
+
+    template = get_template("podcast")
+    server.config.dialogue_lines = segments
+    server.reset_events()
+
+    tracemalloc.start()
+    started = time.monotonic()
+    audio, transcript, _, error = generate(
+        [input_file], "stub-llm", "stub-tts", "alloy", "echo", "podcast",
+        "stub", server.base_url, server.base_url, "stub", server.base_url,
+        template["intro"], template["text_instructions"], template["scratch_pad"],
+        template["prelude"], template["dialog"], "", ""
+    )
+    finished = time.monotonic()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    events = server.reset_events()
+    speech_ok = sum(1 for e in events if e["kind"] == "speech" and e["status"] == 200)
+    stages = _stage_latencies(events, started, finished)
+    audio_bytes = os.path.getsize(audio) if audio else 0
+
+    # 次の実行でチェックポイントが再利用されないように削除する
+    shutil.rmtree(jobs_dir, ignore_errors=True)
+
+    return {
+        "segments": segments,
+        "ok": error is None and audio is not None,
+        "error": error.splitlines()[0] if error else None,
+        "stages": stages,
+        "tts_requests": speech_ok,
+        "injected_errors": sum(1 for e in events if e["status"] != 200),
+        "segments_per_second": round(speech_ok / stages["tts"], 2) if stages.get("tts") else None,
+        "python_peak_mb": round(peak / 1024 / 1024, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "audio_bytes": audio_bytes,
+    }
+
+def _print_summary(results: List[Dict[str, Any]]) -> None:
+    print(f"{'segments':>8} {'runs':>4} {'total':>8} {'prepare':>8} {'dialogue':>9} {'tts':>8} {'assemble':>9} {'seg/s':>7} {'peakMB':>7} {'failed':>6}")
+    for segments in sorted({r["segments"] for r in results}):
+        runs = [r for r in results if r["segments"] == segments]
+        ok = [r for r in runs if r["ok"]] or runs
+
+        def median(key: str, ok: List[Dict[str, Any]] = ok) -> str:
+            values = [r["stages"][key] for r in ok if key in r["stages"]]
+            return f"{statistics.median(values):.2f}" if values else "-"
+
+        throughput = [r["segments_per_second"] for r in ok if r["segments_per_second"]]
+        print(
+            f"{segments:>8} {len(runs):>4} {median('total'):>8} {median('prepare'):>8} {median('dialogue'):>9} "
+            f"{median('tts'):>8} {median('assemble'):>9} "
+            f"{(f'{statistics.median(throughput):.1f}' if throughput else '-'):>7} "
+            f"{max(r['python_peak_mb'] for r in runs):>7} {sum(1 for r in runs if not r['ok']):>6}"
+        )
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="スタンドインサーバーを使ったエンドツーエンドのベンチマーク")
+    parser.add_argument("--input", default=None, help="入力文書（省略時は合成したテキスト）")
+    parser.add_argument("--input-chars", type=int, default=20000, help="合成する入力テキストの文字数")
+    parser.add_argument("--segments", default="10,50,200", help="対話の行数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=3, help="各行数での実行回数")
+    parser.add_argument("--chat-latency", type=float, default=1.0)
+    parser.add_argument("--chat-latency-per-token", type=float, default=0.0005)
+    parser.add_argument("--speech-latency", type=float, default=0.3)
+    parser.add_argument("--speech-latency-per-char", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="対話を途中で打ち切って返す確率")
+    parser.add_argument("--recordings", default=None, help="記録済みのレスポンスのディレクトリ")
+    parser.add_argument("--replay-debug-logs", action="store_true", help="debug_logs/の対話を再生する（--segmentsは無視される）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pdf2audio-bench-")
+    jobs_dir = os.path.join(workdir, "jobs")
+    # 再生するのは実際の生成で保存された対話。ベンチマーク中の対話はリポジトリのdebug_logs/を
+    # 変更しないように作業ディレクトリに保存する（debug_storeを読み込む前に設定する）
+    debug_logs_dir = os.getenv("DEBUG_LOG_DIR", "debug_logs")
+    os.environ["DEBUG_LOG_DIR"] = os.path.join(workdir, "debug_logs")
+    server = start_stub_server(StubConfig(
+        chat_latency=args.chat_latency,
+        chat_latency_per_token=args.chat_latency_per_token,
+        speech_latency=args.speech_latency,
+        speech_latency_per_char=args.speech_latency_per_char,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        truncate_rate=args.truncate_rate,
+        seed=args.seed
+    ), recordings_dir=args.recordings, debug_logs_dir=debug_logs_dir if args.replay_debug_logs else None)
+
+    # 各モジュールは読み込み時に環境変数を参照するため、読み込む前に設定する
+    os.environ.update({
+        "LLM_API_BASE": server.base_url,
+        "TTS_API_BASE": server.base_url,
+        "LLM_API_KEY": "stub",
+        "TTS_API_KEY": "stub",
+        "PIPELINE_JOBS_DIR": jobs_dir,
+        "TTS_CACHE_ENABLED": "false",
+        "EXTRACTION_CACHE_ENABLED": "false",
+        "EPISODE_CACHE_ENABLED": "false",
+    })
+    from components.api_clients import get_llm_client, get_tts_client
+    from components.feedback_processing import process_feedback_and_regenerate
+
+    # openaiは最初のクライアント作成時に読み込まれるため、計測前に作成しておく
+    get_llm_client()
+    get_tts_client()
+
+    input_file = args.input
+    if input_file is None:
+        input_file = os.path.join(workdir, "input.txt")
+        paragraph = "これはベンチマーク用の入力テキストです。パイプラインの性能を計測します。\n\n"
+        with open(input_file, "w", encoding="utf-8") as f:
+            f.write((paragraph * (args.input_chars // len(paragraph) + 1))[:args.input_chars])
+
+    results = []
+    try:
+        for segments in [int(s) for s in args.segments.split(",") if s.strip()]:
+            for _ in range(args.repeat):
+                result = run_once(server, process_feedback_and_regenerate, input_file, jobs_dir, segments)
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    _print_summary(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    return 0 if all(r["ok"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+プロセスの起動時間のベンチマーク
+
+UI・ジョブワーカー・CLIなどの入口となるモジュールを新しいPythonプロセスで読み込み、
+読み込み時間・プロセス全体の時間・最大RSS・読み込まれた重い依存関係を計測する。
+レプリカやワーカーを増やしたときのコールドスタートの確認に使用する。
+
+使い方:
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --targets pipeline,batch --repeat 10 --output startup.json
+
+計測対象:
+    pipeline  : components.pipeline の読み込み
+    jobs      : components.jobs の読み込み（バックグラウンドジョブのワーカー）
+    batch     : components.batch の読み込み（一括変換CLI）
+    ui_import : components.gradio_ui の読み込み
+    ui_build  : app.create_demo() によるUIの構築（起動はしない）
+    templates : 全テンプレートの初回読み込みと2回目以降（更新日時の確認のみ）の読み込み
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 読み込まれているかを確認する重い依存関係
+HEAVY_MODULES = ("gradio", "openai", "pypdf", "prometheus_client", "fastapi", "uvicorn")
+
+TARGETS = {
+    "pipeline": "import components.pipeline",
+    "jobs": "import components.jobs",
+    "batch": "import components.batch",
+    "ui_import": "import components.gradio_ui",
+    "ui_build": "import app; app.create_demo()",
+    "templates": (
+        "from components.instruction_templates import get_template, template_names\n"
+        "cold_started = time.perf_counter()\n"
+        "for name in template_names(): get_template(name)\n"
+        "extra['templates_cold_ms'] = round((time.perf_counter() - cold_started) * 1000, 2)\n"
+        "warm_started = time.perf_counter()\n"
+        "for name in template_names(): get_template(name)\n"
+        "extra['templates_warm_ms'] = round((time.perf_counter() - warm_started) * 1000, 2)"
+    ),
+}
+
+_CHILD = """
+import json, resource, sys, time
+extra = {{}}
+started = time.perf_counter()
+{code}
+seconds = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": seconds,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "extra": extra,
+}}))
+"""
+
+def run_once(target: str, env: Dict[str, str]) -> Dict[str, Any]:
+    """新しいプロセスで1回分の起動を計測する"""
+    code = _CHILD.format(code=TARGETS[target], heavy=HEAVY_MODULES)
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT_DIR, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        error = (completed.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return {"target": target, "ok": False, "error": error, "wall_seconds": round(wall, 3)}
+    # 読み込み中のログなどが標準出力に出る場合があるため、最後の行を結果とする
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {
+        "target": target,
+        "ok": True,
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(result["seconds"], 3),
+        "modules": result["modules"],
+        "heavy": result["heavy"],
+        "max_rss_mb": result["max_rss_mb"],
+        **result["extra"],
+    }
+
+def _print_summary(results: List[Dict[str, Any]], targets: List[str]) -> None:
+    print(f"{'target':>10} {'runs':>4} {'wall':>7} {'import':>7} {'modules':>7} {'rssMB':>7} {'failed':>6}  heavy")
+    for target in targets:
+        runs = [r for r in results if r["target"] == target]
+        ok = [r for r in runs if r["ok"]]
+
+        def median(key: str, spec: str = ".3f", ok: List[Dict[str, Any]] = ok) -> str:
+            values = [r[key] for r in ok if key in r]
+            return format(statistics.median(values), spec) if values else "-"
+
+        heavy = ",".join(ok[0]["heavy"]) if ok else "-"
+        print(
+            f"{target:>10} {len(runs):>4} {median('wall_seconds'):>7} {median('import_seconds'):>7} "
+            f"{median('modules', '.0f'):>7} {median('max_rss_mb', '.1f'):>7} {len(runs) - len(ok):>6}  {heavy or '-'}"
+        )
+        if ok and "templates_cold_ms" in ok[0]:
+            print(f"{'':>10} テンプレート: 初回 {median('templates_cold_ms', '.2f')}ms / 2回目以降 {median('templates_warm_ms', '.2f')}ms")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="プロセスの起動時間のベンチマーク")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"計測対象（カンマ区切り: {', '.join(TARGETS)}）")
+    parser.add_argument("--repeat", type=int, default=5, help="各対象での実行回数")
+    parser.add_argument("--output", default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"不明な計測対象: {', '.join(unknown)}")
+
+    # UIの構築時に作成されるディレクトリやデータベースを一時ディレクトリに向ける
+    workdir = tempfile.mkdtemp(prefix="pdf2audio-startup-")
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get("PYTHONPATH")])),
+        ARTIFACT_STORE_DIR=os.path.join(workdir, "artifacts"),
+        AUDIO_TEMP_DIR=os.path.join(workdir, "tmp"),
+        PIPELINE_JOBS_DIR=os.path.join(workdir, "jobs"),
+        JOB_DB_PATH=os.path.join(workdir, "jobs.sqlite3"),
+        LOG_FILE="",
+    )
+
+    results = []
+    try:
+        for target in targets:
+            for _ in range(args.repeat):
+                result = run_once(target, env)
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    _print_summary(results, targets)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    return 0 if all(r["ok"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
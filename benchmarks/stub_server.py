@@ -0,0 +1,421 @@
+"""
+OpenAI互換のスタンドインサーバー
+
+記録済みのチャット・音声レスポンスを再生し、設定したレイテンシとエラーを注入する。
+実際のAPIを呼ばずにパイプラインの性能を計測するために使用する。
+
+使い方:
+    # debug_logs/の記録と合成した無音のMP3で応答する
+    python -m benchmarks.stub_server --port 8808 --chat-latency 2 --speech-latency 0.5 --error-rate 0.05
+
+    # 実際のAPIへ中継しながらレスポンスを記録する
+    python -m benchmarks.stub_server --record-upstream https://api.openai.com/v1 --recordings benchmarks/recordings
+
+アプリ側は LLM_API_BASE / TTS_API_BASE に http://127.0.0.1:8808/v1 を設定する。
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from loguru import logger
+
+# MPEG-1 Layer III, 128kbps, 44.1kHz, モノラルの無音フレーム（1フレーム=1152サンプル≒26ms）
+_SILENT_FRAME = b"\xff\xfb\x90\xc4" + b"\x00" * 413
+_FRAME_SECONDS = 1152 / 44100
+
+class StubConfig:
+    """スタンドインサーバーの設定（ベンチマーク中に変更できる）"""
+
+    def __init__(
+        self,
+        chat_latency: float = 1.0,
+        chat_latency_per_token: float = 0.0,
+        speech_latency: float = 0.3,
+        speech_latency_per_char: float = 0.0,
+        jitter: float = 0.1,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        retry_after: Optional[float] = 1.0,
+        dialogue_lines: int = 20,
+        line_chars: int = 60,
+        seconds_per_char: float = 0.12,
+        stream_chunk_chars: int = 8,
+        truncate_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.chat_latency = chat_latency
+        self.chat_latency_per_token = chat_latency_per_token
+        self.speech_latency = speech_latency
+        self.speech_latency_per_char = speech_latency_per_char
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.dialogue_lines = dialogue_lines
+        self.line_chars = line_chars
+        self.seconds_per_char = seconds_per_char
+        self.stream_chunk_chars = stream_chunk_chars
+        self.truncate_rate = truncate_rate
+        self.random = random.Random(seed)
+
+class Recordings:
+    """記録済みのレスポンス
+
+    recordings/chat/<リクエストのハッシュ>.json と recordings/speech/<リクエストのハッシュ>.mp3 を
+    リクエストの内容で照合する。一致しない場合は debug_logs/ の対話生成の記録、
+    それもない場合は合成したレスポンスを返す。
+    """
+
+    def __init__(self, recordings_dir: Optional[str] = None, debug_logs_dir: Optional[str] = "debug_logs"):
+        self.dir = Path(recordings_dir) if recordings_dir else None
+        self._lock = threading.Lock()
+        self._dialogues: List[str] = []
+        # components.debug_storeは読み込み時にDEBUG_LOG_DIRを参照するため、ベンチマークが設定してから読み込む
+        from components.debug_store import iter_debug_records
+        for record in iter_debug_records(debug_logs_dir, "dialogue_generation") if debug_logs_dir else []:
+            if record.get("response"):
+                self._dialogues.append(record["response"])
+        self._next_dialogue = 0
+        if self._dialogues:
+            logger.info(f"debug_logsから{len(self._dialogues)}件の対話を読み込みました")
+
+    @staticmethod
+    def chat_key(body: Dict[str, Any]) -> str:
+        payload = json.dumps([body.get("model"), body.get("messages")], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def speech_key(body: Dict[str, Any]) -> str:
+        payload = json.dumps([body.get("model"), body.get("voice"), body.get("input")], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, kind: str, key: str, suffix: str) -> Optional[Path]:
+        return self.dir / kind / f"{key}{suffix}" if self.dir else None
+
+    def get_chat(self, body: Dict[str, Any]) -> Optional[str]:
+        path = self._path("chat", self.chat_key(body), ".json")
+        if path and path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)["content"]
+        if self._dialogues and _is_dialogue_request(body):
+            with self._lock:
+                content = self._dialogues[self._next_dialogue % len(self._dialogues)]
+                self._next_dialogue += 1
+            return content
+        return None
+
+    def put_chat(self, body: Dict[str, Any], content: str) -> None:
+        path = self._path("chat", self.chat_key(body), ".json")
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"request": body, "content": content}, f, ensure_ascii=False, indent=2)
+
+    def get_speech(self, body: Dict[str, Any]) -> Optional[bytes]:
+        path = self._path("speech", self.speech_key(body), ".mp3")
+        return path.read_bytes() if path and path.exists() else None
+
+    def put_speech(self, body: Dict[str, Any], audio: bytes) -> None:
+        path = self._path("speech", self.speech_key(body), ".mp3")
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(audio)
+
+def _is_dialogue_request(body: Dict[str, Any]) -> bool:
+    """対話生成のリクエストかどうか（セクション分析などのリクエストと区別する）"""
+    system = next((m.get("content", "") for m in body.get("messages", []) if m.get("role") == "system"), "")
+    return ("ホスト:" in system or '"speaker": "ホスト"' in system) and "セクション中の" not in system
+
+def _continued_lines(body: Dict[str, Any]) -> int:
+    """続きの生成を求めるリクエストの場合、すでに出力された対話の行数"""
+    assistant = next((m.get("content", "") for m in reversed(body.get("messages", [])) if m.get("role") == "assistant"), "")
+    return sum(1 for line in assistant.splitlines() if line.startswith(("ホスト:", "ゲスト:"))) + assistant.count('"speaker"')
+
+def synthesize_dialogue(config: StubConfig, start: int = 0, as_json: bool = False) -> str:
+    """指定した行数の対話を合成する（startは続きを生成する場合の開始行）"""
+    items = []
+    for i in range(start, config.dialogue_lines):
+        speaker = "ホスト" if i % 2 == 0 else "ゲスト"
+        sentence = f"これはベンチマーク用の{i + 1}行目の発言です。"
+        text = (sentence * (config.line_chars // len(sentence) + 1))[:config.line_chars]
+        items.append({"speaker": speaker, "text": text})
+    if as_json:
+        return json.dumps({"scratchpad": "", "dialogue": items}, ensure_ascii=False)
+    return "\n".join(f"{item['speaker']}: {item['text']}" for item in items)
+
+def synthesize_speech(text: str, config: StubConfig) -> bytes:
+    """テキストの長さに応じた長さの無音のMP3を合成する"""
+    frames = max(1, int(len(text) * config.seconds_per_char / _FRAME_SECONDS))
+    return _SILENT_FRAME * frames
+
+class StubServer(ThreadingHTTPServer):
+    """リクエストの統計とイベントの時刻を記録するHTTPサーバー"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        config: StubConfig,
+        recordings: Recordings,
+        upstream: Optional[str] = None,
+        upstream_key: Optional[str] = None
+    ):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.recordings = recordings
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.upstream_key = upstream_key
+        self.events: List[Dict[str, Any]] = []
+        self._events_lock = threading.Lock()
+
+    def record_event(self, kind: str, started: float, status: int, **extra: Any) -> None:
+        with self._events_lock:
+            self.events.append({"kind": kind, "started": started, "finished": time.monotonic(), "status": status, **extra})
+
+    def reset_events(self) -> List[Dict[str, Any]]:
+        """記録したイベントを返して消去する"""
+        with self._events_lock:
+            events, self.events = self.events, []
+        return events
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", "0"))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json", headers)
+
+    def _sleep(self, base: float) -> None:
+        config = self.server.config
+        if base > 0:
+            time.sleep(max(0.0, base * (1 + config.random.uniform(-config.jitter, config.jitter))))
+
+    def _inject_error(self) -> Optional[int]:
+        """設定した確率でエラーを返す（返した場合はステータスコード）"""
+        config = self.server.config
+        if config.error_rate <= 0 or config.random.random() >= config.error_rate:
+            return None
+        headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None else {}
+        self._send_json(
+            config.error_status,
+            {"error": {"message": "injected error", "type": "stub_error", "code": config.error_status}},
+            headers
+        )
+        return config.error_status
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:
+        started = time.monotonic()
+        body = self._read_json()
+        if self.path == "/v1/chat/completions":
+            kind = "chat"
+            status = self._inject_error() or self._chat(body)
+        elif self.path == "/v1/audio/speech":
+            kind = "speech"
+            status = self._inject_error() or self._speech(body)
+        else:
+            kind = "unknown"
+            status = 404
+            self._send_json(404, {"error": {"message": "not found"}})
+        self.server.record_event(kind, started, status, chars=len(body.get("input", "")))
+
+    def _upstream_post(self, path: str, body: Dict[str, Any]) -> httpx.Response:
+        response = httpx.post(
+            f"{self.server.upstream}{path}",
+            json=body,
+            headers={"Authorization": f"Bearer {self.server.upstream_key}"},
+            timeout=600
+        )
+        response.raise_for_status()
+        return response
+
+    def _chat(self, body: Dict[str, Any]) -> int:
+        config = self.server.config
+        content = self.server.recordings.get_chat(body)
+        if content is None and self.server.upstream:
+            upstream_body = dict(body, stream=False)
+            upstream_body.pop("stream_options", None)
+            content = self._upstream_post("/chat/completions", upstream_body).json()["choices"][0]["message"]["content"]
+            self.server.recordings.put_chat(body, content)
+        elif content is None:
+            if _is_dialogue_request(body):
+                as_json = (body.get("response_format") or {}).get("type") == "json_schema"
+                content = synthesize_dialogue(config, _continued_lines(body), as_json)
+            else:
+                content = "- ベンチマーク用のメモ"
+
+        finish_reason = "stop"
+        if (
+            config.truncate_rate > 0 and _is_dialogue_request(body) and not _continued_lines(body)
+            and config.random.random() < config.truncate_rate
+        ):
+            # 最大トークン数で打ち切られた応答を模擬する
+            content = content[:int(len(content) * 0.6)]
+            finish_reason = "length"
+
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        self._sleep(config.chat_latency)
+        model = body.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {"prompt_tokens": prompt_chars, "completion_tokens": len(content), "total_tokens": prompt_chars + len(content)}
+
+        if not body.get("stream"):
+            self._sleep(config.chat_latency_per_token * len(content))
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return 200
+
+        # Server-Sent Eventsで少しずつ返す
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> None:
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send_chunk({"role": "assistant", "content": ""})
+        step = max(1, config.stream_chunk_chars)
+        for i in range(0, len(content), step):
+            piece = content[i:i + step]
+            self._sleep(config.chat_latency_per_token * len(piece))
+            send_chunk({"content": piece})
+        send_chunk({}, finish_reason)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        return 200
+
+    def _speech(self, body: Dict[str, Any]) -> int:
+        config = self.server.config
+        audio = self.server.recordings.get_speech(body)
+        if audio is None and self.server.upstream:
+            audio = self._upstream_post("/audio/speech", body).content
+            self.server.recordings.put_speech(body, audio)
+        elif audio is None:
+            audio = synthesize_speech(body.get("input", ""), config)
+        self._sleep(config.speech_latency + config.speech_latency_per_char * len(body.get("input", "")))
+        self._send(200, audio, "audio/mpeg")
+        return 200
+
+def start_stub_server(
+    config: Optional[StubConfig] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    recordings_dir: Optional[str] = None,
+    debug_logs_dir: Optional[str] = None,
+    upstream: Optional[str] = None,
+    upstream_key: Optional[str] = None
+) -> StubServer:
+    """スタンドインサーバーをバックグラウンドのスレッドで起動する
+
+    Args:
+        config (Optional[StubConfig], optional): サーバーの設定. Defaults to None.
+        host (str, optional): 待ち受けるホスト. Defaults to "127.0.0.1".
+        port (int, optional): 待ち受けるポート（0で空いているポート）. Defaults to 0.
+        recordings_dir (Optional[str], optional): 記録のディレクトリ. Defaults to None.
+        debug_logs_dir (Optional[str], optional): 対話を再生するdebug_logsのディレクトリ（Noneで合成した対話を返す）. Defaults to None.
+        upstream (Optional[str], optional): 記録する場合の中継先のベースURL. Defaults to None.
+        upstream_key (Optional[str], optional): 中継先のAPIキー. Defaults to None.
+
+    Returns:
+        StubServer: 起動したサーバー（base_urlをアプリのAPIベースURLに設定する）
+    """
+    server = StubServer(
+        (host, port), config or StubConfig(), Recordings(recordings_dir, debug_logs_dir), upstream, upstream_key
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"スタンドインサーバーを起動しました: {server.base_url}")
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI互換のスタンドインサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--recordings", default=None, help="記録のディレクトリ")
+    parser.add_argument("--debug-logs", default="debug_logs", help="対話を再生するdebug_logsのディレクトリ（空文字で無効）")
+    parser.add_argument("--record-upstream", default=None, help="記録がない場合に中継する実際のAPIのベースURL")
+    parser.add_argument("--chat-latency", type=float, default=1.0, help="チャットの最初の応答までの秒数")
+    parser.add_argument("--chat-latency-per-token", type=float, default=0.0, help="出力1文字あたりの秒数")
+    parser.add_argument("--speech-latency", type=float, default=0.3, help="音声生成の秒数")
+    parser.add_argument("--speech-latency-per-char", type=float, default=0.0, help="音声生成の入力1文字あたりの秒数")
+    parser.add_argument("--jitter", type=float, default=0.1, help="レイテンシのばらつき（割合）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す確率")
+    parser.add_argument("--error-status", type=int, default=429, help="注入するエラーのステータスコード")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="エラー時に返すRetry-After[秒]")
+    parser.add_argument("--dialogue-lines", type=int, default=20, help="合成する対話の行数")
+    parser.add_argument("--line-chars", type=int, default=60, help="合成する対話の1行の文字数")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="対話を途中で打ち切って返す確率")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        chat_latency=args.chat_latency,
+        chat_latency_per_token=args.chat_latency_per_token,
+        speech_latency=args.speech_latency,
+        speech_latency_per_char=args.speech_latency_per_char,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        dialogue_lines=args.dialogue_lines,
+        line_chars=args.line_chars,
+        truncate_rate=args.truncate_rate,
+        seed=args.seed
+    )
+    server = StubServer(
+        (args.host, args.port), config, Recordings(args.recordings, args.debug_logs or None),
+        args.record_upstream, os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY")
+    )
+    logger.info(f"スタンドインサーバーを起動しました: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
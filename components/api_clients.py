@@ -0,0 +1,137 @@
+import hashlib
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+import httpx
+from loguru import logger
+
+if TYPE_CHECKING:
+    # openaiの読み込みは重いため、最初のクライアント作成時まで遅らせる
+    from openai import OpenAI
+
+API_POOL_MAX_CONNECTIONS = int(os.getenv("API_POOL_MAX_CONNECTIONS", "100"))
+API_POOL_MAX_KEEPALIVE = int(os.getenv("API_POOL_MAX_KEEPALIVE", "20"))
+API_KEEPALIVE_EXPIRY = float(os.getenv("API_KEEPALIVE_EXPIRY", "30"))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "600"))
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "10"))
+
+class _ClientEntry:
+    """登録済みクライアントと利用状況"""
+
+    def __init__(self, client: "OpenAI", http_client: httpx.Client, label: str):
+        self.client = client
+        self.http_client = http_client
+        self.label = label
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def on_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+
+_clients: Dict[Tuple[str, str], _ClientEntry] = {}
+_clients_lock = threading.Lock()
+
+def _key_fingerprint(api_key: Optional[str]) -> str:
+    """ログや統計に出力するためのAPIキーの識別子"""
+    if not api_key:
+        return "none"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+def get_openai_client(api_key: Optional[str], base_url: Optional[str]) -> "OpenAI":
+    """(ベースURL, APIキー) ごとに共有されるOpenAIクライアントを取得する
+
+    クライアントはKeep-Aliveの接続プールを保持するため、セグメントや
+    リクエストをまたいで接続とTLSセッションが再利用される。
+
+    Args:
+        api_key (Optional[str]): APIキー
+        base_url (Optional[str]): APIのベースURL
+
+    Returns:
+        OpenAI: 共有クライアント
+    """
+    key = (base_url or "", api_key or "")
+    entry = _clients.get(key)
+    if entry is not None:
+        return entry.client
+
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is None:
+            from openai import OpenAI
+
+            label = f"{base_url or 'default'} (key:{_key_fingerprint(api_key)})"
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=API_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=API_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=API_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(API_TIMEOUT, connect=API_CONNECT_TIMEOUT)
+            )
+            client = OpenAI(api_key=api_key, base_url=base_url or None, http_client=http_client)
+            entry = _ClientEntry(client, http_client, label)
+            http_client.event_hooks = {"request": [entry.on_request], "response": []}
+            _clients[key] = entry
+            logger.info(f"APIクライアントを作成しました: {label}")
+        return entry.client
+
+def get_llm_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> "OpenAI":
+    """LLM用の共有クライアントを取得する
+
+    Args:
+        api_key (Optional[str], optional): APIキー. Defaults to LLM_API_KEY.
+        base_url (Optional[str], optional): APIのベースURL. Defaults to LLM_API_BASE.
+
+    Returns:
+        OpenAI: 共有クライアント
+    """
+    return get_openai_client(api_key or os.getenv("LLM_API_KEY"), base_url or os.getenv("LLM_API_BASE"))
+
+def get_tts_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> "OpenAI":
+    """TTS用の共有クライアントを取得する
+
+    Args:
+        api_key (Optional[str], optional): APIキー. Defaults to TTS_API_KEY.
+        base_url (Optional[str], optional): APIのベースURL. Defaults to TTS_API_BASE.
+
+    Returns:
+        OpenAI: 共有クライアント
+    """
+    return get_openai_client(api_key or os.getenv("TTS_API_KEY"), base_url or os.getenv("TTS_API_BASE"))
+
+def client_stats() -> Dict[str, Dict[str, int]]:
+    """登録済みクライアントごとの接続プールの利用状況を返す
+
+    Returns:
+        Dict[str, Dict[str, int]]: クライアントごとのリクエスト数、使用中・待機中の接続数など
+    """
+    stats = {}
+    with _clients_lock:
+        entries = list(_clients.values())
+    for entry in entries:
+        connections = idle = 0
+        try:
+            # httpcoreの接続プールから接続の状態を取得する
+            pool_connections = entry.http_client._transport._pool.connections
+            connections = len(pool_connections)
+            idle = sum(1 for connection in pool_connections if connection.is_idle())
+        except AttributeError:
+            pass
+        stats[entry.label] = {
+            "requests": entry.requests,
+            "connections": connections,
+            "active_connections": connections - idle,
+            "idle_connections": idle,
+            "max_connections": API_POOL_MAX_CONNECTIONS,
+        }
+    return stats
+
+def close_clients() -> None:
+    """登録済みのクライアントをすべて閉じる"""
+    with _clients_lock:
+        entries = list(_clients.values())
+        _clients.clear()
+    for entry in entries:
+        entry.http_client.close()
@@ -0,0 +1,257 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+from loguru import logger
+from pydantic import BaseModel
+from .audio.audio_cleanup import cleanup_old_files
+from .audio.audio_manifest import SegmentManifest
+from .metrics import record_cache_lookup
+
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", "/app/gradio_cached_examples/artifacts/")
+EPISODE_CACHE_ENABLED = os.getenv("EPISODE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# 完成したエピソードとジョブの中間生成物の合計サイズの上限
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+ARTIFACT_JANITOR_INTERVAL_SECONDS = float(os.getenv("ARTIFACT_JANITOR_INTERVAL_SECONDS", "300"))
+
+class EpisodeResult(BaseModel):
+    """キャッシュされたエピソード"""
+    audio_path: str
+    lines: List[dict]
+    combined_text: str
+
+def _entry_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class ArtifactStore:
+    """完成したエピソードを内容のキー（ジョブID）で保存するストア
+
+    同じ文書・指示・声・モデルでの生成はパイプラインを実行せずに保存済みの
+    エピソードを返す。また、文書ごとに最後に生成したエピソードのセグメントの
+    対応表を保存し、再生成時の差分の音声生成に使用する。ディスク使用量はバックグラウンドのジャニターが管理し、
+    エピソードとジョブの中間生成物の合計が上限を超えた場合は最後に使用された
+    日時が古いものから削除する。
+    """
+
+    def __init__(self, store_dir: str = ARTIFACT_STORE_DIR, max_bytes: int = ARTIFACT_STORE_MAX_BYTES):
+        self.dir = Path(store_dir)
+        self.max_bytes = max_bytes
+        self.episodes_dir = self.dir / "episodes"
+        self.episodes_dir.mkdir(parents=True, exist_ok=True)
+        self.manifests_dir = self.dir / "manifests"
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._janitor: Optional[threading.Thread] = None
+
+    def get_episode(self, key: str) -> Optional[EpisodeResult]:
+        """保存済みのエピソードを取得する
+
+        Args:
+            key (str): 内容のキー
+
+        Returns:
+            Optional[EpisodeResult]: エピソード。存在しない場合はNone
+        """
+        entry = self.episodes_dir / key
+        try:
+            with open(entry / "result.json", "r", encoding="utf-8") as f:
+                result = EpisodeResult(audio_path=str(entry / "episode.mp3"), **json.load(f))
+            if not os.path.exists(result.audio_path):
+                raise FileNotFoundError(result.audio_path)
+            # 最後に使用された日時をLRUの判定に使用する
+            os.utime(entry)
+        except FileNotFoundError:
+            record_cache_lookup("episode", False)
+            return None
+        except Exception as e:
+            logger.warning(f"エピソードキャッシュの読み込みに失敗: {entry} - {str(e)}")
+            record_cache_lookup("episode", False)
+            return None
+        record_cache_lookup("episode", True)
+        return result
+
+    def put_episode(self, key: str, audio_path: str, lines: List[dict], combined_text: str) -> Optional[str]:
+        """エピソードを保存する
+
+        Args:
+            key (str): 内容のキー
+            audio_path (str): 音声ファイルのパス
+            lines (List[dict]): 対話行
+            combined_text (str): 抽出されたテキスト
+
+        Returns:
+            Optional[str]: 保存された音声ファイルのパス（失敗した場合はNone）
+        """
+        entry = self.episodes_dir / key
+        tmp_entry = self.episodes_dir / f".{key}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            tmp_entry.mkdir(parents=True, exist_ok=True)
+            # ジョブ側のファイルは再結合時に上書きされるため、リンクではなく複製する
+            shutil.copyfile(audio_path, tmp_entry / "episode.mp3")
+            with open(tmp_entry / "result.json", "w", encoding="utf-8") as f:
+                json.dump({"lines": lines, "combined_text": combined_text}, f, ensure_ascii=False)
+            with self._lock:
+                if entry.exists():
+                    shutil.rmtree(entry, ignore_errors=True)
+                os.replace(tmp_entry, entry)
+            return str(entry / "episode.mp3")
+        except Exception as e:
+            logger.warning(f"エピソードキャッシュへの保存に失敗: {key} - {str(e)}")
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return None
+
+    def get_manifest(self, lineage: str) -> Optional[SegmentManifest]:
+        """文書ごとに最後に生成したエピソードの対応表を取得する
+
+        Args:
+            lineage (str): 入力文書のキー
+
+        Returns:
+            Optional[SegmentManifest]: 対応表。存在しない場合はNone
+        """
+        path = self.manifests_dir / f"{lineage}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = SegmentManifest(**json.load(f))
+            os.utime(path)
+            return manifest
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"セグメントの対応表の読み込みに失敗: {path} - {str(e)}")
+            return None
+
+    def put_manifest(self, lineage: str, manifest: SegmentManifest) -> None:
+        """エピソードの対応表を文書の最新の対応表として保存する
+
+        Args:
+            lineage (str): 入力文書のキー
+            manifest (SegmentManifest): 対応表
+        """
+        path = self.manifests_dir / f"{lineage}.json"
+        tmp_path = self.manifests_dir / f".{lineage}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(manifest.model_dump_json())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"セグメントの対応表の保存に失敗: {lineage} - {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+
+    def enforce_quota(self, extra_roots: List[Path] = (), exclude: Set[str] = frozenset()) -> Tuple[int, int]:
+        """合計サイズが上限を超えている場合、最後に使用された日時が古い順に削除する
+
+        Args:
+            extra_roots (List[Path], optional): 同じ上限で管理するディレクトリ（ジョブディレクトリなど）. Defaults to ().
+            exclude (Set[str], optional): 削除しないエントリの名前（実行中のジョブなど）. Defaults to frozenset().
+
+        Returns:
+            Tuple[int, int]: (削除したエントリの数, 削除後の合計サイズ)
+        """
+        entries = []
+        for root in [self.episodes_dir, self.manifests_dir, *extra_roots]:
+            if not root.exists():
+                continue
+            for path in root.iterdir():
+                if path.name.startswith("."):
+                    continue
+                try:
+                    entries.append((path.stat().st_mtime, path, _entry_size(path)))
+                except OSError:
+                    continue
+        total = sum(size for _, _, size in entries)
+        removed = 0
+        for _, path, size in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            if path.name in exclude:
+                continue
+            with self._lock:
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"ディスク使用量の上限を超えたため削除しました: {removed}件 (合計 {total / 1024 / 1024:.1f}MB)")
+        return removed, total
+
+    def start_janitor(
+        self,
+        sweep: Callable[[], None],
+        interval: float = ARTIFACT_JANITOR_INTERVAL_SECONDS
+    ) -> None:
+        """ディスク使用量を定期的に管理するバックグラウンドのスレッドを開始する
+
+        Args:
+            sweep (Callable[[], None]): 1回分の掃除処理
+            interval (float, optional): 実行間隔[秒]. Defaults to ARTIFACT_JANITOR_INTERVAL_SECONDS.
+        """
+        with self._lock:
+            if self._janitor is not None:
+                return
+            self._janitor = threading.Thread(
+                target=self._run_janitor, args=(sweep, interval), name="artifact-janitor", daemon=True
+            )
+            self._janitor.start()
+
+    def _run_janitor(self, sweep: Callable[[], None], interval: float) -> None:
+        while True:
+            try:
+                sweep()
+            except Exception as e:
+                logger.warning(f"ディスク使用量の管理中にエラーが発生しました: {str(e)}")
+            time.sleep(interval)
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+def _sweep(store: ArtifactStore) -> None:
+    """古い一時ファイルとジョブを削除し、合計サイズを上限内に収める"""
+    from .jobs import unfinished_job_ids
+    from .pipeline import PIPELINE_JOBS_DIR, active_job_ids, cleanup_old_jobs
+
+    # 実行中のジョブに加え、ジョブストアで待機中のジョブ（別のプロセスのジョブを含む）も削除しない
+    protected = active_job_ids() | unfinished_job_ids()
+    cleanup_old_files()
+    cleanup_old_jobs(jobs_dir=PIPELINE_JOBS_DIR, exclude=protected)
+    store.enforce_quota(extra_roots=[Path(PIPELINE_JOBS_DIR)], exclude=protected)
+
+def get_artifact_store() -> ArtifactStore:
+    """共有のアーティファクトストアを取得する
+
+    Returns:
+        ArtifactStore: アーティファクトストア
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
+
+def start_artifact_janitor() -> ArtifactStore:
+    """ディスク使用量を管理するジャニターを開始する（アプリとCLIの起動時に呼び出す）
+
+    エピソードキャッシュや差分の音声生成が無効でも一時ファイルとジョブディレクトリは増えるため、
+    キャッシュの設定に関わらず開始する。
+
+    Returns:
+        ArtifactStore: アーティファクトストア
+    """
+    store = get_artifact_store()
+    store.start_janitor(lambda: _sweep(store))
+    return store
@@ -8,14 +8,22 @@ Audio Generation Package
 - 音声の生成と保存
 - 複数の音声ファイルの結合
 - 一時ファイルの管理
+- 合成済みセグメントのキャッシュ
+- 再生成時に変更のないセグメントを再利用するための対応表
 """
 
-from .audio_generation import generate_audio_from_transcript
+from .audio_generation import generate_audio_from_transcript, stream_audio_from_transcript
 from .audio_core import generate_audio
 from .audio_utils import TEMP_DIR
+from .audio_cache import SegmentCache, get_segment_cache
+from .audio_manifest import SegmentManifest
 
 __all__ = [
     'generate_audio_from_transcript',
+    'stream_audio_from_transcript',
     'generate_audio',
-    'TEMP_DIR'
+    'TEMP_DIR',
+    'SegmentCache',
+    'get_segment_cache',
+    'SegmentManifest'
 ]
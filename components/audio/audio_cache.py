@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+from loguru import logger
+from ..metrics import record_cache_lookup
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/app/gradio_cached_examples/tts_cache/")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化する
+
+    Args:
+        text (str): 正規化するテキスト
+
+    Returns:
+        str: NFKC正規化と空白の圧縮を行ったテキスト
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def make_segment_key(text: str, voice: str, audio_model: str, endpoint: Optional[str]) -> str:
+    """音声セグメントのキャッシュキーを生成する
+
+    Args:
+        text (str): 生成するテキスト
+        voice (str): 使用する音声
+        audio_model (str): 使用する音声モデル
+        endpoint (Optional[str]): TTS APIのベースURL
+
+    Returns:
+        str: SHA-256のハッシュ値
+    """
+    payload = json.dumps(
+        [normalize_text(text), voice, audio_model, endpoint or ""],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SegmentCache:
+    """合成済み音声セグメントをディスクに保存するLRUキャッシュ"""
+
+    def __init__(self, cache_dir: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # キー -> ファイルサイズ（最後に参照された順）
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _load_index(self) -> None:
+        """既存のキャッシュファイルを更新日時順に読み込む"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".mp3"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+            for _, key, size in sorted(entries):
+                self._index[key] = size
+                self._total_bytes += size
+            logger.info(f"TTSキャッシュを読み込みました: {len(self._index)}件, {self._total_bytes}バイト")
+        except Exception as e:
+            logger.warning(f"TTSキャッシュの読み込みに失敗しました: {str(e)}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """キャッシュから音声データを取得する
+
+        Args:
+            key (str): キャッシュキー
+
+        Returns:
+            Optional[bytes]: 音声データ。存在しない場合はNone
+        """
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                record_cache_lookup("tts_segment", False)
+                return None
+            self._index.move_to_end(key)
+        try:
+            path = self._path(key)
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError as e:
+            logger.warning(f"TTSキャッシュの読み込みに失敗: {key} - {str(e)}")
+            with self._lock:
+                self._total_bytes -= self._index.pop(key, 0)
+                self.misses += 1
+                record_cache_lookup("tts_segment", False)
+            return None
+        with self._lock:
+            self.hits += 1
+            record_cache_lookup("tts_segment", True)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """音声データをキャッシュに保存する
+
+        Args:
+            key (str): キャッシュキー
+            data (bytes): 音声データ
+        """
+        if not data or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"TTSキャッシュの保存に失敗: {key} - {str(e)}")
+            return
+
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            evicted = self._evict_locked()
+
+        for evicted_key in evicted:
+            try:
+                os.remove(self._path(evicted_key))
+            except OSError:
+                pass
+        if evicted:
+            logger.debug(f"TTSキャッシュから{len(evicted)}件を削除しました")
+
+    def _evict_locked(self) -> list:
+        """上限を超えた分を古い順に取り除く（ロック保持中に呼び出す）"""
+        evicted = []
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(key)
+        return evicted
+
+    def clear(self) -> None:
+        """キャッシュをすべて削除する"""
+        with self._lock:
+            keys = list(self._index)
+            self._index.clear()
+            self._total_bytes = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, float]:
+        """キャッシュの統計情報を返す
+
+        Returns:
+            Dict[str, float]: ヒット数、ミス数、件数、使用バイト数など
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+_segment_cache: Optional[SegmentCache] = None
+_segment_cache_lock = threading.Lock()
+
+def get_segment_cache() -> Optional[SegmentCache]:
+    """共有のセグメントキャッシュを取得する
+
+    Returns:
+        Optional[SegmentCache]: キャッシュが無効な場合はNone
+    """
+    global _segment_cache
+    if not TTS_CACHE_ENABLED:
+        return None
+    with _segment_cache_lock:
+        if _segment_cache is None:
+            _segment_cache = SegmentCache()
+        return _segment_cache
@@ -2,24 +2,8 @@ import os
 import glob
 import time
 from loguru import logger
-from typing import List
 from .audio_utils import TEMP_DIR
 
-def cleanup_temp_files(temp_files: List[str]) -> None:
-    """一時ファイルを削除する
-
-    Args:
-        temp_files (List[str]): 削除する一時ファイルのリスト
-    """
-    for temp_file in temp_files:
-        logger.debug(f"一時ファイルの削除を試行: {temp_file}")
-        try:
-            os.remove(temp_file)
-            logger.debug(f"一時ファイルを削除しました: {temp_file}")
-        except Exception as e:
-            logger.warning(f"一時ファイルの削除に失敗: {temp_file} - {str(e)}")
-    logger.info("一時ファイルのクリーンアップ完了")
-
 def cleanup_old_files(max_age_days: int = 1) -> int:
     """古い一時ファイルを削除する
 
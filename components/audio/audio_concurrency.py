@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+from loguru import logger
+from ..metrics import TTS_CONCURRENCY_LIMIT, TTS_IN_FLIGHT
+
+TTS_CONCURRENCY_INITIAL = float(os.getenv("TTS_CONCURRENCY_INITIAL", "4"))
+TTS_CONCURRENCY_MIN = float(os.getenv("TTS_CONCURRENCY_MIN", "1"))
+TTS_CONCURRENCY_MAX = int(os.getenv("TTS_CONCURRENCY_MAX", "32"))
+TTS_LATENCY_TARGET = float(os.getenv("TTS_LATENCY_TARGET", "10"))
+TTS_MAX_RETRIES = int(os.getenv("TTS_MAX_RETRIES", "3"))
+TTS_BACKOFF_SECONDS = float(os.getenv("TTS_BACKOFF_SECONDS", "2"))
+
+T = TypeVar("T")
+
+def classify_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    """例外が再試行可能かどうかとRetry-Afterの秒数を判定する
+
+    Args:
+        error (Exception): 発生した例外
+
+    Returns:
+        Tuple[bool, Optional[float]]: (再試行可能か, Retry-Afterの秒数)
+    """
+    # 例外が発生している時点でopenaiは読み込み済み
+    from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True, None
+    if isinstance(error, APIStatusError):
+        if error.status_code == 429 or error.status_code >= 500:
+            retry_after = None
+            try:
+                header = error.response.headers.get("retry-after")
+                retry_after = float(header) if header else None
+            except (AttributeError, ValueError):
+                pass
+            return True, retry_after
+    return False, None
+
+class AdaptiveConcurrencyController:
+    """AIMDで同時実行数を調整するコントローラー
+
+    レイテンシが目標以内で成功したリクエストごとに上限を加算的に増やし、
+    429/5xxやレイテンシの悪化を検知すると乗算的に減らす。Retry-Afterが
+    返された場合は指定時間、新しいリクエストの開始を止める。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = TTS_CONCURRENCY_INITIAL,
+        min_limit: float = TTS_CONCURRENCY_MIN,
+        max_limit: int = TTS_CONCURRENCY_MAX,
+        latency_target: float = TTS_LATENCY_TARGET
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self._backoff_until = 0.0
+        self._condition = threading.Condition()
+
+    def _try_acquire_locked(self) -> float:
+        """枠を確保できた場合は0、できない場合は待機すべき秒数を返す"""
+        wait = self._backoff_until - time.monotonic()
+        if wait > 0:
+            return wait
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return 0.0
+        return 0.05
+
+    def acquire(self) -> None:
+        """実行枠が空くまで待機する"""
+        with self._condition:
+            while True:
+                wait = self._try_acquire_locked()
+                if not wait:
+                    return
+                self._condition.wait(timeout=wait)
+
+    def release(
+        self,
+        latency: float,
+        throttled: bool = False,
+        retry_after: Optional[float] = None,
+        failed: bool = False
+    ) -> None:
+        """実行枠を返却し、結果に応じて上限を調整する
+
+        Args:
+            latency (float): リクエストのレイテンシ[秒]
+            throttled (bool, optional): 429/5xxなどで失敗した場合はTrue. Defaults to False.
+            retry_after (Optional[float], optional): Retry-Afterの秒数. Defaults to None.
+            failed (bool, optional): 負荷と関係のないエラー（認証エラーなど）で失敗した場合はTrue（上限を変更しない）. Defaults to False.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            previous = self.limit
+            if throttled:
+                self.throttled += 1
+                self.limit = max(self.min_limit, self.limit / 2)
+                backoff = retry_after if retry_after is not None else TTS_BACKOFF_SECONDS
+                self._backoff_until = max(self._backoff_until, time.monotonic() + backoff)
+                logger.warning(
+                    f"TTS同時実行数を縮小: {self.name} | {previous:.1f} -> {self.limit:.1f} | {backoff:.1f}秒待機"
+                )
+            elif failed:
+                # 負荷と関係のない失敗では上限を変更しない
+                pass
+            elif latency > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+                logger.info(
+                    f"TTSレイテンシ悪化 ({latency:.1f}秒): {self.name} | 同時実行数 {previous:.1f} -> {self.limit:.1f}"
+                )
+            else:
+                self.successes += 1
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                if int(self.limit) != int(previous):
+                    logger.info(f"TTS同時実行数を拡大: {self.name} | {int(previous)} -> {int(self.limit)}")
+            self._condition.notify_all()
+
+    def run(self, fn: Callable[..., T], *args, allow_retry: Optional[Callable[[], bool]] = None) -> T:
+        """同時実行数の範囲内で関数を実行し、再試行可能なエラーはこの呼び出しのみ再試行する
+
+        再試行の前にはRetry-After（指定がない場合はTTS_BACKOFF_SECONDS）の間、新しいリクエストの開始を止める。
+        パイプラインはジョブの再試行回数をallow_retryで渡し、再試行はここでのみ行う。
+
+        Args:
+            fn (Callable[..., T]): 実行する関数
+            *args: 関数の引数
+            allow_retry (Optional[Callable[[], bool]], optional): 再試行するたびに呼び出し、Falseを返した場合は
+                例外を送出する関数. Defaults to None（TTS_MAX_RETRIES回まで再試行する）.
+
+        Returns:
+            T: 関数の戻り値
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            started = time.monotonic()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                retryable, retry_after = classify_error(e)
+                self.release(time.monotonic() - started, throttled=retryable, retry_after=retry_after, failed=True)
+                if not retryable:
+                    raise
+                attempt += 1
+                if allow_retry is not None:
+                    if not allow_retry():
+                        raise
+                elif attempt > TTS_MAX_RETRIES:
+                    raise
+                else:
+                    logger.warning(f"TTSリクエストを再試行します ({attempt}/{TTS_MAX_RETRIES}): {str(e)}")
+                continue
+            self.release(time.monotonic() - started)
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        """現在の同時実行数の状態を返す
+
+        Returns:
+            Dict[str, float]: 上限、実行中の数、成功数、スロットリング回数
+        """
+        with self._condition:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "successes": self.successes,
+                "throttled": self.throttled,
+            }
+
+_controllers: Dict[str, AdaptiveConcurrencyController] = {}
+_controllers_lock = threading.Lock()
+
+def get_concurrency_controller(endpoint: Optional[str]) -> AdaptiveConcurrencyController:
+    """エンドポイントごとに共有されるコントローラーを取得する
+
+    Args:
+        endpoint (Optional[str]): TTS APIのベースURL
+
+    Returns:
+        AdaptiveConcurrencyController: 同じエンドポイントに対するすべてのジョブで共有されるコントローラー
+    """
+    name = endpoint or "default"
+    with _controllers_lock:
+        controller = _controllers.get(name)
+        if controller is None:
+            controller = _controllers[name] = AdaptiveConcurrencyController(name)
+            TTS_IN_FLIGHT.labels(name).set_function(lambda: controller.in_flight)
+            TTS_CONCURRENCY_LIMIT.labels(name).set_function(lambda: controller.limit)
+        return controller
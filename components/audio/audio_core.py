@@ -1,7 +1,8 @@
 import io
-import os
-from openai import OpenAI
+import time
 from loguru import logger
+from ..api_clients import get_tts_client
+from ..metrics import TTS_REQUEST_SECONDS, TTS_SEGMENT_BYTES
 from ..data_models import AudioConfig
 
 def get_mp3(text: str, voice: str, audio_model: str, api_key: str = None) -> bytes:
@@ -16,23 +17,28 @@ def get_mp3(text: str, voice: str, audio_model: str, api_key: str = None) -> byt
     Returns:
         bytes: 生成された音声データ
     """
-    logger.info(f"音声生成開始: 文字数: {len(text)} | 声: {voice} | モデル: {audio_model}")
-    logger.info(f"生成するテキスト: {text}")
-    client = OpenAI(
-        api_key=api_key or os.getenv("TTS_API_KEY"),
-        base_url=os.getenv("TTS_API_BASE")
-    )
+    logger.bind(sample="get_mp3").debug(f"音声生成開始: 文字数: {len(text)} | 声: {voice} | モデル: {audio_model}")
+    # 再試行は同時実行数のコントローラーで行うため、SDK側の再試行は無効にする
+    client = get_tts_client(api_key).with_options(max_retries=0)
 
-    with client.audio.speech.with_streaming_response.create(
-        model=audio_model,
-        voice=voice,
-        input=text,
-    ) as response:
-        with io.BytesIO() as file:
-            for chunk in response.iter_bytes():
-                file.write(chunk)
-            logger.info("音声生成完了: 全チャンク受信完了")
-            return file.getvalue()
+    started = time.perf_counter()
+    try:
+        with client.audio.speech.with_streaming_response.create(
+            model=audio_model,
+            voice=voice,
+            input=text,
+        ) as response:
+            with io.BytesIO() as file:
+                for chunk in response.iter_bytes():
+                    file.write(chunk)
+                audio = file.getvalue()
+    except Exception:
+        TTS_REQUEST_SECONDS.labels(audio_model, "error").observe(time.perf_counter() - started)
+        raise
+    TTS_REQUEST_SECONDS.labels(audio_model, "ok").observe(time.perf_counter() - started)
+    TTS_SEGMENT_BYTES.labels(audio_model).observe(len(audio))
+    logger.bind(sample="get_mp3").debug(f"音声生成完了: {len(audio)}バイト")
+    return audio
 
 def generate_audio(text: str, model: str, voice: str) -> str:
     """単一のテキストから音声を生成する関数
@@ -1,83 +1,155 @@
+import os
 import subprocess
+import threading
+import time
 from typing import List
 from loguru import logger
-from tempfile import NamedTemporaryFile
-from .audio_utils import TEMP_DIR, normalize_path
+from ..metrics import AUDIO_CONCAT_SECONDS
 
-def create_ffmpeg_input_file(temp_files: List[str]) -> str:
-    """FFmpeg用の入力ファイルリストを作成する
+# 結合方式
+# reencode: 全セグメントの生成後にエピソード全体を再エンコードする
+# stream_copy: セグメントごとに生成直後にエンコード設定を揃え、最後はストリームコピーで結合する
+AUDIO_ASSEMBLY_MODE = os.getenv("AUDIO_ASSEMBLY_MODE", "reencode").lower()
+AUDIO_SEGMENT_SAMPLE_RATE = os.getenv("AUDIO_SEGMENT_SAMPLE_RATE", "24000")
+AUDIO_SEGMENT_BITRATE = os.getenv("AUDIO_SEGMENT_BITRATE", "128k")
+
+def is_stream_copy_enabled() -> bool:
+    """ストリームコピーで結合するかどうか"""
+    return AUDIO_ASSEMBLY_MODE == "stream_copy"
+
+def normalize_segment(audio_chunk: bytes) -> bytes:
+    """セグメントをストリームコピーで結合できる共通のエンコード設定に揃える
+
+    サンプルレート・チャンネル数・ビットレート（CBR）を統一し、ID3タグと
+    Xingヘッダーを除いたMP3フレームのみを出力する。
 
     Args:
-        temp_files (List[str]): 結合する音声ファイルのリスト
+        audio_chunk (bytes): TTSが返した音声データ
 
     Returns:
-        str: 作成された入力ファイルのパス
+        bytes: エンコード設定を揃えた音声データ
     """
+    ffmpeg_command = [
+        'ffmpeg',
+        '-hide_banner', '-loglevel', 'error',
+        '-i', 'pipe:0',
+        '-ar', AUDIO_SEGMENT_SAMPLE_RATE, '-ac', '1',
+        '-acodec', 'libmp3lame', '-b:a', AUDIO_SEGMENT_BITRATE,
+        '-map_metadata', '-1', '-id3v2_version', '0', '-write_id3v1', '0', '-write_xing', '0',
+        '-f', 'mp3', 'pipe:1'
+    ]
     try:
-        with NamedTemporaryFile(mode='w', delete=False, suffix='.txt', dir=TEMP_DIR) as f:
-            for temp_file in temp_files:
-                normalized_path = normalize_path(temp_file)
-                logger.debug(f"一時ファイルリストに追加: {normalized_path}")
-                f.write(f"file '{normalized_path}'\n")
-            f.flush()
-            file_list = f.name
-            
-        # 一時ファイルリストの内容を確認
-        logger.debug(f"一時ファイルリストの内容を確認: {file_list}")
-        with open(file_list, 'r') as f:
-            file_content = f.read()
-            logger.debug(f"ファイルリストの内容:\n{file_content}")
-            
-        return file_list
-    except Exception as e:
-        logger.error(f"FFmpeg入力ファイルの作成に失敗しました: {str(e)}")
+        result = subprocess.run(ffmpeg_command, input=audio_chunk, check=True, capture_output=True)
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        logger.error(f"セグメントのエンコードに失敗しました: {e.stderr.decode('utf-8', errors='replace') if e.stderr else ''}")
         raise
 
-def concat_audio_files(input_list: str, output_file: str) -> bool:
-    """FFmpegを使用して音声ファイルを結合する
+class SegmentEncoder:
+    """トランスクリプト順に受け取ったセグメントを1つの出力ファイルに書き込む
 
-    Args:
-        input_list (str): 入力ファイルリストのパス
-        output_file (str): 出力ファイルのパス
+    セグメントごとの一時ファイルやFFmpeg用のファイルリストは作成しない。
+    reencodeの場合は1つのFFmpegプロセスを起動したままにして、標準入力へ
+    セグメントのバイト列を順に流し込む。stream_copyの場合はnormalize_segmentで
+    揃えたMP3フレームをそのまま出力ファイルへ連結する（FFmpegは起動しない）。
 
-    Returns:
-        bool: 成功した場合はTrue
+    Examples:
+        with SegmentEncoder(output_file) as encoder:
+            for audio_chunk in audio_chunks:
+                encoder.write(audio_chunk)
     """
-    try:
-        # FFmpegコマンドの構築
-        # -y: 既存ファイルを上書き
-        # -f concat: 結合モード
-        # -safe 0: 安全でないファイル名を許可
-        # -acodec libmp3lame: MP3エンコーダーを使用
-        # -q:a 2: VBRエンコード品質（0=最高品質、9=最低品質）
-        ffmpeg_command = [
-            'ffmpeg',
-            '-y', '-f', 'concat', '-safe', '0',
-            '-i', normalize_path(input_list),
- 
-            '-acodec', 'libmp3lame', '-q:a', '2',
-            output_file
-        ]
-        logger.info(f"FFmpegコマンド: {' '.join(ffmpeg_command)}")
-
-        # FFmpegの実行
-        result = subprocess.run(ffmpeg_command, check=True, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.error(f"FFmpegコマンドが失敗: {result.stderr}")
-            return False
-            
-        if result.stderr:
-            logger.debug(f"FFmpeg出力: {result.stderr}")
-            
-        logger.info(f"FFmpegによる音声ファイルの結合が完了: {output_file}")
-        return True
 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpeg実行エラー: {str(e)}")
-        logger.error(f"FFmpeg出力: {e.stdout if e.stdout else ''}\n{e.stderr if e.stderr else ''}")
-        logger.error(f"FFmpegコマンド: {' '.join(ffmpeg_command)}")
-        raise
-    except Exception as e:
-        logger.error(f"音声ファイルの結合中にエラーが発生しました: {str(e)}")
-        raise
+    def __init__(self, output_file: str, stream_copy: bool = False):
+        self.output_file = output_file
+        self.stream_copy = stream_copy
+        self.segments = 0
+        self._stderr: List[bytes] = []
+        if stream_copy:
+            self._process = None
+            self._output = open(output_file, "wb")
+        else:
+            # -f mp3 -i pipe:0: 標準入力から連続したMP3ストリームとして読み込む
+            # -acodec libmp3lame -q:a 2: これまでの結合と同じエンコード設定
+            self._command = [
+                'ffmpeg',
+                '-y', '-hide_banner', '-loglevel', 'error',
+                '-f', 'mp3', '-i', 'pipe:0',
+                '-acodec', 'libmp3lame', '-q:a', '2',
+                output_file
+            ]
+            logger.info(f"FFmpegコマンド: {' '.join(self._command)}")
+            self._process = subprocess.Popen(
+                self._command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+            self._output = self._process.stdin
+            # 標準エラー出力が詰まってエンコーダーが停止しないように別スレッドで読み出す
+            self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+            self._stderr_thread.start()
+
+    def _drain_stderr(self) -> None:
+        for line in self._process.stderr:
+            self._stderr.append(line)
+
+    def write(self, audio_chunk: bytes) -> None:
+        """セグメントを出力に追加する
+
+        Args:
+            audio_chunk (bytes): トランスクリプト順の次のセグメント
+        """
+        try:
+            self._output.write(audio_chunk)
+        except BrokenPipeError:
+            self._raise_encoder_error()
+        self.segments += 1
+
+    def close(self) -> str:
+        """入力を閉じて出力の完成を待つ
+
+        Returns:
+            str: 出力ファイルのパス
+        """
+        started = time.perf_counter()
+        try:
+            self._output.close()
+        except BrokenPipeError:
+            pass
+        if self._process is not None:
+            self._process.wait()
+            self._stderr_thread.join()
+            if self._process.returncode != 0:
+                self._raise_encoder_error()
+        # 結合はセグメントの受信と並行して進むため、最後のセグメントの受信後に残る時間を記録する
+        AUDIO_CONCAT_SECONDS.labels("stream_copy" if self.stream_copy else "reencode").observe(time.perf_counter() - started)
+        logger.info(f"音声ファイルの結合が完了: {self.output_file} ({self.segments}セグメント)")
+        return self.output_file
+
+    def abort(self) -> None:
+        """途中で中断し、作成途中の出力ファイルを削除する"""
+        try:
+            self._output.close()
+        except Exception:
+            pass
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        try:
+            os.remove(self.output_file)
+        except FileNotFoundError:
+            pass
+
+    def _raise_encoder_error(self) -> None:
+        self._process.wait()
+        self._stderr_thread.join()
+        stderr = b"".join(self._stderr).decode("utf-8", errors="replace")
+        logger.error(f"FFmpeg実行エラー: {stderr}")
+        logger.error(f"FFmpegコマンド: {' '.join(self._command)}")
+        raise subprocess.CalledProcessError(self._process.returncode, self._command, stderr=stderr)
+
+    def __enter__(self) -> "SegmentEncoder":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
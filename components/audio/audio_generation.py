@@ -1,97 +1,267 @@
 import concurrent.futures as cf
+import os
 from loguru import logger
 from tempfile import NamedTemporaryFile
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 from ..data_models import DialogueItem
+from ..api_clients import client_stats
+from ..logging_config import truncate
 from .audio_core import get_mp3
+from .audio_cache import SegmentCache, get_segment_cache, make_segment_key
+from .audio_concurrency import TTS_CONCURRENCY_MAX, get_concurrency_controller
+from .audio_planner import PlannedSegment, longest_first, plan_segments
 from .audio_utils import TEMP_DIR, ensure_directory
-from .audio_ffmpeg import create_ffmpeg_input_file, concat_audio_files
-from .audio_cleanup import cleanup_temp_files, cleanup_old_files
+from .audio_ffmpeg import SegmentEncoder, is_stream_copy_enabled, normalize_segment
 
-def generate_audio_from_transcript(
-    transcript: List[DialogueItem],
+def synthesize_segment(
+    text: str,
+    voice: str,
+    audio_model: str,
+    api_key: str,
+    cache: SegmentCache = None,
+    cache_key: str = None,
+    allow_retry: Optional[Callable[[], bool]] = None
+) -> bytes:
+    """適応的な同時実行数の範囲内で音声を生成し、結果をキャッシュに保存する
+
+    Args:
+        text (str): 生成するテキスト
+        voice (str): 使用する音声
+        audio_model (str): 使用する音声モデル
+        api_key (str): APIキー
+        cache (SegmentCache, optional): 保存先のキャッシュ. Defaults to None.
+        cache_key (str, optional): キャッシュキー. Defaults to None.
+        allow_retry (Optional[Callable[[], bool]], optional): 再試行の可否を判定する関数（ジョブの再試行回数）. Defaults to None.
+
+    Returns:
+        bytes: 生成された音声データ
+    """
+    controller = get_concurrency_controller(os.getenv("TTS_API_BASE"))
+    audio_chunk = controller.run(get_mp3, text, voice, audio_model, api_key, allow_retry=allow_retry)
+    if cache is not None and cache_key:
+        cache.put(cache_key, audio_chunk)
+    return audio_chunk
+
+def prepare_segment_for_assembly(audio_chunk: bytes) -> bytes:
+    """結合方式に合わせてセグメントを整える
+
+    stream_copyの場合は他のセグメントの生成中にここで再エンコードしておき、
+    最後の結合を再エンコードなしで行えるようにする。
+
+    Args:
+        audio_chunk (bytes): TTSが返した音声データ
+
+    Returns:
+        bytes: 結合用の音声データ
+    """
+    if is_stream_copy_enabled():
+        return normalize_segment(audio_chunk)
+    return audio_chunk
+
+def _synthesize_for_assembly(
+    text: str,
+    voice: str,
+    audio_model: str,
+    api_key: str,
+    cache: SegmentCache = None,
+    cache_key: str = None
+) -> bytes:
+    """音声を生成し、結合用に整えて返す"""
+    return prepare_segment_for_assembly(
+        synthesize_segment(text, voice, audio_model, api_key, cache, cache_key)
+    )
+
+def iter_audio_segments(
+    transcript: Iterable[DialogueItem],
     speaker_1_voice: str,
     speaker_2_voice: str,
     audio_model: str,
     openai_api_key: str = None
-) -> str:
-    """トランスクリプトから音声を生成する
+) -> Iterator[bytes]:
+    """トランスクリプトを並列で音声化し、トランスクリプト順に返す
+
+    対話行はplan_segmentsでTTSリクエスト単位のセグメントにまとめて・分割してから
+    音声化する。transcriptにはジェネレータも渡せる。その場合は対話行を受け取るたびに
+    音声生成タスクを投入し、先頭から完了したセグメントを順次返すため、
+    LLMの生成・音声合成・再生が並行して進む。
 
     Args:
-        transcript (List[DialogueItem]): 生成するトランスクリプト
+        transcript (Iterable[DialogueItem]): 生成するトランスクリプト
         speaker_1_voice (str): ホストの声
         speaker_2_voice (str): ゲストの声
         audio_model (str): 使用する音声モデル
         openai_api_key (str, optional): OpenAI APIキー. Defaults to None.
 
-    Returns:
-        str: 生成された音声ファイルのパス
+    Yields:
+        bytes: 各セグメントの音声データ
     """
-    temp_files = []
-    final_audio_file = None
     characters = 0
 
-    # 一時ディレクトリの作成
-    ensure_directory(TEMP_DIR)
+    # 合成済みセグメントのキャッシュ
+    cache = get_segment_cache()
+    endpoint = os.getenv("TTS_API_BASE")
+    cached_segments = 0
 
-    try:
-        # 並列で音声を生成
-        logger.info("音声生成を開始します")
-        with cf.ThreadPoolExecutor() as executor:
-            logger.info("ThreadPoolExecutorを初期化しました")
-            futures = []
-            
-            # 音声生成タスクの設定
-            for line in transcript:
-                text = line.text.split(":", 1)[1].strip() if ":" in line.text else line.text.strip()
-                voice = speaker_1_voice if line.speaker == "ホスト" else speaker_2_voice
-                logger.info(f"話者: {line.speaker}, 声: {voice}, テキスト: {text}")
-                
-                future = executor.submit(get_mp3, text, voice, audio_model, openai_api_key)
-                futures.append((future, text))
-                characters += len(text)
-
-            logger.info(f"音声生成タスクの設定完了: 合計{len(futures)}個のタスク")
-
-            # 音声ファイルの保存
-            completed_tasks = 0
-            for future, text in futures:
+    # 対話行をTTSリクエスト単位のセグメントにまとめる・分割する
+    segments = plan_segments(transcript, speaker_1_voice, speaker_2_voice)
+
+    # 並列で音声を生成
+    logger.info("音声生成を開始します")
+    # 実際の同時実行数はエンドポイントごとのコントローラーが制御する
+    controller = get_concurrency_controller(endpoint)
+    with cf.ThreadPoolExecutor(max_workers=TTS_CONCURRENCY_MAX) as executor:
+        logger.info(f"ThreadPoolExecutorを初期化しました (同時実行数: {controller.stats()})")
+        futures = []
+        next_index = 0
+
+        def submit(segment: PlannedSegment) -> cf.Future:
+            """セグメントの音声生成タスクを投入する"""
+            nonlocal characters, cached_segments
+            logger.bind(sample="tts_segment").info(f"話者: {segment.speaker}, 声: {segment.voice}, テキスト: {truncate(segment.text)}")
+            characters += len(segment.text)
+
+            cache_key = make_segment_key(segment.text, segment.voice, audio_model, endpoint) if cache else None
+            cached_audio = cache.get(cache_key) if cache else None
+            if cached_audio is not None:
+                # キャッシュ済みのセグメントはAPIに送信しない
+                cached_segments += 1
+                if is_stream_copy_enabled():
+                    return executor.submit(prepare_segment_for_assembly, cached_audio)
+                future = cf.Future()
+                future.set_result(cached_audio)
+                return future
+            return executor.submit(
+                _synthesize_for_assembly, segment.text, segment.voice, audio_model, openai_api_key, cache, cache_key
+            )
+
+        def pop_ready(block: bool) -> Iterator[bytes]:
+            """先頭から完了済みのセグメントを順に取り出す"""
+            nonlocal next_index
+            while next_index < len(futures) and (block or futures[next_index][0].done()):
+                future, text = futures[next_index]
                 try:
                     audio_chunk = future.result()
-                    temp_file = NamedTemporaryFile(
-                        dir=TEMP_DIR,
-                        delete=False,
-                        suffix=".mp3"
-                    )
-                    temp_file.write(audio_chunk)
-                    temp_file.close()
-                    temp_files.append(temp_file.name)
-                    completed_tasks += 1
-                    logger.info(f"進捗: {completed_tasks}/{len(futures)} - 一時ファイルを保存: {temp_file.name}")
                 except Exception as e:
-                    logger.error(f"音声生成エラー: {str(e)}, テキスト: {text}")
+                    logger.error(f"音声生成エラー: {str(e)}, テキスト: {truncate(text)}")
                     raise
+                next_index += 1
+                logger.bind(sample="tts_progress").info(f"進捗: {next_index}/{len(futures)} - セグメントの音声生成が完了しました")
+                yield audio_chunk
+
+        try:
+            # 音声生成タスクの設定
+            if isinstance(transcript, Sequence):
+                # トランスクリプト全体が既知の場合は長いセグメントから投入し、
+                # 最も時間のかかるリクエストが最後に残らないようにする
+                planned = list(segments)
+                submitted = {segment.index: submit(segment) for segment in longest_first(planned)}
+                futures.extend((submitted[segment.index], segment.text) for segment in planned)
+            else:
+                for segment in segments:
+                    futures.append((submit(segment), segment.text))
+
+                    # 先頭から完了しているセグメントがあれば先に返す
+                    yield from pop_ready(block=False)
+
+            logger.info(f"音声生成タスクの設定完了: 合計{len(futures)}個のタスク (キャッシュヒット: {cached_segments}個)")
+
+            yield from pop_ready(block=True)
+        finally:
+            # 途中で中断された場合は未着手のタスクを取り消す
+            for future, _ in futures[next_index:]:
+                future.cancel()
+
+    logger.info(f"音声生成完了: 合計{characters}文字を処理")
+    if cache:
+        logger.info(f"TTSキャッシュ統計: {cache.stats()}")
+    logger.info(f"TTS同時実行数: {controller.stats()}")
+    logger.info(f"APIクライアントの接続プール: {client_stats()}")
+
+def _open_encoder() -> SegmentEncoder:
+    """最終的な音声ファイルへのエンコーダーを開く"""
+    ensure_directory(TEMP_DIR)
+    final_audio_file = NamedTemporaryFile(
+        dir=TEMP_DIR,
+        delete=False,
+        suffix=".mp3"
+    ).name
+    return SegmentEncoder(final_audio_file, stream_copy=is_stream_copy_enabled())
+
+def assemble_audio_segments(audio_chunks: List[bytes]) -> str:
+    """生成済みのセグメントを順に結合して1つの音声ファイルにする
 
-        logger.info(f"音声生成完了: 合計{characters}文字を処理")
-        logger.info(f"一時ファイル数: {len(temp_files)}")
+    Args:
+        audio_chunks (List[bytes]): prepare_segment_for_assemblyで整えたトランスクリプト順の音声データ
 
-        # 最終的な結合ファイルの準備
-        final_audio_file = NamedTemporaryFile(
-            dir=TEMP_DIR,
-            delete=False,
-            suffix=".mp3"
-        ).name
+    Returns:
+        str: 結合された音声ファイルのパス
+    """
+    with _open_encoder() as encoder:
+        for audio_chunk in audio_chunks:
+            encoder.write(audio_chunk)
+    return encoder.output_file
 
-        # 音声ファイルの結合
-        file_list = create_ffmpeg_input_file(temp_files)
-        concat_audio_files(file_list, final_audio_file)
+def stream_audio_from_transcript(
+    transcript: Iterable[DialogueItem],
+    speaker_1_voice: str,
+    speaker_2_voice: str,
+    audio_model: str,
+    openai_api_key: str = None
+) -> Iterator[Tuple[Optional[bytes], Optional[str]]]:
+    """トランスクリプトから音声を生成し、完成したセグメントから順に返す
+
+    Args:
+        transcript (Iterable[DialogueItem]): 生成するトランスクリプト
+        speaker_1_voice (str): ホストの声
+        speaker_2_voice (str): ゲストの声
+        audio_model (str): 使用する音声モデル
+        openai_api_key (str, optional): OpenAI APIキー. Defaults to None.
+
+    Yields:
+        Tuple[Optional[bytes], Optional[str]]:
+            各セグメントごとに (音声データ, None)、最後に (None, 結合された音声ファイルのパス)
+    """
+    try:
+        # 完成したセグメントから順にエンコーダーへ流し込む
+        with _open_encoder() as encoder:
+            for audio_chunk in iter_audio_segments(
+                transcript, speaker_1_voice, speaker_2_voice, audio_model, openai_api_key
+            ):
+                encoder.write(audio_chunk)
+                yield audio_chunk, None
+        final_audio_file = encoder.output_file
 
     except Exception as e:
         logger.error(f"音声生成処理中にエラーが発生しました: {str(e)}")
         raise
-    finally:
-        # 一時ファイルのクリーンアップ
-        cleanup_temp_files(temp_files)
-        cleanup_old_files()
 
+    yield None, final_audio_file
+
+def generate_audio_from_transcript(
+    transcript: Iterable[DialogueItem],
+    speaker_1_voice: str,
+    speaker_2_voice: str,
+    audio_model: str,
+    openai_api_key: str = None
+) -> str:
+    """トランスクリプトから音声を生成する
+
+    transcriptにはジェネレータも渡せる。その場合は対話行を受け取るたびに
+    音声生成タスクを投入するため、LLMの生成と音声合成が並行して進む。
+
+    Args:
+        transcript (Iterable[DialogueItem]): 生成するトランスクリプト
+        speaker_1_voice (str): ホストの声
+        speaker_2_voice (str): ゲストの声
+        audio_model (str): 使用する音声モデル
+        openai_api_key (str, optional): OpenAI APIキー. Defaults to None.
+
+    Returns:
+        str: 生成された音声ファイルのパス
+    """
+    final_audio_file = None
+    for _, final_audio_file in stream_audio_from_transcript(
+        transcript, speaker_1_voice, speaker_2_voice, audio_model, openai_api_key
+    ):
+        pass
     return final_audio_file
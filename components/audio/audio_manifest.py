@@ -0,0 +1,162 @@
+import difflib
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from loguru import logger
+from pydantic import BaseModel
+from .audio_ffmpeg import AUDIO_ASSEMBLY_MODE
+from .audio_planner import PlannedSegment
+
+# 再生成時に前回のエピソードから変更のないセグメントを再利用する
+INCREMENTAL_AUDIO_ENABLED = os.getenv("INCREMENTAL_AUDIO_ENABLED", "true").lower() in ("1", "true", "yes")
+
+class ManifestSegment(BaseModel):
+    """エピソード内の1セグメント"""
+    index: int
+    speaker: str
+    voice: str
+    text: str
+    first_line: int
+    last_line: int
+    # make_segment_keyによる内容のキー（テキスト・声・モデル・エンドポイント）
+    key: str
+    segment_file: Optional[str] = None
+    # エピソード内のバイト位置（stream_copyの場合のみ）
+    offset: Optional[int] = None
+    length: int
+
+class SegmentManifest(BaseModel):
+    """エピソードの対話行・セグメント・音声の対応表
+
+    再生成時は新しいトランスクリプトのセグメントをこの対応表と比較し、
+    内容が変わっていないセグメントは保存済みの音声を再利用する。
+    """
+    job_id: str
+    audio_model: str
+    assembly_mode: str
+    episode_path: str
+    segments: List[ManifestSegment]
+    created_at: float
+
+    def by_key(self) -> Dict[str, ManifestSegment]:
+        """内容のキー -> セグメント"""
+        return {segment.key: segment for segment in self.segments}
+
+def build_manifest(
+    job_id: str,
+    segments: Sequence[PlannedSegment],
+    keys: Sequence[str],
+    segment_files: Sequence[str],
+    audio_model: str,
+    episode_path: str
+) -> SegmentManifest:
+    """結合したエピソードの対応表を作成する
+
+    stream_copyの場合、エピソードはセグメントのバイト列をそのまま連結したものなので、
+    各セグメントのバイト位置を記録する。
+
+    Args:
+        job_id (str): ジョブID
+        segments (Sequence[PlannedSegment]): 再生順のセグメント
+        keys (Sequence[str]): セグメントごとの内容のキー
+        segment_files (Sequence[str]): セグメントごとの音声ファイル
+        audio_model (str): 使用した音声モデル
+        episode_path (str): 結合した音声ファイル
+
+    Returns:
+        SegmentManifest: 対応表
+    """
+    lengths = [os.path.getsize(path) for path in segment_files]
+    offsets: List[Optional[int]] = [None] * len(lengths)
+    if AUDIO_ASSEMBLY_MODE == "stream_copy" and sum(lengths) == os.path.getsize(episode_path):
+        position = 0
+        for i, length in enumerate(lengths):
+            offsets[i] = position
+            position += length
+    return SegmentManifest(
+        job_id=job_id,
+        audio_model=audio_model,
+        assembly_mode=AUDIO_ASSEMBLY_MODE,
+        episode_path=episode_path,
+        segments=[
+            ManifestSegment(
+                index=segment.index, speaker=segment.speaker, voice=segment.voice, text=segment.text,
+                first_line=segment.first_line, last_line=segment.last_line, key=key,
+                segment_file=segment_file, offset=offset, length=length
+            )
+            for segment, key, segment_file, offset, length in zip(segments, keys, segment_files, offsets, lengths)
+        ],
+        created_at=time.time()
+    )
+
+def diff_segments(previous: SegmentManifest, keys: Sequence[str]) -> Dict[str, int]:
+    """前回のエピソードと新しいトランスクリプトのセグメントを比較する
+
+    Args:
+        previous (SegmentManifest): 前回のエピソードの対応表
+        keys (Sequence[str]): 新しいトランスクリプトのセグメントごとの内容のキー
+
+    Returns:
+        Dict[str, int]: 変更なし・変更・追加・削除されたセグメントの数
+    """
+    counts = {"unchanged": 0, "changed": 0, "inserted": 0, "deleted": 0}
+    matcher = difflib.SequenceMatcher(a=[segment.key for segment in previous.segments], b=list(keys), autojunk=False)
+    for tag, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        if tag == "equal":
+            counts["unchanged"] += b_end - b_start
+        elif tag == "replace":
+            counts["changed"] += min(a_end - a_start, b_end - b_start)
+            counts["inserted"] += max(0, (b_end - b_start) - (a_end - a_start))
+            counts["deleted"] += max(0, (a_end - a_start) - (b_end - b_start))
+        elif tag == "insert":
+            counts["inserted"] += b_end - b_start
+        elif tag == "delete":
+            counts["deleted"] += a_end - a_start
+    return counts
+
+def reuse_segment(manifest: SegmentManifest, segment: ManifestSegment, destination: Path) -> bool:
+    """前回のエピソードのセグメントを新しいジョブのセグメントとして保存する
+
+    前回のジョブのセグメントファイルが残っている場合はリンク（できない場合は複製）し、
+    削除済みの場合はstream_copyのエピソードから該当するバイト範囲を切り出す。
+
+    Args:
+        manifest (SegmentManifest): 前回のエピソードの対応表
+        segment (ManifestSegment): 再利用するセグメント
+        destination (Path): 保存先
+
+    Returns:
+        bool: 再利用できた場合はTrue
+    """
+    if manifest.assembly_mode != AUDIO_ASSEMBLY_MODE:
+        # 結合方式によってセグメントのエンコードが異なるため再利用しない
+        return False
+    tmp_path = destination.with_suffix(".tmp")
+    try:
+        if segment.segment_file and os.path.exists(segment.segment_file):
+            # セグメントファイルは置き換えで更新され、上書きされないためリンクできる
+            try:
+                os.link(segment.segment_file, tmp_path)
+            except OSError:
+                shutil.copyfile(segment.segment_file, tmp_path)
+            os.replace(tmp_path, destination)
+            return True
+        if segment.offset is not None and os.path.exists(manifest.episode_path):
+            with open(manifest.episode_path, "rb") as f:
+                f.seek(segment.offset)
+                audio_chunk = f.read(segment.length)
+            if len(audio_chunk) != segment.length:
+                return False
+            with open(tmp_path, "wb") as f:
+                f.write(audio_chunk)
+            os.replace(tmp_path, destination)
+            return True
+    except OSError as e:
+        logger.warning(f"前回のセグメントを再利用できませんでした: {segment.index} - {str(e)}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return False
@@ -0,0 +1,147 @@
+import os
+import re
+from typing import Iterable, Iterator, List, Sequence, Tuple
+from loguru import logger
+from pydantic import BaseModel
+from ..data_models import DialogueItem
+
+# 1回のTTSリクエストに送る最大文字数（超える行は文の区切りで分割する）
+TTS_SEGMENT_MAX_CHARS = int(os.getenv("TTS_SEGMENT_MAX_CHARS", "1000"))
+# 同じ話者の連続した行をまとめる際の文字数の上限（0でまとめない）
+TTS_SEGMENT_MERGE_CHARS = int(os.getenv("TTS_SEGMENT_MERGE_CHARS", "300"))
+
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？!?])")
+_CLAUSE_END_PATTERN = re.compile(r"(?<=[、，,])")
+
+class PlannedSegment(BaseModel):
+    """TTSに送る1リクエスト分のセグメント"""
+    index: int
+    speaker: str
+    voice: str
+    text: str
+    # セグメントに含まれる対話行の範囲（トランスクリプト内の位置、両端を含む）
+    first_line: int = 0
+    last_line: int = 0
+
+def segment_text_and_voice(line: DialogueItem, speaker_1_voice: str, speaker_2_voice: str) -> Tuple[str, str]:
+    """対話行から読み上げるテキストと使用する声を決定する
+
+    Args:
+        line (DialogueItem): 対話行
+        speaker_1_voice (str): ホストの声
+        speaker_2_voice (str): ゲストの声
+
+    Returns:
+        Tuple[str, str]: (テキスト, 声)
+    """
+    text = line.text.split(":", 1)[1].strip() if ":" in line.text else line.text.strip()
+    voice = speaker_1_voice if line.speaker == "ホスト" else speaker_2_voice
+    return text, voice
+
+def _pack(pieces: List[str], max_chars: int) -> List[str]:
+    """区切られたテキストを上限文字数以内にまとめる"""
+    packed = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            packed.append(current)
+            current = ""
+        current += piece
+    if current:
+        packed.append(current)
+    return packed
+
+def split_text_for_tts(text: str, max_chars: int = TTS_SEGMENT_MAX_CHARS) -> List[str]:
+    """長いテキストを文の区切り（。！？）で上限文字数以内に分割する
+
+    1文で上限を超える場合は読点で、それでも超える場合は文字数で分割する。
+
+    Args:
+        text (str): 分割するテキスト
+        max_chars (int, optional): 1セグメントの最大文字数. Defaults to TTS_SEGMENT_MAX_CHARS.
+
+    Returns:
+        List[str]: 分割されたテキスト
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    for sentence in _SENTENCE_END_PATTERN.split(text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_END_PATTERN.split(sentence):
+            pieces.extend(clause[i:i + max_chars] for i in range(0, len(clause), max_chars))
+    return [piece.strip() for piece in _pack([p for p in pieces if p], max_chars) if piece.strip()]
+
+def plan_segments(
+    transcript: Iterable[DialogueItem],
+    speaker_1_voice: str,
+    speaker_2_voice: str,
+    max_chars: int = TTS_SEGMENT_MAX_CHARS,
+    merge_chars: int = TTS_SEGMENT_MERGE_CHARS
+) -> Iterator[PlannedSegment]:
+    """トランスクリプトをTTSリクエスト単位のセグメントに変換する
+
+    同じ話者の連続した行はmerge_charsまでまとめて1リクエストにし、
+    max_charsを超える行は文の区切りで分割する。transcriptにはジェネレータも
+    渡せる。その場合は話者が変わった時点でセグメントを確定して返す。
+
+    Args:
+        transcript (Iterable[DialogueItem]): トランスクリプト
+        speaker_1_voice (str): ホストの声
+        speaker_2_voice (str): ゲストの声
+        max_chars (int, optional): 1セグメントの最大文字数. Defaults to TTS_SEGMENT_MAX_CHARS.
+        merge_chars (int, optional): 行をまとめる際の最大文字数. Defaults to TTS_SEGMENT_MERGE_CHARS.
+
+    Yields:
+        PlannedSegment: 再生順のセグメント
+    """
+    index = 0
+    pending: List[str] = []
+    pending_speaker = pending_voice = None
+    first_line = last_line = 0
+
+    def flush() -> Iterator[PlannedSegment]:
+        nonlocal index
+        if not pending:
+            return
+        for text in split_text_for_tts("\n".join(pending), max_chars):
+            yield PlannedSegment(
+                index=index, speaker=pending_speaker, voice=pending_voice, text=text,
+                first_line=first_line, last_line=last_line
+            )
+            index += 1
+        pending.clear()
+
+    for line_index, line in enumerate(transcript):
+        text, voice = segment_text_and_voice(line, speaker_1_voice, speaker_2_voice)
+        if not text:
+            continue
+        pending_chars = sum(len(t) + 1 for t in pending)
+        if pending and voice == pending_voice and pending_chars + len(text) <= merge_chars:
+            pending.append(text)
+            last_line = line_index
+            continue
+        yield from flush()
+        pending.append(text)
+        pending_speaker, pending_voice = line.speaker, voice
+        first_line = last_line = line_index
+    yield from flush()
+
+def longest_first(segments: Sequence[PlannedSegment]) -> List[PlannedSegment]:
+    """時間のかかる長いセグメントから投入するための順序を返す
+
+    Args:
+        segments (Sequence[PlannedSegment]): 再生順のセグメント
+
+    Returns:
+        List[PlannedSegment]: 文字数の降順に並べたセグメント
+    """
+    ordered = sorted(segments, key=lambda segment: len(segment.text), reverse=True)
+    if ordered:
+        logger.info(
+            f"セグメント計画: {len(ordered)}個 | 最長 {len(ordered[0].text)}文字 | 最短 {len(ordered[-1].text)}文字"
+        )
+    return ordered
@@ -2,7 +2,7 @@ import os
 from tempfile import NamedTemporaryFile
 from loguru import logger
 
-TEMP_DIR = "/app/gradio_cached_examples/tmp/"
+TEMP_DIR = os.getenv("AUDIO_TEMP_DIR", "/app/gradio_cached_examples/tmp/")
 
 def save_audio_file(audio_data: bytes) -> str:
     """音声データを一時ファイルとして保存する
@@ -0,0 +1,295 @@
+"""
+ディレクトリまたはマニフェストに含まれる文書を一括で音声に変換するCLI
+
+使い方:
+    python -m components.batch docs/ -o output/
+    python -m components.batch manifest.txt -o output/ --template lecture --jobs 4
+
+出力ディレクトリには文書ごとの音声(.mp3)とトランスクリプト(.txt)、および
+文書ごとの結果と処理時間を記録したresults.jsonが作成される。再実行時は
+完了済みの文書をスキップし、途中で中断した文書は最後に完了したステージから再開する。
+"""
+import argparse
+import concurrent.futures as cf
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+# 各モジュールは読み込み時に環境変数を参照するため、先に.envを読み込む
+load_dotenv()
+
+from loguru import logger
+from .artifact_store import start_artifact_janitor
+from .audio.audio_concurrency import get_concurrency_controller
+from .dialogue_generation import DialogueConfig
+from .document_extraction import extract_pdfs_parallel, iter_pdf_chunks
+from .extraction_cache import file_digest
+from .instruction_templates import get_template, template_names
+from .logging_config import setup_logging
+from .pipeline import PipelineInputError, PipelineJob, make_job_id, run_pipeline
+from .text_cleanup import APPENDIX, REFERENCES, CleanupOptions, clean_pages, is_cleanup_enabled, report_cleanup
+
+BATCH_DOCUMENT_CONCURRENCY = int(os.getenv("BATCH_DOCUMENT_CONCURRENCY", "2"))
+
+SUPPORTED_EXTENSIONS = (".pdf", ".md", ".txt")
+RESULTS_FILE = "results.json"
+
+def collect_documents(source: Path, recursive: bool = False) -> List[Path]:
+    """変換する文書を収集する
+
+    Args:
+        source (Path): 文書のディレクトリ、またはパスを1行に1つ（またはJSONの配列で）記載したマニフェスト
+        recursive (bool, optional): ディレクトリをサブディレクトリまで探索する. Defaults to False.
+
+    Returns:
+        List[Path]: 文書のパス
+    """
+    if source.is_dir():
+        pattern = "**/*" if recursive else "*"
+        documents = [p for p in sorted(source.glob(pattern)) if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS]
+    else:
+        content = source.read_text(encoding="utf-8")
+        if source.suffix.lower() == ".json":
+            entries = json.loads(content)
+        else:
+            entries = [line.strip() for line in content.splitlines() if line.strip() and not line.startswith("#")]
+        # マニフェスト内の相対パスはマニフェストの場所を基準にする
+        documents = [(source.parent / entry).resolve() for entry in entries]
+
+    # 同じ文書が複数回指定されても一度だけ変換する
+    return list(dict.fromkeys(p.resolve() for p in documents))
+
+def _output_names(documents: List[Path], digests: Dict[Path, str]) -> Dict[Path, str]:
+    """出力ファイル名を決定する（同じファイル名の文書はダイジェストで区別する）"""
+    stems: Dict[str, int] = {}
+    for document in documents:
+        stems[document.stem] = stems.get(document.stem, 0) + 1
+    return {
+        document: document.stem if stems[document.stem] == 1 else f"{document.stem}-{digests[document][:8]}"
+        for document in documents
+    }
+
+class ResultsManifest:
+    """文書ごとの変換結果を記録するマニフェスト（1文書完了するごとに保存する）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries: Dict[str, Dict[str, Any]] = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def is_done(self, document: Path, digest: str) -> bool:
+        """内容が変わっていない文書の変換が完了しているかどうか"""
+        entry = self.entries.get(str(document))
+        return bool(
+            entry and entry.get("status") == "done" and entry.get("digest") == digest
+            and Path(entry.get("audio", "")).exists()
+        )
+
+    def record(self, document: Path, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.entries[str(document)] = entry
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+def convert_document(
+    document: Path,
+    job_id: str,
+    output_name: str,
+    output_dir: Path,
+    dialogue_config: DialogueConfig,
+    args: argparse.Namespace
+) -> Dict[str, Any]:
+    """1つの文書を変換し、出力ディレクトリに音声とトランスクリプトを保存する
+
+    Returns:
+        Dict[str, Any]: マニフェストに記録する結果（ステージごとの経過時間を含む）
+    """
+    started = time.perf_counter()
+    stage_seconds: Dict[str, float] = {}
+
+    def on_stage(stage: str) -> None:
+        stage_seconds[stage] = round(time.perf_counter() - started, 2)
+
+    job = PipelineJob(job_id, on_stage=on_stage)
+    audio_path, dialogue_lines, combined_text = run_pipeline(
+        job,
+        [str(document)],
+        dialogue_config,
+        speaker_1_voice=args.host_voice,
+        speaker_2_voice=args.guest_voice,
+        audio_model=args.audio_model,
+        api_key=os.getenv("LLM_API_KEY"),
+        cleanup=CleanupOptions.from_sections(args.strip_sections)
+    )
+
+    audio_output = output_dir / f"{output_name}.mp3"
+    transcript_output = output_dir / f"{output_name}.txt"
+    shutil.copyfile(audio_path, audio_output)
+    transcript_output.write_text(
+        "\n\n".join([f"{line.speaker}: {line.text}" for line in dialogue_lines]), encoding="utf-8"
+    )
+    return {
+        "status": "done",
+        "audio": str(audio_output),
+        "transcript": str(transcript_output),
+        "characters": len(combined_text),
+        "dialogue_lines": len(dialogue_lines),
+        "seconds": round(time.perf_counter() - started, 2),
+        "stage_seconds": stage_seconds,
+    }
+
+def _prefetch_pdfs(
+    documents: List[Path],
+    jobs: Dict[Path, PipelineJob],
+    cleanup: Optional[CleanupOptions] = None
+) -> Dict[Path, float]:
+    """すべてのPDFのページを1つのプロセスプールでまとめて抽出し、各ジョブの抽出ステージとして保存する
+
+    クリーンアップが有効な場合は、単独で変換する場合と同じく文書ごとに柱・フッターなどを除去してから保存する。
+
+    Returns:
+        Dict[Path, float]: 文書ごとの抽出時間[秒]（ページごとの処理時間の合計）
+    """
+    pdfs = [document for document in documents if document.suffix.lower() == ".pdf" and not jobs[document].load("extract")]
+    if not pdfs:
+        return {}
+    logger.info(f"PDFのテキストを一括抽出します: {len(pdfs)}ファイル")
+    extract_seconds = {}
+    for document, extraction in extract_pdfs_parallel(pdfs).items():
+        if extraction is None:
+            continue
+        pages = extraction.pages
+        if is_cleanup_enabled(cleanup):
+            pages, stats = clean_pages(pages, cleanup)
+            report_cleanup(stats)
+        text = "".join(iter_pdf_chunks(pages))
+        if text.strip():
+            jobs[document].save("extract", {"combined_text": text})
+            extract_seconds[document] = round(sum(extraction.page_seconds), 2)
+    return extract_seconds
+
+def run_batch(args: argparse.Namespace) -> int:
+    """一括変換を実行する
+
+    Returns:
+        int: 終了コード（失敗した文書がある場合は1）
+    """
+    template = get_template(args.template)
+    dialogue_config = DialogueConfig(
+        model_name=args.text_model,
+        template_type=args.template,
+        intro_instructions=template["intro"],
+        text_instructions=template["text_instructions"],
+        scratch_pad_instructions=template["scratch_pad"],
+        prelude_dialog=template["prelude"],
+        podcast_dialog_instructions=template["dialog"],
+        api_base=os.getenv("LLM_API_BASE"),
+        bypass_cache=args.force
+    )
+    settings = {
+        "text_model": args.text_model,
+        "template": args.template,
+        "audio_model": args.audio_model,
+        "host_voice": args.host_voice,
+        "guest_voice": args.guest_voice,
+        "llm_api_base": os.getenv("LLM_API_BASE"),
+        "strip_sections": args.strip_sections,
+    }
+    if args.force:
+        # 保存済みのチェックポイントとエピソードを再利用しないように別のジョブにする
+        settings["fresh_sample"] = uuid.uuid4().hex
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = ResultsManifest(output_dir / RESULTS_FILE)
+
+    documents = collect_documents(Path(args.source), args.recursive)
+    missing = [document for document in documents if not document.is_file()]
+    for document in missing:
+        logger.error(f"ファイルが存在しません: {document}")
+        manifest.record(document, {"status": "failed", "error": "ファイルが存在しません"})
+    documents = [document for document in documents if document.is_file()]
+
+    digests = {document: file_digest(document) for document in documents}
+    names = _output_names(documents, digests)
+    pending = [
+        document for document in documents
+        if args.force or not manifest.is_done(document, digests[document])
+    ]
+    logger.info(f"文書数: {len(documents)} | 変換対象: {len(pending)} | 完了済み: {len(documents) - len(pending)}")
+    if not pending:
+        return 1 if missing else 0
+
+    jobs = {document: PipelineJob(make_job_id([str(document)], settings, None, None)) for document in pending}
+    extract_seconds = _prefetch_pdfs(pending, jobs, CleanupOptions.from_sections(args.strip_sections))
+
+    failed = len(missing)
+    started = time.perf_counter()
+    # TTSの同時実行数はエンドポイントごとのコントローラーで全文書に共有される
+    with cf.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {
+            executor.submit(
+                convert_document, document, jobs[document].job_id, names[document], output_dir, dialogue_config, args
+            ): document
+            for document in pending
+        }
+        for future in cf.as_completed(futures):
+            document = futures[future]
+            entry = {"digest": digests[document], "job_id": jobs[document].job_id}
+            try:
+                entry.update(future.result())
+                if document in extract_seconds:
+                    entry["extract_seconds"] = extract_seconds[document]
+                logger.info(f"変換完了: {document.name} ({entry['seconds']}秒)")
+            except Exception as e:
+                failed += 1
+                error = str(e) if isinstance(e, PipelineInputError) else f"{type(e).__name__}: {str(e)}"
+                entry.update(status="failed", error=error)
+                logger.error(f"変換失敗: {document.name} - {error}")
+            entry["finished_at"] = time.time()
+            manifest.record(document, entry)
+
+    logger.info(
+        f"一括変換完了: 成功 {len(pending) + len(missing) - failed} | 失敗 {failed} | "
+        f"{time.perf_counter() - started:.2f}秒 | TTS同時実行数: {get_concurrency_controller(os.getenv('TTS_API_BASE')).stats()}"
+    )
+    return 1 if failed else 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="文書を一括で音声に変換する")
+    parser.add_argument("source", help="文書のディレクトリ、またはパスを記載したマニフェスト（1行1パス、または.jsonの配列）")
+    parser.add_argument("-o", "--output-dir", required=True, help="音声・トランスクリプト・results.jsonの出力先")
+    parser.add_argument("--template", default="podcast", choices=template_names(), help="指示テンプレート")
+    parser.add_argument("--text-model", default=os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini"), help="テキスト生成モデル")
+    parser.add_argument("--audio-model", default=os.getenv("DEFAULT_TTS_MODEL", "tts-1"), help="音声生成モデル")
+    parser.add_argument("--host-voice", default=os.getenv("DEFAULT_HOST_VOICE", "alloy"), help="ホストの声")
+    parser.add_argument("--guest-voice", default=os.getenv("DEFAULT_GUEST_VOICE", "echo"), help="ゲストの声")
+    parser.add_argument("--jobs", type=int, default=BATCH_DOCUMENT_CONCURRENCY, help="同時に変換する文書の数")
+    parser.add_argument("--recursive", action="store_true", help="サブディレクトリの文書も変換する")
+    parser.add_argument("--force", action="store_true", help="完了済みの文書も、保存済みの結果とLLMキャッシュを使用せずに再変換する")
+    parser.add_argument(
+        "--strip-sections", nargs="*", default=[], choices=[REFERENCES, APPENDIX],
+        help="抽出したテキストから除去するセクション（LLMの入力トークンを削減する）"
+    )
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    # キャッシュの設定に関わらず、一時ファイルとジョブディレクトリのディスク使用量を管理する
+    start_artifact_janitor()
+    return run_batch(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from loguru import logger
+from pydantic import BaseModel
+from .metrics import record_cache_lookup
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "/app/gradio_cached_examples/llm_cache/")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+
+class CachedCompletion(BaseModel):
+    """キャッシュされたLLMの応答"""
+    content: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    created_at: float
+
+def make_completion_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    base_url: Optional[str]
+) -> str:
+    """LLMリクエストのキャッシュキーを生成する
+
+    Args:
+        model (str): モデル名
+        messages (List[Dict[str, str]]): 送信するメッセージ
+        temperature (float): temperature
+        max_tokens (int): 最大トークン数
+        base_url (Optional[str]): LLM APIのベースURL
+
+    Returns:
+        str: SHA-256のハッシュ値
+    """
+    payload = json.dumps(
+        [model, messages, temperature, max_tokens, base_url or ""],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CompletionCache:
+    """LLMの応答をディスクに保存するLRUキャッシュ（有効期限付き）"""
+
+    def __init__(
+        self,
+        cache_dir: str = LLM_CACHE_DIR,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # キー -> ファイルサイズ（最後に参照された順）
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self) -> None:
+        """既存のキャッシュファイルを更新日時順に読み込む"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+            for _, key, size in sorted(entries):
+                self._index[key] = size
+                self._total_bytes += size
+            logger.info(f"LLMキャッシュを読み込みました: {len(self._index)}件, {self._total_bytes}バイト")
+        except Exception as e:
+            logger.warning(f"LLMキャッシュの読み込みに失敗しました: {str(e)}")
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+        record_cache_lookup("llm_completion", False)
+
+    def _remove(self, key: str) -> None:
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[CachedCompletion]:
+        """キャッシュから応答を取得する（有効期限を過ぎた応答は削除する）
+
+        Args:
+            key (str): キャッシュキー
+
+        Returns:
+            Optional[CachedCompletion]: 応答。存在しない場合はNone
+        """
+        with self._lock:
+            known = key in self._index
+            if known:
+                self._index.move_to_end(key)
+        if not known:
+            self._miss()
+            return None
+        try:
+            path = self._path(key)
+            with open(path, "r", encoding="utf-8") as f:
+                cached = CachedCompletion(**json.load(f))
+            if time.time() - cached.created_at > self.ttl_seconds:
+                logger.debug(f"LLMキャッシュの有効期限切れ: {key}")
+                self._remove(key)
+                self._miss()
+                return None
+            os.utime(path)
+        except Exception as e:
+            logger.warning(f"LLMキャッシュの読み込みに失敗: {key} - {str(e)}")
+            self._remove(key)
+            self._miss()
+            return None
+        with self._lock:
+            self.hits += 1
+        record_cache_lookup("llm_completion", True)
+        return cached
+
+    def put(
+        self,
+        key: str,
+        content: str,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None
+    ) -> None:
+        """応答をキャッシュに保存する
+
+        Args:
+            key (str): キャッシュキー
+            content (str): 応答のテキスト
+            prompt_tokens (Optional[int], optional): 入力トークン数. Defaults to None.
+            completion_tokens (Optional[int], optional): 出力トークン数. Defaults to None.
+        """
+        if not content:
+            return
+        data = CachedCompletion(
+            content=content, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, created_at=time.time()
+        ).model_dump_json().encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"LLMキャッシュの保存に失敗: {key} - {str(e)}")
+            return
+
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            evicted = []
+            while self._total_bytes > self.max_bytes and self._index:
+                evicted_key, size = self._index.popitem(last=False)
+                self._total_bytes -= size
+                evicted.append(evicted_key)
+
+        for evicted_key in evicted:
+            try:
+                os.remove(self._path(evicted_key))
+            except OSError:
+                pass
+        if evicted:
+            logger.debug(f"LLMキャッシュから{len(evicted)}件を削除しました")
+
+    def stats(self) -> Dict[str, float]:
+        """キャッシュの統計情報を返す
+
+        Returns:
+            Dict[str, float]: ヒット数、ミス数、件数、使用バイト数など
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+_completion_cache: Optional[CompletionCache] = None
+_completion_cache_lock = threading.Lock()
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """共有のLLMキャッシュを取得する
+
+    Returns:
+        Optional[CompletionCache]: キャッシュが無効な場合はNone
+    """
+    global _completion_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _completion_cache_lock:
+        if _completion_cache is None:
+            _completion_cache = CompletionCache()
+        return _completion_cache
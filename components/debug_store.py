@@ -0,0 +1,136 @@
+import concurrent.futures as cf
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+from loguru import logger
+
+DEBUG_LOG_ENABLED = os.getenv("DEBUG_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+DEBUG_LOG_DIR = os.getenv("DEBUG_LOG_DIR", "debug_logs")
+DEBUG_LOG_MAX_BYTES = int(os.getenv("DEBUG_LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+DEBUG_LOG_RETENTION_DAYS = float(os.getenv("DEBUG_LOG_RETENTION_DAYS", "7"))
+
+SUFFIX = ".json.gz"
+
+class DebugStore:
+    """LLM呼び出しなどのデバッグ情報を圧縮して保存するストア
+
+    記録は1件ずつgzip圧縮したJSONとして保存し、書き込みは専用のスレッドで行う。
+    合計サイズが上限を超えた場合と保持期間を過ぎた場合は古い記録から削除する。
+    """
+
+    def __init__(
+        self,
+        debug_dir: str = DEBUG_LOG_DIR,
+        max_bytes: int = DEBUG_LOG_MAX_BYTES,
+        retention_days: float = DEBUG_LOG_RETENTION_DAYS
+    ):
+        self.dir = Path(debug_dir)
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_days * 24 * 60 * 60
+        self._lock = threading.Lock()
+        # 記録のパス -> (サイズ, 更新日時)。古い順に並ぶ
+        self._index: "OrderedDict[Path, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._executor = cf.ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-store")
+        self._load_index()
+
+    def _load_index(self) -> None:
+        if not self.dir.is_dir():
+            return
+        entries = []
+        for path in self.dir.glob(f"*{SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        for mtime, path, size in sorted(entries):
+            self._index[path] = (size, mtime)
+            self._total_bytes += size
+
+    def save(self, data: Dict[str, Any], prefix: str = "debug") -> None:
+        """デバッグ情報を保存する（書き込みの完了は待たない）
+
+        Args:
+            data (Dict[str, Any]): 保存するデータ
+            prefix (str, optional): ファイル名のプレフィックス. Defaults to "debug".
+        """
+        self._executor.submit(self._write, data, prefix)
+
+    def flush(self) -> None:
+        """キューに入っている書き込みの完了を待つ"""
+        self._executor.submit(lambda: None).result()
+
+    def _write(self, data: Dict[str, Any], prefix: str) -> None:
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            path = self.dir / f"{prefix}_{timestamp}{SUFFIX}"
+            payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            with gzip.open(path, "wb", compresslevel=6) as f:
+                f.write(payload)
+            size = path.stat().st_size
+            with self._lock:
+                self._index[path] = (size, time.time())
+                self._total_bytes += size
+            logger.debug(f"デバッグ情報を保存しました: {path} ({size}バイト)")
+            self._prune()
+        except Exception as e:
+            logger.error(f"デバッグ情報の保存に失敗しました: {str(e)}")
+
+    def _prune(self) -> None:
+        """保持期間を過ぎた記録と、上限を超えた分の古い記録を削除する"""
+        cutoff = time.time() - self.retention_seconds
+        removed = []
+        with self._lock:
+            while self._index:
+                path, (size, mtime) = next(iter(self._index.items()))
+                if self._total_bytes <= self.max_bytes and mtime >= cutoff:
+                    break
+                self._index.popitem(last=False)
+                self._total_bytes -= size
+                removed.append(path)
+        for path in removed:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.debug(f"古いデバッグ情報を削除しました: {len(removed)}件")
+
+def iter_debug_records(debug_dir: str, prefix: str) -> Iterator[Dict[str, Any]]:
+    """ディレクトリ内の記録を古い順に読み込む（読み込めない記録は読み飛ばす）
+
+    Args:
+        debug_dir (str): 記録のディレクトリ
+        prefix (str): ファイル名のプレフィックス
+
+    Yields:
+        Dict[str, Any]: 記録の内容
+    """
+    # ファイル名にタイムスタンプを含むため、名前順が保存順になる
+    for path in sorted(Path(debug_dir).glob(f"{prefix}_*{SUFFIX}")):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                yield json.load(f)
+        except Exception as e:
+            logger.warning(f"デバッグ情報の読み込みに失敗: {path} - {str(e)}")
+
+_debug_store: Optional[DebugStore] = None
+_debug_store_lock = threading.Lock()
+
+def get_debug_store() -> Optional[DebugStore]:
+    """共有のデバッグ情報ストアを取得する（無効な場合はNone）"""
+    global _debug_store
+    if not DEBUG_LOG_ENABLED:
+        return None
+    with _debug_store_lock:
+        if _debug_store is None:
+            _debug_store = DebugStore()
+        return _debug_store
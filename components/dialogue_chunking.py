@@ -0,0 +1,215 @@
+import concurrent.futures as cf
+import re
+import time
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+from loguru import logger
+from .api_clients import get_llm_client
+from .dialogue_generation import DialogueConfig, lookup_completion
+from .metrics import observe_llm
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktokenのエンコーディングを取得する（tiktokenは任意の依存関係）"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+_SENTENCE_PATTERN = re.compile(r"(?<=[。．！？!?])|(?<=\.)\s+")
+
+def estimate_tokens(text: str) -> int:
+    """テキストのトークン数を見積もる
+
+    tiktokenが利用できる場合は実際にエンコードし、利用できない場合は
+    日本語1文字=1トークン、それ以外4文字=1トークンとして概算する。
+
+    Args:
+        text (str): 対象のテキスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4
+
+def _split_oversized(paragraph: str, max_tokens: int) -> List[str]:
+    """1段落が上限を超える場合に文単位、さらに文字数で分割する"""
+    pieces = []
+    current = ""
+    for sentence in _SENTENCE_PATTERN.split(paragraph):
+        if not sentence:
+            continue
+        if estimate_tokens(current + sentence) <= max_tokens:
+            current += sentence
+            continue
+        if current:
+            pieces.append(current)
+        # 1文だけで上限を超える場合は文字数で切る
+        while estimate_tokens(sentence) > max_tokens:
+            cut = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        current = sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_text_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """テキストを段落単位でトークン上限内のチャンクに分割する
+
+    Args:
+        text (str): 分割するテキスト
+        max_tokens (int): 1チャンクあたりの最大トークン数
+
+    Returns:
+        List[str]: 分割されたチャンク
+    """
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        paragraph_tokens = estimate_tokens(paragraph)
+        if paragraph_tokens > max_tokens:
+            pieces = _split_oversized(paragraph, max_tokens)
+        else:
+            pieces = [paragraph]
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def _build_chunk_system_prompt(index: int, total: int, config: DialogueConfig) -> str:
+    """セクション分析用のシステムプロンプトを構築する"""
+    system_prompt = f"""
+    あなたは長い文書をセクションごとに分析し、後でポッドキャスト対話を書くためのメモを作成するアシスタントです。
+    これは全{total}セクション中の第{index + 1}セクションです。
+
+    テキスト分析指示：
+    {config.text_instructions}
+
+    メモ帳指示：
+    {config.scratch_pad_instructions}
+
+    このセクションの重要な事実、数値、主張、具体例、興味深いポイントを日本語の箇条書きで簡潔にまとめてください。
+    対話そのものは書かないでください。
+    """
+    return system_prompt
+
+def analyze_chunk(chunk: str, index: int, total: int, config: DialogueConfig) -> Tuple[str, int, int]:
+    """1チャンク分のテキストを分析し、対話生成用のメモを作成する
+
+    Args:
+        chunk (str): 分析するテキスト
+        index (int): チャンク番号（0始まり）
+        total (int): チャンクの総数
+        config (DialogueConfig): 対話生成の設定
+
+    Returns:
+        Tuple[str, int, int]: (メモ, 入力トークン数, 出力トークン数)
+    """
+    client = get_llm_client(base_url=config.api_base)
+    system_prompt = _build_chunk_system_prompt(index, total, config)
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": chunk}
+    ]
+    cache, cache_key, cached = lookup_completion(config, messages, 0.3, config.chunk_notes_max_tokens)
+    if cached is not None:
+        return cached.content, cached.prompt_tokens or 0, cached.completion_tokens or 0
+
+    started = time.perf_counter()
+    response = client.chat.completions.create(
+        model=config.model_name,
+        messages=messages,
+        temperature=0.3,
+        max_tokens=config.chunk_notes_max_tokens
+    )
+    notes = response.choices[0].message.content or ""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or estimate_tokens(system_prompt + chunk)
+    completion_tokens = getattr(usage, "completion_tokens", None) or estimate_tokens(notes)
+    observe_llm("chunk_analysis", config.model_name, time.perf_counter() - started, prompt_tokens, completion_tokens)
+    if cache is not None:
+        cache.put(cache_key, notes, prompt_tokens, completion_tokens)
+    logger.info(
+        f"セクション分析完了: {index + 1}/{total} | 入力 {prompt_tokens} トークン | "
+        f"出力 {completion_tokens} トークン | {time.perf_counter() - started:.2f}秒"
+    )
+    return notes, prompt_tokens, completion_tokens
+
+def _merge_notes(results: List[Tuple[str, int, int]], started: float) -> str:
+    """セクションごとのメモをセクション順に結合する"""
+    merged_notes = "\n\n".join(
+        f"## セクション {i + 1}/{len(results)}\n{notes.strip()}"
+        for i, (notes, _, _) in enumerate(results)
+    )
+    logger.info(
+        f"セクション分析の合計: 入力 {sum(r[1] for r in results)} トークン | "
+        f"出力 {sum(r[2] for r in results)} トークン | {time.perf_counter() - started:.2f}秒"
+    )
+    logger.info(f"対話生成に渡すメモ: {estimate_tokens(merged_notes)} トークン")
+    return merged_notes
+
+def _plan_chunks(text: str, config: DialogueConfig) -> List[str]:
+    """入力テキストが閾値を超える場合にセクションへ分割する（分割不要の場合は空リスト）"""
+    total_tokens = estimate_tokens(text)
+    if total_tokens <= config.chunking_threshold_tokens:
+        logger.info(f"入力テキスト: {total_tokens} トークン（分割なし）")
+        return []
+
+    chunks = split_text_into_chunks(text, config.chunk_tokens)
+    logger.info(
+        f"入力テキスト: {total_tokens} トークン | {len(chunks)}セクションに分割 "
+        f"(上限 {config.chunk_tokens} トークン, 同時実行数 {min(config.chunk_concurrency, len(chunks))})"
+    )
+    return chunks
+
+def prepare_dialogue_source(
+    text: str,
+    config: DialogueConfig,
+    analyze: Optional[Callable[[str, int, int, DialogueConfig], Tuple[str, int, int]]] = None
+) -> str:
+    """対話生成に渡すテキストを準備する
+
+    入力テキストが閾値を超える場合は、トークン上限ごとのセクションに分割して
+    並列に分析し（map）、セクション順に結合したメモを返す（reduce）。
+    最終的な対話生成はこのメモに対して行う。閾値以下の場合は入力をそのまま返す。
+
+    Args:
+        text (str): 入力テキスト
+        config (DialogueConfig): 対話生成の設定
+        analyze (Optional[Callable[[str, int, int, DialogueConfig], Tuple[str, int, int]]], optional):
+            1セクションを分析する関数（パイプラインはセクションごとに再試行する関数を渡す）. Defaults to analyze_chunk.
+
+    Returns:
+        str: 対話生成に渡すテキスト
+    """
+    chunks = _plan_chunks(text, config)
+    if not chunks:
+        return text
+
+    analyze = analyze or analyze_chunk
+    started = time.perf_counter()
+    with cf.ThreadPoolExecutor(max_workers=max(1, min(config.chunk_concurrency, len(chunks)))) as executor:
+        futures = [
+            executor.submit(analyze, chunk, i, len(chunks), config)
+            for i, chunk in enumerate(chunks)
+        ]
+        results = [future.result() for future in futures]
+
+    return _merge_notes(results, started)
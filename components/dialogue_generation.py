@@ -1,26 +1,27 @@
-from typing import Optional, List, Dict, Any
-import json
-from pathlib import Path
-from pydantic import BaseModel, ValidationError
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from pydantic import BaseModel
 from loguru import logger
-import sys
-from openai import OpenAI
 import os
-import io
-import os
-from pathlib import Path
-from pydantic import BaseModel, ValidationError
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
-from loguru import logger
-import sys
-import json
+import time
 from datetime import datetime
-
-# ログの設定
-logger.remove()  # 既存のハンドラを削除
-logger.add(sys.stderr, format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
-logger.add("dialogue_generation.log", rotation="500 MB")  # ファイルにもログを出力
+from .api_clients import get_llm_client
+from .data_models import DialogueItem
+from .completion_cache import CachedCompletion, CompletionCache, get_completion_cache, make_completion_key
+from .debug_store import get_debug_store
+from .dialogue_parsing import (
+    DIALOGUE_OUTPUT_FORMAT,
+    DIALOGUE_REPAIR_ATTEMPTS,
+    DialogueStreamParser,
+    build_repair_messages,
+    dialogue_response_format,
+    format_instructions,
+    merge_repaired,
+    needs_repair,
+    parse_line,
+    render_dialogue
+)
+from .logging_config import truncate
+from .metrics import observe_llm
 
 class DialogueConfig(BaseModel):
     """対話生成の設定を定義するモデル"""
@@ -32,6 +33,15 @@ class DialogueConfig(BaseModel):
     prelude_dialog: str
     podcast_dialog_instructions: str
     api_base: Optional[str] = None
+    # 大きな入力を分割して分析する際の設定
+    chunking_threshold_tokens: int = int(os.getenv("DIALOGUE_CHUNKING_THRESHOLD_TOKENS", "12000"))
+    chunk_tokens: int = int(os.getenv("DIALOGUE_CHUNK_TOKENS", "6000"))
+    chunk_concurrency: int = int(os.getenv("DIALOGUE_CHUNK_CONCURRENCY", "4"))
+    chunk_notes_max_tokens: int = int(os.getenv("DIALOGUE_CHUNK_NOTES_MAX_TOKENS", "1500"))
+    # 対話生成の最大出力トークン数（打ち切りによる補完の呼び出しが例外的になるよう、モデルの上限の範囲で大きくする）
+    max_tokens: int = int(os.getenv("DIALOGUE_MAX_TOKENS", "4096"))
+    # Trueの場合はLLMキャッシュを参照せずに新しい応答を生成する（生成した応答はキャッシュに保存する）
+    bypass_cache: bool = False
 
 class DialogueLine(BaseModel):
     """対話の1行を定義するモデル"""
@@ -39,211 +49,439 @@ class DialogueLine(BaseModel):
     text: str
 
 def save_debug_info(data: dict, prefix: str = "debug"):
-    """デバッグ情報をJSONファイルに保存する関数
+    """デバッグ情報を圧縮してデバッグ情報ストアに保存する関数（書き込みの完了は待たない）
 
     Args:
         data (dict): 保存するデータ
         prefix (str, optional): ファイル名のプレフィックス. Defaults to "debug".
     """
-    try:
-        # デバッグ用ディレクトリの作成
-        debug_dir = Path("debug_logs")
-        debug_dir.mkdir(exist_ok=True)
-
-        # タイムスタンプを含むファイル名の生成
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = debug_dir / f"{prefix}_{timestamp}.json"
+    store = get_debug_store()
+    if store is not None:
+        store.save(data, prefix)
 
-        # JSONファイルとして保存
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"デバッグ情報を保存しました: {filename}")
+def lookup_completion(
+    config: DialogueConfig,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int
+) -> Tuple[Optional[CompletionCache], Optional[str], Optional[CachedCompletion]]:
+    """LLMキャッシュから同じリクエストの応答を探す
 
-    except Exception as e:
-        logger.error(f"デバッグ情報の保存に失敗しました: {str(e)}")
+    Args:
+        config (DialogueConfig): 対話生成の設定
+        messages (List[Dict[str, str]]): 送信するメッセージ
+        temperature (float): temperature
+        max_tokens (int): 最大トークン数
 
-@retry(
-    retry=retry_if_exception_type((ValidationError, Exception)),
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10)
-)
-def generate_dialogue(
+    Returns:
+        Tuple[Optional[CompletionCache], Optional[str], Optional[CachedCompletion]]:
+            (キャッシュ, キャッシュキー, キャッシュされた応答)。キャッシュが無効な場合はすべてNone
+    """
+    cache = get_completion_cache()
+    if cache is None:
+        return None, None, None
+    key = make_completion_key(config.model_name, messages, temperature, max_tokens, config.api_base)
+    if config.bypass_cache:
+        return cache, key, None
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"LLMキャッシュの応答を使用します: {key[:12]}")
+    return cache, key, cached
+
+def build_dialogue_prompts(
     text: str,
     config: DialogueConfig,
     edited_transcript: Optional[str] = None,
-    user_feedback: Optional[str] = None
-) -> List[DialogueLine]:
-    """対話を生成する関数
+    user_feedback: Optional[str] = None,
+    output_format: str = DIALOGUE_OUTPUT_FORMAT
+) -> Tuple[str, str]:
+    """対話生成用のシステムプロンプトとユーザープロンプトを構築する関数
 
     Args:
         text (str): 入力テキスト
         config (DialogueConfig): 対話生成の設定
         edited_transcript (Optional[str], optional): 編集済みトランスクリプト. Defaults to None.
         user_feedback (Optional[str], optional): ユーザーフィードバック. Defaults to None.
+        output_format (str, optional): 出力形式（"text"または"json"）. Defaults to DIALOGUE_OUTPUT_FORMAT.
 
     Returns:
-        List[DialogueLine]: 生成された対話テキスト
+        Tuple[str, str]: (システムプロンプト, ユーザープロンプト)
     """
-    try:
-        logger.info("対話生成を開始します")
-        logger.info(f"モデル名: {config.model_name}")
-        logger.info(f"テンプレートタイプ: {config.template_type}")
-        
-        # 入力テキストの処理
-        instruction_improve = 'Based on the original text, please generate an improved version of the dialogue by incorporating the edits, comments and feedback.'
-        edited_transcript_processed = (
-            "\nPreviously generated edited transcript, with specific edits and comments that I want you to carefully address:\n"
-            + "<edited_transcript>\n"
-            + (edited_transcript if edited_transcript else "")
-            + "</edited_transcript>"
-        ) if edited_transcript else ""
-        
+    # 入力テキストの処理
+    instruction_improve = 'Based on the original text, please generate an improved version of the dialogue by incorporating the edits, comments and feedback.'
+    edited_transcript_processed = (
+        "\nPreviously generated edited transcript, with specific edits and comments that I want you to carefully address:\n"
+        + "<edited_transcript>\n"
+        + (edited_transcript if edited_transcript else "")
+        + "</edited_transcript>"
+    ) if edited_transcript else ""
+    
+    user_feedback_processed = (
+        "\nOverall user feedback:\n\n"
+        + (user_feedback if user_feedback else "")
+    ) if user_feedback else ""
+
+    if edited_transcript_processed.strip() or user_feedback_processed.strip():
         user_feedback_processed = (
-            "\nOverall user feedback:\n\n"
-            + (user_feedback if user_feedback else "")
-        ) if user_feedback else ""
-
-        if edited_transcript_processed.strip() or user_feedback_processed.strip():
-            user_feedback_processed = (
-                "<requested_improvements>"
-                + user_feedback_processed
-                + "\n\n"
-                + instruction_improve
-                + "</requested_improvements>"
-            )
-
-        # OpenAIのAPIを使用して対話を生成
-        client = OpenAI(
-            api_key=os.getenv("LLM_API_KEY"),
-            base_url=config.api_base if config.api_base else os.getenv("LLM_API_BASE")
+            "<requested_improvements>"
+            + user_feedback_processed
+            + "\n\n"
+            + instruction_improve
+            + "</requested_improvements>"
         )
 
-        # システムプロンプトの構築
-        system_prompt = f"""
-        あなたは与えられたテキストを対話形式に変換するアシスタントです。
-        以下の指示に従って対話を生成してください：
+    # システムプロンプトの構築
+    system_prompt = f"""
+    あなたは与えられたテキストを対話形式に変換するアシスタントです。
+    以下の指示に従って対話を生成してください：
+
+    {format_instructions(output_format)}
 
-        【出力形式】
-        必ず以下の形式で出力してください：
-        ホスト: （テキスト）
-        ゲスト: （テキスト）
-        ホスト: （テキスト）
-        ...
+    【指示内容】
+    {config.intro_instructions}
 
-        各行は必ず「ホスト:」または「ゲスト:」で始まり、その後にコロンとスペース、そして発話内容が続きます。
-        この形式以外の出力は許可されません。
+    テキスト分析指示：
+    {config.text_instructions}
 
-        【指示内容】
-        {config.intro_instructions}
+    メモ帳指示：
+    {config.scratch_pad_instructions}
 
-        テキスト分析指示：
-        {config.text_instructions}
+    前置き対話：
+    {config.prelude_dialog}
 
-        メモ帳指示：
-        {config.scratch_pad_instructions}
+    対話指示：
+    ブレインストーミングセッションで考えた重要なポイントと創造的なアイデアに基づいて、とても長く、魅力的で有益なポッドキャスト対話をここに書いてください。会話的なトーンを使用し、一般的な聴衆にコンテンツを理解しやすくするために必要な文脈や説明を含めてください。
 
-        前置き対話：
-        {config.prelude_dialog}
+    対話の参加者に作り物の名前を使用せず、リスナーにとって魅力的で没入感のある体験を作り出してください。括弧付きのプレースホルダーを含めないでください。出力は音声に直接変換されることを想定して設計してください。
 
-        対話指示：
-        ブレインストーミングセッションで考えた重要なポイントと創造的なアイデアに基づいて、とても長く、魅力的で有益なポッドキャスト対話をここに書いてください。会話的なトーンを使用し、一般的な聴衆にコンテンツを理解しやすくするために必要な文脈や説明を含めてください。
+    対話をできるだけ長く詳細にしながら、トピックに焦点を当て、魅力的な流れを維持してください。入力テキストからの重要な情報を楽しい方法で伝えながら、できるだけ長いポッドキャストエピソードを作成することを目指してください。
+
+    対話の最後に、参加者に、彼らの議論から得られた主要な洞察とポイントを自然にまとめてもらってください。これは会話から自然に流れ出るべきで、重要なポイントをカジュアルな会話的な方法で繰り返すものです。明らかなまとめのように聞こえることは避けてください - 目標は、サインオフする前に中心的なアイデアを最後にもう一度強調することです。
+
+    ポッドキャストは約20,000語程度にしてください。
+    """
 
-        対話の参加者に作り物の名前を使用せず、リスナーにとって魅力的で没入感のある体験を作り出してください。括弧付きのプレースホルダーを含めないでください。出力は音声に直接変換されることを想定して設計してください。
+    # ユーザープロンプトの構築
+    user_prompt = f"""
+    以下のテキストを対話形式に変換してください：
 
-        対話をできるだけ長く詳細にしながら、トピックに焦点を当て、魅力的な流れを維持してください。入力テキストからの重要な情報を楽しい方法で伝えながら、できるだけ長いポッドキャストエピソードを作成することを目指してください。
+    {text}
 
-        対話の最後に、参加者に、彼らの議論から得られた主要な洞察とポイントを自然にまとめてもらってください。これは会話から自然に流れ出るべきで、重要なポイントをカジュアルな会話的な方法で繰り返すものです。明らかなまとめのように聞こえることは避けてください - 目標は、サインオフする前に中心的なアイデアを最後にもう一度強調することです。
+    {edited_transcript_processed if edited_transcript else ""}
+    {user_feedback_processed if user_feedback else ""}
+    """
 
-        ポッドキャストは約20,000語程度にしてください。
-        """
+    return system_prompt, user_prompt
 
-        # ユーザープロンプトの構築
-        user_prompt = f"""
-        以下のテキストを対話形式に変換してください：
+def parse_dialogue_line(line: str) -> Optional[DialogueLine]:
+    """1行のテキストから対話行を解析する関数
 
-        {text}
+    Args:
+        line (str): 解析する行
 
-        {edited_transcript_processed if edited_transcript else ""}
-        {user_feedback_processed if user_feedback else ""}
-        """
+    Returns:
+        Optional[DialogueLine]: 話者（ホスト・ゲスト）で始まる行の場合は対話行、それ以外はNone
+    """
+    if not line.strip():
+        return None
+    item = parse_line(line)
+    if item is None:
+        logger.debug(f"対話行ではない行をスキップします: {truncate(line)}")
+        return None
+    logger.bind(sample="dialogue_line").debug(f"分割結果 - 話者: {item.speaker}, テキスト: {truncate(item.text)}")
+    return DialogueLine(speaker=item.speaker, text=item.text)
+
+def _completion_kwargs(
+    config: DialogueConfig,
+    messages: List[Dict[str, str]],
+    output_format: str,
+    stream: bool = False
+) -> Dict[str, Any]:
+    """対話生成のリクエストのパラメータ"""
+    kwargs: Dict[str, Any] = dict(model=config.model_name, messages=messages, temperature=0.7, max_tokens=config.max_tokens)
+    if output_format == "json":
+        kwargs["response_format"] = dialogue_response_format()
+    if stream:
+        kwargs["stream"] = True
+    return kwargs
+
+def _record_completion(config: DialogueConfig, operation: str, started: float, response: Any) -> Tuple[str, Optional[str], Any]:
+    """応答のメトリクスを記録し、(テキスト, 終了理由, トークン数)を返す"""
+    usage = getattr(response, "usage", None)
+    observe_llm(
+        operation, config.model_name, time.perf_counter() - started,
+        getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    )
+    if usage:
+        logger.info(f"対話生成のトークン数: 入力 {usage.prompt_tokens} | 出力 {usage.completion_tokens}")
+    choice = response.choices[0]
+    return choice.message.content or "", getattr(choice, "finish_reason", None), usage
+
+def _request_completion(
+    client: Any,
+    config: DialogueConfig,
+    messages: List[Dict[str, str]],
+    output_format: str,
+    operation: str
+) -> Tuple[str, Optional[str], Any]:
+    """対話生成のリクエストを送信する
 
+    Returns:
+        Tuple[str, Optional[str], Any]: (応答のテキスト, 終了理由, トークン数)
+    """
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**_completion_kwargs(config, messages, output_format))
+    except Exception as e:
+        observe_llm(operation, config.model_name, time.perf_counter() - started, error=True)
+        logger.error(f"OpenAI APIの呼び出し中にエラーが発生しました: {str(e)}")
+        raise
+    return _record_completion(config, operation, started, response)
+
+def _parse_completion(text: str, output_format: str, finish_reason: Optional[str]) -> DialogueStreamParser:
+    parser = DialogueStreamParser(output_format)
+    parser.feed(text)
+    parser.close(truncated=finish_reason == "length")
+    return parser
+
+def _log_repair(parser: DialogueStreamParser, attempt: int) -> None:
+    reason = "JSONが途中で終了しています" if parser.output_format == "json" else "最後の行が途中で終了しています"
+    logger.warning(
+        f"対話の出力が不完全です（{reason}）。有効な{len(parser.items)}行を残し、"
+        f"足りない部分だけを生成します（{attempt}/{DIALOGUE_REPAIR_ATTEMPTS}回目）"
+    )
+
+def _repair_dialogue(
+    client: Any,
+    config: DialogueConfig,
+    messages: List[Dict[str, str]],
+    parser: DialogueStreamParser
+) -> Tuple[List[DialogueItem], int]:
+    """途中で切れた出力の続きだけを生成し、解析できた対話行と合わせて返す
+
+    Returns:
+        Tuple[List[DialogueItem], int]: (対話行, 追加の呼び出し回数)
+    """
+    items = list(parser.items)
+    repairs = 0
+    while repairs < DIALOGUE_REPAIR_ATTEMPTS and needs_repair(parser):
+        repairs += 1
+        _log_repair(parser, repairs)
+        repair_messages = build_repair_messages(messages, items, parser.output_format)
         try:
-            # OpenAI APIを呼び出して対話を生成
-            response = client.chat.completions.create(
-                model=config.model_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2000
+            repair_text, finish_reason, _ = _request_completion(
+                client, config, repair_messages, parser.output_format, "dialogue_repair"
             )
+        except Exception as e:
+            # 解析できた行は捨てずに返す
+            logger.warning(f"不完全な出力の補完に失敗しました: {str(e)}")
+            break
+        parser = _parse_completion(repair_text, parser.output_format, finish_reason)
+        items = items + merge_repaired(items, parser.items)
+    return items, repairs
 
-            # 応答から対話を抽出
-            dialogue_text = response.choices[0].message.content
-            
-            # デバッグ情報をファイルに保存
-            debug_data = {
-                "timestamp": datetime.now().isoformat(),
-                "model": config.model_name,
-                "template_type": config.template_type,
-                "system_prompt": system_prompt,
-                "user_prompt": user_prompt,
-                "response": dialogue_text,
-                "edited_transcript": edited_transcript,
-                "user_feedback": user_feedback
-            }
-            save_debug_info(debug_data, "dialogue_generation")
-            
-            # デバッグ用にレスポンスを保存
-            logger.info("OpenAI APIからのレスポンス:")
-            logger.info(dialogue_text)
-            
-            dialogue_lines = []
-
-            # 対話テキストを解析して話者と内容を分離
-            for line in dialogue_text.strip().split('\n'):
-                if not line.strip():
-                    continue
-                
-                # デバッグ用に各行の内容を出力
-                logger.debug(f"処理中の行: {line}")
-                
-                # 「ホスト:」または「ゲスト:」で始まる行を処理
-                if 'ホスト:' in line or 'ゲスト:' in line:
-                    try:
-                        speaker, text = [part.strip() for part in line.split(':', 1)]
-                        logger.debug(f"分割結果 - 話者: {speaker}, テキスト: {text}")
-                        dialogue_lines.append(
-                            DialogueLine(
-                                speaker=speaker,
-                                text=text
-                            )
-                        )
-                    except Exception as e:
-                        logger.warning(f"行の解析に失敗: {line} - エラー: {str(e)}")
-                        continue
+def generate_dialogue(
+    text: str,
+    config: DialogueConfig,
+    edited_transcript: Optional[str] = None,
+    user_feedback: Optional[str] = None
+) -> List[DialogueLine]:
+    """対話を生成する関数
 
-            if not dialogue_lines:
-                # デバッグ情報を記録
-                logger.error("対話生成に失敗しました：有効な対話行が見つかりません")
-                logger.error("システムプロンプト:")
-                logger.error(system_prompt)
-                logger.error("ユーザープロンプト:")
-                logger.error(user_prompt)
-                logger.error("生成された対話テキスト:")
-                logger.error(dialogue_text)
-                raise ValueError("対話生成に失敗しました")
-
-            # 生成された対話行の数を記録
-            logger.info(f"生成された対話行数: {len(dialogue_lines)}")
-            return dialogue_lines
+    形式の崩れた行はスキップして有効な行をすべて残し、最後の行が途中で切れている場合は
+    続きだけを追加で生成する。有効な行が1行もない場合は補完せずにエラーとし、
+    入力文書からの生成し直しは呼び出し側（パイプラインのステージ）で行う。
 
-        except Exception as e:
-            logger.error(f"OpenAI APIの呼び出し中にエラーが発生しました: {str(e)}")
-            raise
+    Args:
+        text (str): 入力テキスト
+        config (DialogueConfig): 対話生成の設定
+        edited_transcript (Optional[str], optional): 編集済みトランスクリプト. Defaults to None.
+        user_feedback (Optional[str], optional): ユーザーフィードバック. Defaults to None.
+
+    Returns:
+        List[DialogueLine]: 生成された対話テキスト
+    """
+    try:
+        logger.info("対話生成を開始します")
+        logger.info(f"モデル名: {config.model_name}")
+        logger.info(f"テンプレートタイプ: {config.template_type}")
+
+        # OpenAIのAPIを使用して対話を生成
+        client = get_llm_client(base_url=config.api_base)
+
+        # プロンプトの構築
+        output_format = DIALOGUE_OUTPUT_FORMAT
+        system_prompt, user_prompt = build_dialogue_prompts(text, config, edited_transcript, user_feedback, output_format)
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        cache, cache_key, cached = lookup_completion(config, messages, 0.7, config.max_tokens)
+
+        usage = None
+        if cached is not None:
+            dialogue_text, finish_reason = cached.content, "stop"
+        else:
+            dialogue_text, finish_reason, usage = _request_completion(client, config, messages, output_format, "dialogue")
+
+        # デバッグ情報をファイルに保存
+        save_debug_info({
+            "timestamp": datetime.now().isoformat(),
+            "model": config.model_name,
+            "template_type": config.template_type,
+            "system_prompt": system_prompt,
+            "user_prompt": user_prompt,
+            "response": dialogue_text,
+            "finish_reason": finish_reason,
+            "edited_transcript": edited_transcript,
+            "user_feedback": user_feedback
+        }, "dialogue_generation")
+        logger.debug(f"OpenAI APIからのレスポンス: {truncate(dialogue_text)}")
+
+        # 対話テキストを解析して話者と内容を分離（不完全な場合は足りない部分だけを生成する）
+        parser = _parse_completion(dialogue_text, output_format, finish_reason)
+        items, repairs = (
+            (list(parser.items), 0) if cached is not None
+            else _repair_dialogue(client, config, messages, parser)
+        )
+
+        if not items:
+            # プロンプトと応答の全文はデバッグ情報ストアに保存済み
+            logger.error("対話生成に失敗しました：有効な対話行が見つかりません")
+            logger.error(f"生成された対話テキスト: {truncate(dialogue_text)}")
+            raise ValueError("対話生成に失敗しました")
+
+        # 生成された対話行の数を記録
+        logger.info(f"生成された対話行数: {len(items)}" + (f"（補完 {repairs}回）" if repairs else ""))
+        if cache is not None and cached is None:
+            cache.put(
+                cache_key, render_dialogue(items, output_format, parser.scratchpad) if repairs else dialogue_text,
+                getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+            )
+        return [DialogueLine(speaker=item.speaker, text=item.text) for item in items]
 
     except Exception as e:
         logger.error(f"対話生成中にエラーが発生しました: {str(e)}")
         raise
+
+def stream_dialogue(
+    text: str,
+    config: DialogueConfig,
+    edited_transcript: Optional[str] = None,
+    user_feedback: Optional[str] = None
+) -> Iterator[DialogueLine]:
+    """LLMの出力をストリーミングで受け取り、完成した対話行から順に返す関数
+
+    トークンを受信するたびに完成した行（JSON形式では配列の要素）を解析して返すため、
+    呼び出し側は対話全体の生成を待たずに音声合成を開始できる。最後の行が途中で切れている場合は、
+    返した行の続きだけを追加で生成して返す。
+
+    Args:
+        text (str): 入力テキスト
+        config (DialogueConfig): 対話生成の設定
+        edited_transcript (Optional[str], optional): 編集済みトランスクリプト. Defaults to None.
+        user_feedback (Optional[str], optional): ユーザーフィードバック. Defaults to None.
+
+    Yields:
+        DialogueLine: 解析された対話行
+
+    Raises:
+        ValueError: 有効な対話行が1行も生成されなかった場合
+    """
+    logger.info("対話生成を開始します（ストリーミング）")
+    logger.info(f"モデル名: {config.model_name}")
+    logger.info(f"テンプレートタイプ: {config.template_type}")
+
+    client = get_llm_client(base_url=config.api_base)
+    output_format = DIALOGUE_OUTPUT_FORMAT
+    system_prompt, user_prompt = build_dialogue_prompts(text, config, edited_transcript, user_feedback, output_format)
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    # ストリーミングでない場合と同じリクエストとしてキャッシュを共有する
+    cache, cache_key, cached = lookup_completion(config, messages, 0.7, config.max_tokens)
+
+    def iter_deltas(request_messages: List[Dict[str, str]], state: Dict[str, Any]) -> Iterator[str]:
+        stream = client.chat.completions.create(**_completion_kwargs(config, request_messages, output_format, stream=True))
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.choices[0].finish_reason:
+                state["finish_reason"] = chunk.choices[0].finish_reason
+
+    started = time.perf_counter()
+    state: Dict[str, Any] = {"finish_reason": "stop"} if cached is not None else {}
+    parser = DialogueStreamParser(output_format)
+    for delta in ([cached.content] if cached is not None else iter_deltas(messages, state)):
+        for item in parser.feed(delta):
+            yield DialogueLine(speaker=item.speaker, text=item.text)
+    # 最後の行は改行で終わらない場合がある（打ち切られた場合は不完全な行を捨てる）
+    for item in parser.close(truncated=state.get("finish_reason") == "length"):
+        yield DialogueLine(speaker=item.speaker, text=item.text)
+
+    dialogue_text = parser.text
+    if cached is None:
+        # ストリーミングではトークン数が返らないため、レイテンシ（受信完了まで）のみ記録する
+        observe_llm("dialogue_stream", config.model_name, time.perf_counter() - started)
+    save_debug_info({
+        "timestamp": datetime.now().isoformat(),
+        "model": config.model_name,
+        "template_type": config.template_type,
+        "system_prompt": system_prompt,
+        "user_prompt": user_prompt,
+        "response": dialogue_text,
+        "finish_reason": state.get("finish_reason"),
+        "edited_transcript": edited_transcript,
+        "user_feedback": user_feedback,
+        "stream": True
+    }, "dialogue_generation")
+
+    items = list(parser.items)
+    scratchpad = parser.scratchpad
+    repairs = 0
+    while (
+        cached is None and repairs < DIALOGUE_REPAIR_ATTEMPTS
+        and needs_repair(parser)
+    ):
+        repairs += 1
+        _log_repair(parser, repairs)
+        repair_messages = build_repair_messages(messages, items, output_format)
+        # 返した行の続きから生成する場合は、先頭で繰り返された行を返さない
+        tail = items[-3:]
+        parser = DialogueStreamParser(output_format)
+        state = {}
+        repair_started = time.perf_counter()
+        try:
+            for delta in iter_deltas(repair_messages, state):
+                for item in parser.feed(delta):
+                    if tail and item in tail:
+                        continue
+                    tail = []
+                    items.append(item)
+                    yield DialogueLine(speaker=item.speaker, text=item.text)
+            for item in parser.close(truncated=state.get("finish_reason") == "length"):
+                if tail and item in tail:
+                    continue
+                tail = []
+                items.append(item)
+                yield DialogueLine(speaker=item.speaker, text=item.text)
+        except Exception as e:
+            # 返した行はそのまま残す（1行もない場合は呼び出し側で再試行する）
+            observe_llm("dialogue_repair", config.model_name, time.perf_counter() - repair_started, error=True)
+            logger.warning(f"不完全な出力の補完に失敗しました: {str(e)}")
+            break
+        observe_llm("dialogue_repair", config.model_name, time.perf_counter() - repair_started)
+
+    if not items:
+        logger.error("対話生成に失敗しました：有効な対話行が見つかりません")
+        logger.error(f"生成された対話テキスト: {truncate(dialogue_text)}")
+        raise ValueError("対話生成に失敗しました")
+
+    logger.info(f"生成された対話行数: {len(items)}" + (f"（補完 {repairs}回）" if repairs else ""))
+    if cache is not None and cached is None:
+        cache.put(cache_key, render_dialogue(items, output_format, scratchpad) if repairs else dialogue_text)
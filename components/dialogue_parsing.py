@@ -0,0 +1,298 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from pydantic import ValidationError
+from .data_models import Dialogue, DialogueItem
+
+# 対話の出力形式（text:「ホスト: 」で始まる行 / json: data_models.Dialogueのスキーマによる構造化出力）
+DIALOGUE_OUTPUT_FORMAT = os.getenv("DIALOGUE_OUTPUT_FORMAT", "text").lower()
+# 出力が途中で切れた場合に、足りない部分だけを生成する呼び出しの最大回数
+DIALOGUE_REPAIR_ATTEMPTS = int(os.getenv("DIALOGUE_REPAIR_ATTEMPTS", "1"))
+
+# 話者の表記 -> data_models.DialogueItemの話者
+SPEAKER_ALIASES = {
+    "ホスト": "ホスト",
+    "host": "ホスト",
+    "ゲスト": "ゲスト",
+    "guest": "ゲスト",
+}
+
+TEXT_FORMAT_INSTRUCTIONS = """【出力形式】
+    必ず以下の形式で出力してください：
+    ホスト: （テキスト）
+    ゲスト: （テキスト）
+    ホスト: （テキスト）
+    ...
+
+    各行は必ず「ホスト:」または「ゲスト:」で始まり、その後にコロンとスペース、そして発話内容が続きます。
+    この形式以外の出力は許可されません。"""
+
+JSON_FORMAT_INSTRUCTIONS = """【出力形式】
+    必ず以下のJSON形式で出力してください：
+    {"scratchpad": "（メモ）", "dialogue": [{"speaker": "ホスト", "text": "（テキスト）"}, {"speaker": "ゲスト", "text": "（テキスト）"}, ...]}
+    speakerは必ず「ホスト」または「ゲスト」で、textには発話内容だけを含めます。
+    JSON以外の出力は許可されません。"""
+
+CONTINUE_INSTRUCTIONS = (
+    "出力が途中で終了しました。上記の対話の続きから最後（まとめとサインオフ）まで、同じ形式で出力してください。"
+    "すでに出力した発言は繰り返さないでください。"
+)
+
+# 箇条書き・番号・Markdownの強調・括弧で装飾された話者と、全角・半角のコロンを許容する
+_LINE_PATTERN = re.compile(
+    r"^\s*(?:(?:[-*•・>]+|\d{1,4}\s*[.)．）、])\s*)*"
+    r"[*_]{0,2}\s*[\[【(（]?\s*(ホスト|ゲスト|host|guest)\s*[\]】)）]?\s*[*_]{0,2}\s*[:：]\s*[*_]{0,2}\s*(.*?)\s*$",
+    re.IGNORECASE
+)
+_QUOTES = {"「": "」", "『": "』", '"': '"', "“": "”"}
+_DIALOGUE_ARRAY = re.compile(r'"dialogue"\s*:\s*\[')
+_OBJECT = re.compile(r"\{[^{}]*\}")
+_SCRATCHPAD = re.compile(r'"scratchpad"\s*:\s*"((?:[^"\\]|\\.)*)"', re.DOTALL)
+
+def format_instructions(output_format: str = DIALOGUE_OUTPUT_FORMAT) -> str:
+    """システムプロンプトの出力形式の指示"""
+    return JSON_FORMAT_INSTRUCTIONS if output_format == "json" else TEXT_FORMAT_INSTRUCTIONS
+
+def dialogue_response_format() -> Dict[str, Any]:
+    """data_models.DialogueのJSONスキーマによる構造化出力の指定（response_format）"""
+    schema = Dialogue.model_json_schema()
+
+    def close_objects(node: Any) -> None:
+        # strictモードではすべてのオブジェクトで追加のプロパティを禁止する必要がある
+        if isinstance(node, dict):
+            if node.get("type") == "object":
+                node["additionalProperties"] = False
+            for value in node.values():
+                close_objects(value)
+        elif isinstance(node, list):
+            for value in node:
+                close_objects(value)
+
+    close_objects(schema)
+    return {"type": "json_schema", "json_schema": {"name": "dialogue", "strict": True, "schema": schema}}
+
+def _make_item(speaker: Any, text: Any) -> Optional[DialogueItem]:
+    speaker = SPEAKER_ALIASES.get(str(speaker or "").strip().lower())
+    text = str(text or "").strip().strip("*_").strip()
+    if len(text) >= 2 and text[0] in _QUOTES and text[-1] == _QUOTES[text[0]]:
+        text = text[1:-1].strip()
+    if not speaker or not text:
+        return None
+    try:
+        return DialogueItem(speaker=speaker, text=text)
+    except ValidationError:
+        return None
+
+def parse_line(line: str) -> Optional[DialogueItem]:
+    """1行のテキストから対話行を解析する
+
+    「ホスト：」（全角コロン）、「1. ホスト:」（番号）、「- **ゲスト**: 」（Markdown）、
+    「Host:」（英語の話者名）などの表記も受け付ける。
+
+    Args:
+        line (str): 解析する行
+
+    Returns:
+        Optional[DialogueItem]: 対話行。話者で始まらない行はNone
+    """
+    match = _LINE_PATTERN.match(line)
+    if not match:
+        return None
+    return _make_item(match.group(1), match.group(2))
+
+def render_dialogue(items: List[DialogueItem], output_format: str = DIALOGUE_OUTPUT_FORMAT, scratchpad: str = "") -> str:
+    """対話行を指定の出力形式のテキストにする"""
+    if output_format == "json":
+        return Dialogue(scratchpad=scratchpad, dialogue=items).model_dump_json()
+    return "\n".join(f"{item.speaker}: {item.text}" for item in items)
+
+class DialogueStreamParser:
+    """LLMの出力を受信しながら、完成した対話行を順に取り出すパーサー
+
+    テキスト形式では改行までの行を、JSON形式では"dialogue"配列の完成した要素を解析する。
+    形式の崩れた行・要素はスキップし、それ以外の有効な行はすべて残す。
+    """
+
+    def __init__(self, output_format: str = DIALOGUE_OUTPUT_FORMAT):
+        self.output_format = output_format
+        self.items: List[DialogueItem] = []
+        # 話者で始まらない行、または話者・テキストが不正な要素の数
+        self.skipped = 0
+        # JSON形式で"dialogue"配列の終わりまで受信できたかどうか
+        self.complete = False
+        # テキスト形式で最後の行が改行の前に打ち切られた（不完全な行を捨てた）かどうか
+        self.truncated_line = False
+        self.scratchpad = ""
+        self._chunks: List[str] = []
+        self._buffer = ""
+        self._position: Optional[int] = None
+        self._decoder = json.JSONDecoder()
+
+    @property
+    def text(self) -> str:
+        """受信したテキスト全体"""
+        return "".join(self._chunks)
+
+    def _add(self, item: Optional[DialogueItem], new_items: List[DialogueItem]) -> None:
+        if item is None:
+            self.skipped += 1
+            return
+        self.items.append(item)
+        new_items.append(item)
+
+    def _feed_lines(self, new_items: List[DialogueItem]) -> None:
+        *complete_lines, self._buffer = self._buffer.split("\n")
+        for line in complete_lines:
+            if line.strip():
+                self._add(parse_line(line), new_items)
+
+    def _feed_json(self, new_items: List[DialogueItem]) -> None:
+        buffer = self._buffer
+        if self._position is None:
+            match = _DIALOGUE_ARRAY.search(buffer)
+            if not match:
+                return
+            self._position = match.end()
+        position = self._position
+        while not self.complete:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= len(buffer):
+                break
+            if buffer[position] == "]":
+                self.complete = True
+                position += 1
+                break
+            if buffer[position] != "{":
+                # 配列の要素でない文字は次の要素まで読み飛ばす
+                following = [i for i in (buffer.find("{", position), buffer.find("]", position)) if i >= 0]
+                if not following:
+                    break
+                position = min(following)
+                continue
+            try:
+                element, position = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # 要素が受信途中か、形式が崩れている（崩れている場合はclose()で救済する）
+                break
+            self._add(_make_item(element.get("speaker"), element.get("text")) if isinstance(element, dict) else None, new_items)
+        self._position = position
+
+    def feed(self, delta: str) -> List[DialogueItem]:
+        """受信したテキストを追加し、新しく完成した対話行を返す
+
+        Args:
+            delta (str): 受信したテキスト
+
+        Returns:
+            List[DialogueItem]: 新しく完成した対話行
+        """
+        new_items: List[DialogueItem] = []
+        if not delta:
+            return new_items
+        self._chunks.append(delta)
+        self._buffer += delta
+        if self.output_format == "json":
+            self._feed_json(new_items)
+        else:
+            self._feed_lines(new_items)
+        return new_items
+
+    def _salvage_objects(self, text: str, new_items: List[DialogueItem]) -> int:
+        """形式の崩れたJSONから、単独で解析できる要素をすべて取り出す（最後の要素の終了位置を返す）"""
+        end = 0
+        for match in _OBJECT.finditer(text):
+            try:
+                element = json.loads(match.group(0))
+            except json.JSONDecodeError:
+                self.skipped += 1
+                continue
+            if isinstance(element, dict) and ("speaker" in element or "text" in element):
+                self._add(_make_item(element.get("speaker"), element.get("text")), new_items)
+                end = match.end()
+        return end
+
+    def close(self, truncated: bool = False) -> List[DialogueItem]:
+        """受信の終了後に残りを解析し、新しく完成した対話行を返す
+
+        Args:
+            truncated (bool, optional): 出力が最大トークン数で打ち切られた場合はTrue（最後の不完全な行を捨てる）. Defaults to False.
+
+        Returns:
+            List[DialogueItem]: 新しく完成した対話行
+        """
+        new_items: List[DialogueItem] = []
+        text = self.text
+        if self.output_format == "json":
+            if not self.complete:
+                rest = self._buffer[self._position:] if self._position is not None else self._buffer
+                end = self._salvage_objects(rest, new_items)
+                self.complete = not truncated and "]" in rest[end:]
+            scratchpad = _SCRATCHPAD.search(text)
+            if scratchpad:
+                try:
+                    self.scratchpad = json.loads(f'"{scratchpad.group(1)}"')
+                except json.JSONDecodeError:
+                    pass
+        elif self._buffer.strip():
+            if truncated:
+                self.truncated_line = True
+            else:
+                self._add(parse_line(self._buffer), new_items)
+        self._buffer = ""
+
+        if not self.items and text.strip():
+            # 指定と異なる形式で出力された場合も、有効な行を救済する
+            if self.output_format == "json":
+                for line in text.split("\n"):
+                    item = parse_line(line)
+                    if item is not None:
+                        self._add(item, new_items)
+            else:
+                self._salvage_objects(text, new_items)
+        if self.skipped:
+            logger.warning(f"解析できなかった行・要素をスキップしました: {self.skipped}件（有効な対話行 {len(self.items)}行）")
+        return new_items
+
+def needs_repair(parser: DialogueStreamParser) -> bool:
+    """出力の末尾が構造的に欠けているかどうか（最後の行が途中で終わっている・JSONの配列が閉じていない）
+
+    有効な行が1行もない場合は、前回の応答から補完せずに呼び出し側で生成し直すためFalseを返す。
+    """
+    if not parser.items:
+        return False
+    if parser.output_format == "json":
+        return not parser.complete
+    return parser.truncated_line
+
+def build_repair_messages(
+    messages: List[Dict[str, str]],
+    items: List[DialogueItem],
+    output_format: str = DIALOGUE_OUTPUT_FORMAT
+) -> List[Dict[str, str]]:
+    """欠けている部分だけを生成するためのメッセージを作成する
+
+    入力文書を含む最初の呼び出しのメッセージに、解析できた行までを前回の応答として加え、続きだけを求める。
+
+    Args:
+        messages (List[Dict[str, str]]): 最初の呼び出しのメッセージ
+        items (List[DialogueItem]): 解析できた対話行
+        output_format (str, optional): 出力形式. Defaults to DIALOGUE_OUTPUT_FORMAT.
+
+    Returns:
+        List[Dict[str, str]]: 送信するメッセージ
+    """
+    return messages + [
+        {"role": "assistant", "content": render_dialogue(items, output_format)},
+        {"role": "user", "content": CONTINUE_INSTRUCTIONS},
+    ]
+
+def merge_repaired(items: List[DialogueItem], repaired: List[DialogueItem]) -> List[DialogueItem]:
+    """続きとして生成された対話行のうち、前回の末尾の繰り返しを除いた行を返す"""
+    tail = items[-3:]
+    start = 0
+    while start < len(repaired) and repaired[start] in tail:
+        start += 1
+    return repaired[start:]
@@ -0,0 +1,471 @@
+import codecs
+import concurrent.futures as cf
+import mmap
+import multiprocessing as mp
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+from pathlib import Path
+from pydantic import BaseModel
+from .extraction_cache import file_digest, get_extraction_cache
+from .metrics import PDF_EXTRACTION_SECONDS, PDF_PAGES_EXTRACTED, PDF_PAGES_PER_SECOND
+from .text_cleanup import CleanupOptions, CleanupStats, clean_pages, clean_text, is_cleanup_enabled, report_cleanup
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# テキストファイルの読み込み
+TEXT_ENCODINGS = ['utf-8', 'shift-jis', 'euc-jp', 'iso-2022-jp']
+# エンコーディングの判定に読み込む先頭のバイト数
+TEXT_ENCODING_SAMPLE_BYTES = int(os.getenv("TEXT_ENCODING_SAMPLE_BYTES", str(64 * 1024)))
+# このサイズを超えるテキストファイルはメモリマップして少しずつデコードする
+TEXT_MMAP_THRESHOLD_BYTES = int(os.getenv("TEXT_MMAP_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+TEXT_CHUNK_BYTES = int(os.getenv("TEXT_CHUNK_BYTES", str(1024 * 1024)))
+
+class PdfExtraction(BaseModel):
+    """PDF1ファイル分の抽出結果"""
+    pages: List[str]
+    page_seconds: List[float]
+    cached: bool = False
+
+_process_pool: Optional[cf.ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+def _get_process_pool() -> cf.ProcessPoolExecutor:
+    """抽出用の共有プロセスプールを取得する"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Gradioのワーカースレッドからforkするとロックを引き継ぐため、spawnを使用する
+            _process_pool = cf.ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=mp.get_context("spawn")
+            )
+            logger.info(f"PDF抽出用のプロセスプールを初期化しました: {PDF_EXTRACT_WORKERS}ワーカー")
+        return _process_pool
+
+def _count_pages(file_path: str) -> int:
+    from pypdf import PdfReader
+
+    with open(file_path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """指定したページ範囲のテキストを抽出する（ワーカープロセスで実行）
+
+    Args:
+        file_path (str): PDFファイルのパス
+        start (int): 開始ページ（0始まり）
+        end (int): 終了ページ（このページは含まない）
+
+    Returns:
+        List[Tuple[int, str, float]]: (ページ番号, テキスト, 抽出時間[秒]) のリスト
+    """
+    # pypdfはワーカープロセスでだけ必要なため、ここで読み込む
+    from pypdf import PdfReader
+
+    results = []
+    with open(file_path, "rb") as f:
+        reader = PdfReader(f)
+        for i in range(start, end):
+            started = time.perf_counter()
+            page_text = reader.pages[i].extract_text() or ""
+            results.append((i, page_text, time.perf_counter() - started))
+    return results
+
+def extract_pdfs_parallel(file_paths: List[Path]) -> Dict[Path, Optional[PdfExtraction]]:
+    """複数のPDFからページ範囲ごとに並列でテキストを抽出する
+
+    抽出キャッシュに登録済みのファイルは解析せず、それ以外のファイルは
+    ページ範囲ごとにプロセスプールへ分配し、ページ順に再構成する。
+
+    Args:
+        file_paths (List[Path]): PDFファイルのパスのリスト
+
+    Returns:
+        Dict[Path, Optional[PdfExtraction]]: ファイルごとの抽出結果。失敗したファイルはNone
+    """
+    cache = get_extraction_cache()
+    results: Dict[Path, Optional[PdfExtraction]] = {}
+    digests: Dict[Path, str] = {}
+    pending: List[Path] = []
+
+    # 同じファイルが複数回指定されても一度だけ抽出する
+    for file_path in dict.fromkeys(file_paths):
+        if cache:
+            digests[file_path] = file_digest(file_path)
+            pages = cache.get(digests[file_path])
+            if pages is not None:
+                logger.info(f"抽出キャッシュを使用します: {file_path.name} ({len(pages)}ページ)")
+                results[file_path] = PdfExtraction(pages=pages, page_seconds=[0.0] * len(pages), cached=True)
+                continue
+        pending.append(file_path)
+
+    if not pending:
+        return results
+
+    started = time.perf_counter()
+    use_pool = PDF_EXTRACT_WORKERS > 1
+    executor = _get_process_pool() if use_pool else None
+    page_results: Dict[Path, List[Tuple[int, str, float]]] = {}
+    futures = []
+
+    for file_path in pending:
+        try:
+            page_count = _count_pages(str(file_path))
+            logger.info(f"PDFページ数: {page_count} ({file_path.name})")
+        except Exception as e:
+            logger.error(f"PDFファイルの処理中にエラー: {e}")
+            results[file_path] = None
+            continue
+        page_results[file_path] = []
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            end = min(start + PDF_PAGES_PER_TASK, page_count)
+            if executor:
+                futures.append((file_path, executor.submit(_extract_page_range, str(file_path), start, end)))
+            else:
+                try:
+                    page_results[file_path].extend(_extract_page_range(str(file_path), start, end))
+                except Exception as e:
+                    logger.error(f"PDFファイルの処理中にエラー: {e}")
+                    page_results.pop(file_path, None)
+                    results[file_path] = None
+                    break
+
+    for file_path, future in futures:
+        if file_path not in page_results:
+            continue
+        try:
+            page_results[file_path].extend(future.result())
+        except Exception as e:
+            logger.error(f"PDFファイルの処理中にエラー: {file_path} - {e}")
+            page_results.pop(file_path, None)
+            results[file_path] = None
+
+    for file_path, items in page_results.items():
+        items.sort(key=lambda item: item[0])
+        pages = [page_text for _, page_text, _ in items]
+        page_seconds = [seconds for _, _, seconds in items]
+        for i, page_text, seconds in items:
+            if page_text:
+                logger.debug(f"ページ {i+1} からテキストを抽出: {len(page_text)} 文字 ({seconds:.3f}秒)")
+            else:
+                logger.warning(f"ページ {i+1} からテキストを抽出できませんでした ({file_path.name})")
+        if page_seconds:
+            slowest = max(range(len(page_seconds)), key=page_seconds.__getitem__)
+            logger.info(
+                f"PDF抽出完了: {file_path.name} | {len(pages)}ページ | "
+                f"ページ処理時間合計 {sum(page_seconds):.2f}秒 | 最長 ページ{slowest+1} {page_seconds[slowest]:.3f}秒"
+            )
+            if sum(page_seconds) > 0:
+                PDF_PAGES_PER_SECOND.observe(len(pages) / sum(page_seconds))
+        PDF_PAGES_EXTRACTED.inc(len(pages))
+        results[file_path] = PdfExtraction(pages=pages, page_seconds=page_seconds)
+        if cache:
+            cache.put(digests[file_path], pages, source_name=file_path.name)
+
+    PDF_EXTRACTION_SECONDS.observe(time.perf_counter() - started)
+    logger.info(f"PDF並列抽出: {len(pending)}ファイルを{time.perf_counter() - started:.2f}秒で処理しました")
+    return results
+
+def extract_pdf_pages(file_path: Path) -> List[str]:
+    """PDFファイルからページごとのテキストを抽出する
+
+    Args:
+        file_path (Path): PDFファイルのパス
+
+    Returns:
+        List[str]: ページごとのテキスト（抽出できなかったページは空文字）
+    """
+    extraction = extract_pdfs_parallel([file_path])[file_path]
+    if extraction is None:
+        raise ValueError(f"PDFからテキストを抽出できませんでした: {file_path}")
+    return extraction.pages
+
+def iter_pdf_chunks(pages: Iterable[str]) -> Iterator[str]:
+    """PDFのページのテキストを区切りとともに順に返す（空のページは除く）
+
+    Args:
+        pages (Iterable[str]): ページごとのテキスト
+
+    Yields:
+        str: ページのテキストと区切りの改行
+    """
+    for page_text in pages:
+        if page_text:
+            yield page_text
+            yield "\n\n"
+
+def detect_encoding(file_path: Path, sample_bytes: int = TEXT_ENCODING_SAMPLE_BYTES) -> Optional[str]:
+    """ファイルの先頭だけを1回読み込み、デコードできるエンコーディングを判定する
+
+    Args:
+        file_path (Path): テキストファイルのパス
+        sample_bytes (int, optional): 読み込む最大バイト数. Defaults to TEXT_ENCODING_SAMPLE_BYTES.
+
+    Returns:
+        Optional[str]: エンコーディング。どれでもデコードできない場合はNone
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_bytes)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    candidates = TEXT_ENCODINGS
+    if b"\x1b$" in sample or b"\x1b(" in sample:
+        # ISO-2022-JPは7ビットのためUTF-8としてもデコードできてしまう。エスケープシーケンスがあれば先に試す
+        candidates = ['iso-2022-jp'] + [encoding for encoding in TEXT_ENCODINGS if encoding != 'iso-2022-jp']
+    for encoding in candidates:
+        try:
+            # 先頭の途中で文字が切れていてもよいようにインクリメンタルにデコードする
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            logger.debug(f"{encoding}でのデコードに失敗しました（先頭{len(sample)}バイト）")
+    return None
+
+def iter_text_chunks(file_path: Path, encoding: str, chunk_bytes: int = TEXT_CHUNK_BYTES) -> Iterator[str]:
+    """テキストファイルをデコードしながら順に返す
+
+    TEXT_MMAP_THRESHOLD_BYTESを超えるファイルはメモリマップし、chunk_bytesずつ
+    デコードするため、ファイル全体のバイト列をメモリに読み込まない
+    （デコードしたテキストはパイプラインに渡すため、呼び出し側で1つの文字列になる）。
+
+    Args:
+        file_path (Path): テキストファイルのパス
+        encoding (str): エンコーディング
+        chunk_bytes (int, optional): 1回にデコードするバイト数. Defaults to TEXT_CHUNK_BYTES.
+
+    Yields:
+        str: デコードされたテキスト
+
+    Raises:
+        UnicodeDecodeError: 途中でデコードできない場合
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return
+    with open(file_path, "rb") as f:
+        if size <= TEXT_MMAP_THRESHOLD_BYTES:
+            yield f.read().decode(encoding)
+            return
+        decoder = codecs.getincrementaldecoder(encoding)()
+        # madviseの開始位置はページ境界でなければならないため、ページサイズの倍数に切り上げる
+        chunk_bytes = max(1, -(-chunk_bytes // mmap.PAGESIZE)) * mmap.PAGESIZE
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, size, chunk_bytes):
+                length = min(chunk_bytes, size - start)
+                text = decoder.decode(mapped[start:start + length], final=start + length >= size)
+                if hasattr(mapped, "madvise"):
+                    # デコード済みのページは常駐させない（ファイルの大きさに関わらずメモリ使用量を一定にする）
+                    try:
+                        mapped.madvise(mmap.MADV_DONTNEED, start, length)
+                    except OSError as e:
+                        # ヒントにすぎないため、失敗しても読み込みは続ける
+                        logger.debug(f"madviseに失敗しました: {e}")
+                if text:
+                    yield text
+
+def read_text_file(file_path: Path) -> Optional[str]:
+    """テキストファイルを判定したエンコーディングで読み込む
+
+    デコードしたチャンクは1回の結合で文字列にし、チャンクのリストは保持しない。
+    先頭の判定では見つからなかったデコードエラーがあった場合のみ、
+    残りのエンコーディングで読み込み直す。
+
+    Args:
+        file_path (Path): テキストファイルのパス
+
+    Returns:
+        Optional[str]: 読み込まれたテキスト。失敗した場合や空の場合はNone
+    """
+    try:
+        detected = detect_encoding(file_path)
+    except Exception as e:
+        logger.error(f"ファイル読み込み中にエラー: {e}")
+        return None
+    if detected is None:
+        logger.warning(f"対応するエンコーディングでデコードできませんでした: {file_path.name}")
+        return None
+
+    encodings = [detected] + [encoding for encoding in TEXT_ENCODINGS if encoding != detected]
+    for encoding in encodings:
+        try:
+            text = "".join(iter_text_chunks(file_path, encoding))
+        except UnicodeDecodeError:
+            logger.warning(f"{encoding}でのデコードに失敗しました")
+            continue
+        except Exception as e:
+            logger.error(f"ファイル読み込み中にエラー ({encoding}): {e}")
+            return None
+        if not text.strip():
+            logger.warning(f"{encoding}でファイルを読み込みましたが、内容が空です")
+            return None
+        logger.info(f"ファイルから読み込まれたテキスト ({encoding}): {len(text)} 文字")
+        return text
+    return None
+
+def iter_file_chunks(
+    file_path: Path,
+    file_extension: str,
+    pdf_results: Dict[Path, Optional[PdfExtraction]],
+    cleanup: Optional[CleanupOptions] = None,
+    cleanup_stats: Optional[CleanupStats] = None
+) -> Iterator[str]:
+    """1ファイル分のテキストをページ・ファイルの区切りとともに順に返す
+
+    Args:
+        file_path (Path): ファイルのパス
+        file_extension (str): 拡張子
+        pdf_results (Dict[Path, Optional[PdfExtraction]]): extract_pdfs_parallelの結果
+        cleanup (Optional[CleanupOptions], optional): 除去するセクションの設定. Defaults to None.
+        cleanup_stats (Optional[CleanupStats], optional): 指定した場合はクリーンアップを行い、除去した内容を加算する. Defaults to None.
+
+    Yields:
+        str: テキスト
+
+    Raises:
+        ValueError: ファイルを読み込めなかった場合
+    """
+    if file_extension == '.pdf':
+        logger.info(f"PDFファイルを処理中: {file_path}")
+        extraction = pdf_results.get(file_path)
+        if extraction is None:
+            raise ValueError(f"PDFからテキストを抽出できませんでした: {file_path}")
+        characters = sum(len(page_text) + 2 for page_text in extraction.pages if page_text)
+        if characters:
+            logger.info(f"PDFから抽出された合計テキスト: {characters} 文字")
+        else:
+            logger.warning("PDFからテキストを抽出できませんでした")
+        pages = extraction.pages
+        if cleanup_stats is not None:
+            pages, stats = clean_pages(pages, cleanup)
+            cleanup_stats.merge(stats)
+        yield from iter_pdf_chunks(pages)
+    else:
+        logger.info(f"{file_extension}ファイルを処理中: {file_path}")
+        text = read_text_file(file_path)
+        if text is None:
+            raise ValueError(f"ファイルの読み込みに失敗: {file_path}")
+        if cleanup_stats is not None:
+            text, stats = clean_text(text, cleanup)
+            cleanup_stats.merge(stats)
+        yield text
+        yield "\n\n"
+
+def extract_text_from_files(files: List[str], cleanup: Optional[CleanupOptions] = None) -> Tuple[str, int]:
+    """アップロードされたファイルからテキストを抽出して結合する
+
+    PDFはすべてのファイルをまとめて並列抽出し、結果はアップロード順に結合する。
+    クリーンアップが有効な場合は、ファイルごとに柱・フッター・ページ番号などを除去してから結合する。
+
+    Args:
+        files (List[str]): ファイルパスのリスト
+        cleanup (Optional[CleanupOptions], optional): 除去するセクションの設定. Defaults to None.
+
+    Returns:
+        Tuple[str, int]: (結合されたテキスト, 処理に成功したファイル数)
+    """
+    # ファイルの検証
+    valid_files: List[Tuple[Path, str]] = []
+    for file_path in files:
+        try:
+            if not file_path or not file_path.strip():
+                continue
+
+            logger.info(f"処理するファイルパス: {file_path}")
+
+            try:
+                file_path = Path(file_path)
+            except Exception as e:
+                logger.error(f"ファイルパスの変換に失敗: {e}")
+                continue
+
+            file_path = Path(file_path).resolve()
+
+            if not file_path.exists():
+                logger.error(f"ファイルが存在しません: {file_path}")
+                continue
+
+            if not file_path.is_file():
+                logger.error(f"通常のファイルではありません: {file_path}")
+                continue
+
+            file_extension = file_path.suffix.lower()
+            logger.info(f"ファイル拡張子: {file_extension}")
+
+            if file_extension not in ['.pdf', '.md', '.txt']:
+                logger.warning(f"未対応のファイル形式です: {file_extension}")
+                continue
+
+            valid_files.append((file_path, file_extension))
+
+        except Exception as e:
+            logger.error(f"ファイル処理中のエラー: {str(e)}", exc_info=True)
+            continue
+
+    # PDFをまとめて並列抽出
+    pdf_paths = [file_path for file_path, file_extension in valid_files if file_extension == '.pdf']
+    pdf_results = extract_pdfs_parallel(pdf_paths) if pdf_paths else {}
+
+    # ページ・ファイルごとのテキストを集め、最後に1回だけ結合する
+    parts: List[str] = []
+    processed_files = 0
+    cleanup_stats = CleanupStats() if is_cleanup_enabled(cleanup) else None
+
+    for file_path, file_extension in valid_files:
+        start = len(parts)
+        try:
+            parts.extend(iter_file_chunks(file_path, file_extension, pdf_results, cleanup, cleanup_stats))
+        except ValueError as e:
+            del parts[start:]
+            logger.error(str(e))
+            continue
+        except Exception as e:
+            del parts[start:]
+            logger.error(f"ファイル処理中のエラー: {str(e)}", exc_info=True)
+            continue
+
+        processed_files += 1
+        logger.info(f"ファイル処理完了: {processed_files}/{len(files)}")
+
+    if cleanup_stats is not None:
+        report_cleanup(cleanup_stats)
+    return "".join(parts), processed_files
+
+def load_combined_text(files, cleanup: Optional[CleanupOptions] = None) -> Tuple[Optional[str], Optional[str]]:
+    """アップロードされたファイルを検証し、テキストを抽出する関数
+
+    Args:
+        files: アップロードされたファイル
+        cleanup (Optional[CleanupOptions], optional): 除去するセクションの設定. Defaults to None.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: (結合されたテキスト, エラーメッセージ)
+    """
+    # ファイルチェック
+    if not files or not any(files):
+        logger.warning("ファイルが提供されていません")
+        return None, "ファイルをアップロードしてください。"
+
+    # ファイルリストの正規化
+    if isinstance(files, str):
+        files = [files]
+    
+    logger.info(f"処理するファイル数: {len(files)}")
+    
+    # Combine text from uploaded files
+    combined_text, processed_files = extract_text_from_files(files, cleanup)
+
+    if processed_files == 0:
+        logger.error("処理に成功したファイルがありません")
+        return None, "ファイルの処理に失敗しました。ファイル形式とエンコーディングを確認してください。"
+
+    if not combined_text.strip():
+        logger.error("テキストが抽出できませんでした")
+        return None, "アップロードされたファイルからテキストを抽出できませんでした。ファイルが空でないか、正しい形式であることを確認してください。"
+
+    logger.info(f"処理完了: 合計 {processed_files} ファイル")
+    logger.info(f"合計テキスト長: {len(combined_text)} 文字")
+    return combined_text, None
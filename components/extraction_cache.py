@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from loguru import logger
+from .metrics import record_cache_lookup
+
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "/app/gradio_cached_examples/extraction_cache/")
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# 抽出処理を変更した場合はこの値を更新し、古いキャッシュを無効化する
+EXTRACTOR_REVISION = "1"
+
+def current_extractor_version() -> str:
+    """抽出処理のバージョン（pypdfのバージョンと抽出処理のリビジョン）を返す
+
+    pypdfの読み込みは重いため、キャッシュを初めて使用するときまで遅らせる。
+    """
+    from pypdf import __version__ as pypdf_version
+
+    return f"pypdf-{pypdf_version}-{EXTRACTOR_REVISION}"
+
+def file_digest(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """ファイル内容のSHA-256ダイジェストを計算する
+
+    Args:
+        file_path (Path): 対象ファイルのパス
+        chunk_size (int, optional): 一度に読み込むバイト数. Defaults to 1MB.
+
+    Returns:
+        str: 16進数のダイジェスト
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """PDFのページごとの抽出テキストをディスクに保存するキャッシュ"""
+
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR, extractor_version: Optional[str] = None):
+        self.cache_dir = Path(cache_dir)
+        self.extractor_version = extractor_version or current_extractor_version()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        version_key = hashlib.sha256(self.extractor_version.encode("utf-8")).hexdigest()[:12]
+        return self.cache_dir / f"{digest}-{version_key}.json"
+
+    def get(self, digest: str) -> Optional[List[str]]:
+        """キャッシュからページごとのテキストを取得する
+
+        Args:
+            digest (str): ファイル内容のダイジェスト
+
+        Returns:
+            Optional[List[str]]: ページごとのテキスト。存在しない場合はNone
+        """
+        path = self._path(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry.get("extractor_version") != self.extractor_version:
+                raise ValueError("extractor version mismatch")
+            pages = entry["pages"]
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                record_cache_lookup("pdf_extraction", False)
+            return None
+        except Exception as e:
+            logger.warning(f"抽出キャッシュの読み込みに失敗: {path} - {str(e)}")
+            with self._lock:
+                self.misses += 1
+                record_cache_lookup("pdf_extraction", False)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            record_cache_lookup("pdf_extraction", True)
+        return pages
+
+    def put(self, digest: str, pages: List[str], source_name: str = "") -> None:
+        """ページごとのテキストをキャッシュに保存する
+
+        Args:
+            digest (str): ファイル内容のダイジェスト
+            pages (List[str]): ページごとのテキスト
+            source_name (str, optional): 元のファイル名（確認用）. Defaults to "".
+        """
+        path = self._path(digest)
+        entry = {
+            "digest": digest,
+            "extractor_version": self.extractor_version,
+            "source_name": source_name,
+            "created_at": datetime.now().isoformat(),
+            "pages": pages,
+        }
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            logger.info(f"抽出結果をキャッシュに保存しました: {source_name} ({len(pages)}ページ)")
+        except Exception as e:
+            logger.warning(f"抽出キャッシュの保存に失敗: {path} - {str(e)}")
+
+    def entries(self) -> List[Dict[str, object]]:
+        """キャッシュエントリの一覧を返す
+
+        Returns:
+            List[Dict[str, object]]: ファイル名、サイズ、更新日時などの一覧
+        """
+        result = []
+        if not self.cache_dir.exists():
+            return result
+        for path in sorted(self.cache_dir.glob("*.json")):
+            try:
+                stat = path.stat()
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                result.append({
+                    "file": path.name,
+                    "source_name": entry.get("source_name", ""),
+                    "extractor_version": entry.get("extractor_version", ""),
+                    "pages": len(entry.get("pages", [])),
+                    "bytes": stat.st_size,
+                    "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                })
+            except Exception as e:
+                logger.warning(f"抽出キャッシュの読み込みに失敗: {path} - {str(e)}")
+        return result
+
+    def purge(self, max_age_days: Optional[float] = None) -> int:
+        """キャッシュを削除する
+
+        Args:
+            max_age_days (Optional[float], optional): 指定した日数より古いエントリのみ削除する. Defaults to None（すべて削除）.
+
+        Returns:
+            int: 削除されたエントリの数
+        """
+        removed_count = 0
+        if not self.cache_dir.exists():
+            return removed_count
+        now = time.time()
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                if max_age_days is not None and now - path.stat().st_mtime <= max_age_days * 24 * 60 * 60:
+                    continue
+                path.unlink()
+                removed_count += 1
+            except Exception as e:
+                logger.warning(f"抽出キャッシュの削除に失敗: {path} - {str(e)}")
+        logger.info(f"抽出キャッシュを削除しました: {removed_count}件")
+        return removed_count
+
+    def stats(self) -> Dict[str, object]:
+        """キャッシュの統計情報を返す
+
+        Returns:
+            Dict[str, object]: ヒット数、ミス数、件数、使用バイト数など
+        """
+        files = list(self.cache_dir.glob("*.json")) if self.cache_dir.exists() else []
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(files),
+                "bytes": sum(path.stat().st_size for path in files),
+                "extractor_version": self.extractor_version,
+            }
+
+_extraction_cache: Optional[ExtractionCache] = None
+_extraction_cache_lock = threading.Lock()
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """共有の抽出キャッシュを取得する
+
+    Returns:
+        Optional[ExtractionCache]: キャッシュが無効な場合はNone
+    """
+    global _extraction_cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache()
+        return _extraction_cache
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF抽出キャッシュの確認と削除")
+    parser.add_argument("--cache-dir", default=EXTRACTION_CACHE_DIR, help="キャッシュディレクトリ")
+    parser.add_argument("--list", action="store_true", help="キャッシュエントリの一覧を表示する")
+    parser.add_argument("--purge", action="store_true", help="キャッシュを削除する")
+    parser.add_argument("--older-than-days", type=float, default=None, help="指定した日数より古いエントリのみ削除する")
+    args = parser.parse_args()
+
+    cache = ExtractionCache(cache_dir=args.cache_dir)
+    if args.list:
+        for item in cache.entries():
+            print(json.dumps(item, ensure_ascii=False))
+    if args.purge:
+        print(f"削除されたエントリ: {cache.purge(args.older_than_days)}")
+    print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
@@ -1,14 +1,28 @@
-from typing import Optional, Tuple, Any
-from pydantic import BaseModel, ValidationError
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from typing import Callable, List, Optional, Tuple, Any, Iterator
+from pydantic import BaseModel
 from loguru import logger
-from .dialogue_generation import DialogueConfig, DialogueLine, generate_dialogue
-from .audio.audio_generation import generate_audio_from_transcript
-from pathlib import Path
-from pypdf import PdfReader
+from .dialogue_generation import DialogueConfig
+from .jobs import DONE, FAILED, get_job_runner, is_audio_available
+from .pipeline import PipelineInputError, PipelineJob, make_job_id, run_pipeline
+from .text_cleanup import CleanupOptions
+import asyncio
+import concurrent.futures as cf
 import os
+import queue
+import uuid
 import gradio as gr
-import sys
+
+# LLMの出力をストリーミングで受け取り、完成した行から音声合成を開始する
+DIALOGUE_STREAMING = os.getenv("DIALOGUE_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# 完成したセグメントから順にオーディオプレーヤーへ送信する
+AUDIO_STREAMING = os.getenv("AUDIO_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# 非同期ハンドラーを使用する（パイプラインはワーカースレッドで実行し、待機中はイベントループを解放する）
+ASYNC_PIPELINE = os.getenv("ASYNC_PIPELINE", "false").lower() in ("1", "true", "yes")
+
+# 生成をジョブとしてバックグラウンドで実行する（ブラウザの切断や再起動後も再開できる）
+BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "false").lower() in ("1", "true", "yes")
 
 class FeedbackConfig(BaseModel):
     """フィードバック処理の設定を定義するモデル"""
@@ -28,17 +42,111 @@ class FeedbackConfig(BaseModel):
     scratch_pad_instructions: str
     prelude_dialog: str
     podcast_dialog_instructions: str
+    # 抽出したテキストから除去するセクション（"references", "appendix"）
+    strip_sections: List[str] = []
+
+def _build_configs(
+    files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+    template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+    intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+    podcast_dialog_instructions, fresh_sample=False, strip_sections=None
+) -> Tuple[FeedbackConfig, DialogueConfig, dict]:
+    """UIの入力から生成の設定を検証して構築する
+
+    引数はprocess_feedback_and_regenerateと同じ（edited_transcriptとuser_feedbackを除く）。
+
+    Returns:
+        Tuple[FeedbackConfig, DialogueConfig, dict]:
+            (フィードバック処理の設定, 対話生成の設定, ジョブIDの生成に使用するAPIキーを除いた設定)
+    """
+    config = FeedbackConfig(
+        files=files,
+        text_model=text_model,
+        audio_model=audio_model,
+        speaker_1_voice=speaker_1_voice,
+        speaker_2_voice=speaker_2_voice,
+        template_dropdown=template_dropdown,
+        llm_api_key=llm_api_key,
+        api_base=api_base,
+        llm_api_base=llm_api_base,
+        tts_api_key=tts_api_key,
+        tts_api_base=tts_api_base,
+        intro_instructions=intro_instructions,
+        text_instructions=text_instructions,
+        scratch_pad_instructions=scratch_pad_instructions,
+        prelude_dialog=prelude_dialog,
+        podcast_dialog_instructions=podcast_dialog_instructions,
+        strip_sections=strip_sections or []
+    )
+    dialogue_config = DialogueConfig(
+        model_name=config.text_model,
+        template_type=config.template_dropdown,
+        intro_instructions=config.intro_instructions,
+        text_instructions=config.text_instructions,
+        scratch_pad_instructions=config.scratch_pad_instructions,
+        prelude_dialog=config.prelude_dialog,
+        podcast_dialog_instructions=config.podcast_dialog_instructions,
+        api_base=config.llm_api_base,
+        bypass_cache=bool(fresh_sample)
+    )
+    settings = config.model_dump(exclude={"files", "llm_api_key", "tts_api_key"})
+    if fresh_sample:
+        # 保存済みのチェックポイントとエピソードを再利用しないように別のジョブにする
+        settings["fresh_sample"] = uuid.uuid4().hex
+    return config, dialogue_config, settings
+
+def _run_generation(
+    config: FeedbackConfig,
+    dialogue_config: DialogueConfig,
+    settings: dict,
+    files: Any,
+    edited_transcript: Optional[str],
+    user_feedback: Optional[str],
+    on_segment: Optional[Callable[[int, str], None]] = None
+) -> Tuple[str, str, str]:
+    """チェックポイント付きのパイプラインで生成する
+
+    on_segmentには完成したセグメントが再生順に (セグメント番号, ファイルパス) で通知される。
+
+    Returns:
+        Tuple[str, str, str]: (音声ファイルのパス, トランスクリプト, 抽出されたテキスト)
+    """
+    # APIキーや指示の全文はログに出力しない
+    logger.info(
+        f"生成を開始します: テキストモデル {config.text_model} | 音声モデル {config.audio_model} | "
+        f"テンプレート {config.template_dropdown} | フィードバック {'あり' if user_feedback else 'なし'} | "
+        f"編集済みトランスクリプト {'あり' if edited_transcript else 'なし'}"
+    )
+
+    # ステージごとにチェックポイントを保存しながら生成する
+    # （同じ入力での再実行は完了済みのステージとセグメントを再利用する）
+    job = PipelineJob(make_job_id(files, settings, edited_transcript, user_feedback))
+    audio, dialogue_lines, combined_text = run_pipeline(
+        job,
+        files,
+        dialogue_config,
+        speaker_1_voice=config.speaker_1_voice,
+        speaker_2_voice=config.speaker_2_voice,
+        audio_model=config.audio_model,
+        api_key=config.llm_api_key,
+        edited_transcript=edited_transcript,
+        user_feedback=user_feedback,
+        stream=DIALOGUE_STREAMING,
+        cleanup=CleanupOptions.from_sections(config.strip_sections),
+        on_segment=on_segment
+    )
+    logger.info("音声生成が完了しました")
+
+    # トランスクリプトの準備
+    transcript_output = "\n\n".join([f"{line.speaker}: {line.text}" for line in dialogue_lines])
+    return audio, transcript_output, combined_text
 
-@retry(
-    retry=retry_if_exception_type((ValidationError, Exception)),
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10)
-)
 def process_feedback_and_regenerate(
     files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
     template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
     intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
-    podcast_dialog_instructions, edited_transcript, user_feedback
+    podcast_dialog_instructions, edited_transcript, user_feedback, fresh_sample=False,
+    strip_sections=None
 ) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
     """フィードバックを処理し、オーディオを再生成する関数
 
@@ -61,205 +169,202 @@ def process_feedback_and_regenerate(
         podcast_dialog_instructions: ポッドキャスト対話指示
         edited_transcript: 編集済みトランスクリプト
         user_feedback: ユーザーフィードバック
+        fresh_sample: Trueの場合はLLMキャッシュと保存済みの結果を使用せずに新しく生成する
+        strip_sections: 抽出したテキストから除去するセクション（参考文献・付録）
 
     Returns:
         Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]: 
             (audio_output, transcript_output, original_text_output, error_output)
     """
     try:
-        # 設定のバリデーション
-        config = FeedbackConfig(
-            files=files,
-            text_model=text_model,
-            audio_model=audio_model,
-            speaker_1_voice=speaker_1_voice,
-            speaker_2_voice=speaker_2_voice,
-            template_dropdown=template_dropdown,
-            llm_api_key=llm_api_key,
-            api_base=api_base,
-            llm_api_base=llm_api_base,
-            tts_api_key=tts_api_key,
-            tts_api_base=tts_api_base,
-            intro_instructions=intro_instructions,
-            text_instructions=text_instructions,
-            scratch_pad_instructions=scratch_pad_instructions,
-            prelude_dialog=prelude_dialog,
-            podcast_dialog_instructions=podcast_dialog_instructions
+        config, dialogue_config, settings = _build_configs(
+            files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+            template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+            intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+            podcast_dialog_instructions, fresh_sample, strip_sections
         )
 
-        # ログの設定
-        logger.remove()  # 既存のハンドラを削除
-        logger.add(sys.stderr, format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
-        logger.add("processing.log", rotation="500 MB")  # ファイルにもログを出力
-
-        # すべての引数をログに記録
-        logger.info("受け取った引数一覧:")
-        for i, arg in enumerate([files, text_model, audio_model, speaker_1_voice, speaker_2_voice, template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base, intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog, podcast_dialog_instructions, edited_transcript, user_feedback]):
-            logger.info(f"引数 {i}: {arg}")
-
-        # 対話生成の設定
-        dialogue_config = DialogueConfig(
-            model_name=config.text_model,
-            template_type=config.template_dropdown,
-            intro_instructions=config.intro_instructions,
-            text_instructions=config.text_instructions,
-            scratch_pad_instructions=config.scratch_pad_instructions,
-            prelude_dialog=config.prelude_dialog,
-            podcast_dialog_instructions=config.podcast_dialog_instructions,
-            api_base=config.llm_api_base
+        audio, transcript_output, combined_text = _run_generation(
+            config, dialogue_config, settings, files, edited_transcript, user_feedback
         )
+        return audio, transcript_output, combined_text, None  # エラーがない場合はNoneを返す
 
-        # ファイルチェック
-        if not files or not any(files):
-            logger.warning("ファイルが提供されていません")
-            return None, None, None, "ファイルをアップロードしてください。"
-
-        # ファイルリストの正規化
-        if isinstance(files, str):
-            files = [files]
-        
-        logger.info(f"処理するファイル数: {len(files)}")
-        
-        # Combine text from uploaded files
-        combined_text = ""
-        processed_files = 0
-        
-        for file_path in files:
+    except PipelineInputError as e:
+        return None, None, None, str(e)
+    except Exception as e:
+        # If an error occurs during generation, return None for the outputs and the error message
+        import traceback
+        error_msg = f"エラーが発生しました: {str(e)}\n{traceback.format_exc()}"
+        logger.error(error_msg)
+        return None, None, None, error_msg
+
+def process_feedback_and_regenerate_stream(
+    files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+    template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+    intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+    podcast_dialog_instructions, edited_transcript, user_feedback, fresh_sample=False,
+    strip_sections=None
+) -> Iterator[Tuple[Any, Any, Any, Any, Any]]:
+    """フィードバックを処理し、生成されたオーディオを順次返す関数
+
+    同期版と同じチェックポイント付きのパイプラインをワーカースレッドで実行し、
+    トランスクリプトの先頭から完成したセグメントをストリーミング出力へ送り、
+    すべてのセグメントが揃った後に結合済みのMP3ファイルをダウンロード用に返す。
+    引数はprocess_feedback_and_regenerateと同じ。
+
+    Yields:
+        Tuple[Any, Any, Any, Any, Any]:
+            (audio_stream_output, audio_file_output, transcript_output, original_text_output, error_output)
+    """
+    executor = None
+    try:
+        config, dialogue_config, settings = _build_configs(
+            files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+            template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+            intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+            podcast_dialog_instructions, fresh_sample, strip_sections
+        )
+
+        # 完成したセグメントはパイプラインのスレッドからキューで受け取る
+        segments: "queue.Queue[Tuple[int, str]]" = queue.Queue()
+        executor = cf.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(
+            _run_generation, config, dialogue_config, settings, files, edited_transcript, user_feedback,
+            lambda index, path: segments.put((index, path))
+        )
+
+        delivered = 0
+        while not (future.done() and segments.empty()):
             try:
-                if not file_path or not file_path.strip():
-                    continue
-                
-                logger.info(f"処理するファイルパス: {file_path}")
-                
-                try:
-                    file_path = Path(file_path)
-                except Exception as e:
-                    logger.error(f"ファイルパスの変換に失敗: {e}")
-                    continue
-                
-                file_path = Path(file_path).resolve()
-
-                if not file_path.exists():
-                    logger.error(f"ファイルが存在しません: {file_path}")
-                    continue
-
-                if not file_path.is_file():
-                    logger.error(f"通常のファイルではありません: {file_path}")
-                    continue
-                
-                file_extension = file_path.suffix.lower()
-                logger.info(f"ファイル拡張子: {file_extension}")
-                
-                if file_extension == '.pdf':
-                    logger.info(f"PDFファイルを処理中: {file_path}")
-                    try:
-                        with open(file_path, "rb") as f:
-                            reader = PdfReader(f)
-                            logger.info(f"PDFページ数: {len(reader.pages)}")
-                            text = ""
-                            for i, page in enumerate(reader.pages):
-                                page_text = page.extract_text()
-                                if page_text:
-                                    text += page_text + "\n\n"
-                                    logger.info(f"ページ {i+1} からテキストを抽出: {len(page_text)} 文字")
-                                else:
-                                    logger.warning(f"ページ {i+1} からテキストを抽出できませんでした")
-                            
-                            if text.strip():
-                                combined_text += text
-                                logger.info(f"PDFから抽出された合計テキスト: {len(text)} 文字")
-                            else:
-                                logger.warning("PDFからテキストを抽出できませんでした")
-                    except Exception as e:
-                        logger.error(f"PDFファイルの処理中にエラー: {e}")
-                        continue
-                
-                elif file_extension in ['.md', '.txt']:
-                    logger.info(f"{file_extension}ファイルを処理中: {file_path}")
-                    success = False
-                    encodings = ['utf-8', 'shift-jis', 'euc-jp', 'iso-2022-jp']
-                    
-                    for encoding in encodings:
-                        try:
-                            with open(file_path, "r", encoding=encoding) as f:
-                                text = f.read()
-                                if text.strip():
-                                    combined_text += text + "\n\n"
-                                    logger.info(f"ファイルから読み込まれたテキスト ({encoding}): {len(text)} 文字")
-                                    success = True
-                                    break
-                                else:
-                                    logger.warning(f"{encoding}でファイルを読み込みましたが、内容が空です")
-                        except UnicodeDecodeError:
-                            logger.warning(f"{encoding}でのデコードに失敗しました")
-                            continue
-                        except Exception as e:
-                            logger.error(f"ファイル読み込み中にエラー ({encoding}): {e}")
-                            break
-                    
-                    if not success:
-                        logger.error(f"ファイルの読み込みに失敗: {file_path}")
-                        continue
-                
-                else:
-                    logger.warning(f"未対応のファイル形式です: {file_extension}")
-                    continue
-                
-                processed_files += 1
-                logger.info(f"ファイル処理完了: {processed_files}/{len(files)}")
-                
-            except Exception as e:
-                logger.error(f"ファイル処理中のエラー: {str(e)}", exc_info=True)
+                index, path = segments.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            # 対話をストリーミングで生成した後の音声生成では、送信済みのセグメントが再度通知される
+            if index != delivered:
                 continue
+            delivered += 1
+            with open(path, "rb") as f:
+                yield f.read(), gr.update(), gr.update(), gr.update(), gr.update()
 
-        if processed_files == 0:
-            logger.error("処理に成功したファイルがありません")
-            return None, None, None, "ファイルの処理に失敗しました。ファイル形式とエンコーディングを確認してください。"
+        audio, transcript_output, combined_text = future.result()
+        yield gr.update(), audio, transcript_output, combined_text, None
 
-        if not combined_text.strip():
-            logger.error("テキストが抽出できませんでした")
-            return None, None, None, "アップロードされたファイルからテキストを抽出できませんでした。ファイルが空でないか、正しい形式であることを確認してください。"
+    except PipelineInputError as e:
+        yield gr.update(), None, None, None, str(e)
+    except Exception as e:
+        import traceback
+        error_msg = f"エラーが発生しました: {str(e)}\n{traceback.format_exc()}"
+        logger.error(error_msg)
+        yield gr.update(), None, None, None, error_msg
+    finally:
+        if executor is not None:
+            # ブラウザが切断されてもジョブは最後まで実行され、チェックポイントが保存される
+            executor.shutdown(wait=False)
+
+async def process_feedback_and_regenerate_async(
+    files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+    template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+    intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+    podcast_dialog_instructions, edited_transcript, user_feedback, fresh_sample=False,
+    strip_sections=None
+) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """process_feedback_and_regenerateの非同期版
 
-        logger.info(f"処理完了: 合計 {processed_files} ファイル")
-        logger.info(f"合計テキスト長: {len(combined_text)} 文字")
+    同期版と同じチェックポイント付きのパイプラインをワーカースレッドで実行し、
+    完了を待つ間はイベントループを他のセッションに明け渡す。
+    引数と戻り値はprocess_feedback_and_regenerateと同じ。
 
-        # 対話を生成
-        logger.info("LLM生成開始: generate_dialogue関数を呼び出します")
-        dialogue_lines = generate_dialogue(
-            text=combined_text,
-            config=dialogue_config,
-            edited_transcript=edited_transcript,
-            user_feedback=user_feedback
+    Returns:
+        Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+            (audio_output, transcript_output, original_text_output, error_output)
+    """
+    try:
+        config, dialogue_config, settings = _build_configs(
+            files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+            template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+            intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+            podcast_dialog_instructions, fresh_sample, strip_sections
         )
-        if not dialogue_lines:
-            return None, None, None, "対話生成に失敗しました"
-        logger.info("LLM生成完了: generate_dialogueが正常に返りました")
-
-        # 音声を生成
-        logger.info("音声生成を開始します")
-        audio = generate_audio_from_transcript(
-            transcript=dialogue_lines,
-            speaker_1_voice=config.speaker_1_voice,
-            speaker_2_voice=config.speaker_2_voice,
-            audio_model=config.audio_model,
-            openai_api_key=config.llm_api_key
+        audio, transcript_output, combined_text = await asyncio.to_thread(
+            _run_generation, config, dialogue_config, settings, files, edited_transcript, user_feedback
         )
-        if not audio:
-            return None, None, None, "音声生成に失敗しました"
-        logger.info("音声生成が完了しました")
-
-        # トランスクリプトの準備
-        transcript_output = "\n\n".join([f"{line.speaker}: {line.text}" for line in dialogue_lines])
-
-        return audio, transcript_output, combined_text, None  # エラーがない場合はNoneを返す
+        return audio, transcript_output, combined_text, None
 
+    except PipelineInputError as e:
+        return None, None, None, str(e)
     except Exception as e:
-        # If an error occurs during generation, return None for the outputs and the error message
         import traceback
         error_msg = f"エラーが発生しました: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_msg)
         return None, None, None, error_msg
 
+def submit_generation_job(
+    files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+    template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+    intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+    podcast_dialog_instructions, edited_transcript, user_feedback, fresh_sample=False,
+    strip_sections=None
+) -> str:
+    """生成ジョブを登録し、ジョブIDを返す関数
+
+    ジョブはバックグラウンドのワーカーで実行され、ステージごとの出力が保存される。
+    引数はprocess_feedback_and_regenerateと同じ。
+
+    Returns:
+        str: ジョブID
+    """
+    config, _, settings = _build_configs(
+        files, text_model, audio_model, speaker_1_voice, speaker_2_voice,
+        template_dropdown, llm_api_key, api_base, llm_api_base, tts_api_key, tts_api_base,
+        intro_instructions, text_instructions, scratch_pad_instructions, prelude_dialog,
+        podcast_dialog_instructions, fresh_sample, strip_sections
+    )
+    params = dict(settings, edited_transcript=edited_transcript, user_feedback=user_feedback, stream=DIALOGUE_STREAMING)
+    return get_job_runner().submit(files, params, api_key=config.llm_api_key)
+
+def get_job_result(job_id: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """ジョブの結果を取得する関数
+
+    Args:
+        job_id (str): ジョブID
+
+    Returns:
+        Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+            (audio_output, transcript_output, original_text_output, error_output)
+    """
+    record = get_job_runner().store.get((job_id or "").strip())
+    if record is None:
+        return None, None, None, "ジョブが見つかりません"
+    if record.status == DONE:
+        if not is_audio_available(record.audio_path):
+            # 同じ入力と設定で生成すると、このジョブが再度実行される
+            return None, record.transcript, record.original_text, "ジョブの音声ファイルは保持期間を過ぎたため削除されました。同じ設定で再度生成してください"
+        return record.audio_path, record.transcript, record.original_text, None
+    if record.status == FAILED:
+        return None, None, None, record.error
+    return None, None, None, f"ジョブは実行中です（完了したステージ: {record.stage or 'なし'}）"
+
+def process_feedback_and_regenerate_job(*args) -> Iterator[Tuple[Any, Any, Any, Any, Any]]:
+    """生成ジョブを登録し、ジョブIDを表示してから完了を待つ関数
+
+    ブラウザが切断されてもジョブは継続し、表示されたジョブIDで後から結果を取得できる。
+    引数はprocess_feedback_and_regenerateと同じ。
+
+    Yields:
+        Tuple[Any, Any, Any, Any, Any]:
+            (audio_output, transcript_output, original_text_output, error_output, job_id_output)
+    """
+    try:
+        job_id = submit_generation_job(*args)
+    except Exception as e:
+        logger.error(f"ジョブの登録に失敗しました: {str(e)}")
+        yield None, None, None, f"エラーが発生しました: {str(e)}", None
+        return
+
+    yield gr.update(), gr.update(), gr.update(), None, job_id
+    get_job_runner().wait(job_id)
+    yield (*get_job_result(job_id), job_id)
+
 def edit_and_regenerate(edited_transcript, user_feedback, *args):
     """編集されたトランスクリプトとフィードバックを使用して再生成を行う関数"""
     return process_feedback_and_regenerate(*args[:-2], edited_transcript, user_feedback)
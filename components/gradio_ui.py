@@ -1,8 +1,19 @@
 import gradio as gr
-from components.instruction_templates import INSTRUCTION_TEMPLATES
+from components.instruction_templates import get_template, template_names
 from components.utility_functions import read_readme, update_instructions
 from components.standard_values import STANDARD_TEXT_MODELS, STANDARD_AUDIO_MODELS, STANDARD_VOICES
-from components.feedback_processing import process_feedback_and_regenerate
+from components.feedback_processing import (
+    ASYNC_PIPELINE,
+    AUDIO_STREAMING,
+    BACKGROUND_JOBS,
+    get_job_result,
+    process_feedback_and_regenerate,
+    process_feedback_and_regenerate_async,
+    process_feedback_and_regenerate_job,
+    process_feedback_and_regenerate_stream
+)
+from components.jobs import get_job_runner
+from components.text_cleanup import SECTION_CHOICES
 import os
 from dotenv import load_dotenv
 
@@ -20,6 +31,8 @@ def gradio_ui():
     openai_api_key_default = os.getenv("OPENAI_API_KEY", "")
 
     css_content = load_css("static/styles.css")
+    # 初期表示に使用するテンプレートだけを読み込む
+    default_template = get_template("podcast")
     
     with gr.Blocks(
         title="PDFをオーディオポッドキャスト、講義、要約などに変換", 
@@ -82,39 +95,39 @@ def gradio_ui():
                 with gr.Column(scale=3):
                     template_dropdown = gr.Dropdown(
                         label="指示テンプレート",
-                        choices=list(INSTRUCTION_TEMPLATES.keys()),
+                        choices=template_names(),
                         value="podcast",
                         info="使用する指示テンプレートを選択してください。より細かい結果を得るために、任意のフィールドを編集することもできます。",
                     )
                     intro_instructions = gr.Textbox(
                         label="導入指示",
                         lines=10,
-                        value=INSTRUCTION_TEMPLATES["podcast"]["intro"],
+                        value=default_template["intro"],
                         info="対話を生成するための導入指示を入力してください。",
                     )
                     text_instructions = gr.Textbox(
                         label="標準テキスト分析指示",
                         lines=10,
                         placeholder="テキスト分析指示を入力...",
-                        value=INSTRUCTION_TEMPLATES["podcast"]["text_instructions"],
+                        value=default_template["text_instructions"],
                         info="生データとテキストを分析するための指示を入力してください。",
                     )
                     scratch_pad_instructions = gr.Textbox(
                         label="メモ帳指示",
                         lines=15,
-                        value=INSTRUCTION_TEMPLATES["podcast"]["scratch_pad"],
+                        value=default_template["scratch_pad"],
                         info="プレゼンテーション/対話のコンテンツをブレインストーミングするためのメモ帳指示を入力してください。",
                     )
                     prelude_dialog = gr.Textbox(
                         label="前置き対話",
                         lines=5,
-                        value=INSTRUCTION_TEMPLATES["podcast"]["prelude"],
+                        value=default_template["prelude"],
                         info="プレゼンテーション/対話が開発される前の前置き指示を入力してください。",
                     )
                     podcast_dialog_instructions = gr.Textbox(
                         label="ポッドキャスト対話指示",
                         lines=20,
-                        value=INSTRUCTION_TEMPLATES["podcast"]["dialog"],
+                        value=default_template["dialog"],
                         info="プレゼンテーションまたはポッドキャストの対話を生成するための指示を入力してください。",
                     )
 
@@ -152,16 +165,43 @@ def gradio_ui():
                         placeholder="TTS APIのベースURLを入力してください"
                     )
 
-        audio_output = gr.Audio(label="オーディオ", format="mp3", interactive=False, autoplay=False)
+        if BACKGROUND_JOBS:
+            # 未完了のジョブを再開し、ジョブIDから結果を取得できるようにする
+            get_job_runner()
+            audio_output = gr.Audio(label="オーディオ", format="mp3", interactive=False, autoplay=False)
+            with gr.Row():
+                job_id_output = gr.Textbox(label="ジョブID", placeholder="ジョブIDを入力すると結果を取得できます", scale=4)
+                job_result_btn = gr.Button("ジョブの結果を取得", scale=1)
+            generate_fn = process_feedback_and_regenerate_job
+            generate_outputs = [audio_output]
+        elif AUDIO_STREAMING:
+            # 完成したセグメントから順に再生し、結合済みのMP3は最後にダウンロード用として出力する
+            audio_output = gr.Audio(label="オーディオ", format="mp3", interactive=False, autoplay=True, streaming=True)
+            audio_file_output = gr.File(label="オーディオをダウンロード", interactive=False)
+            generate_fn = process_feedback_and_regenerate_stream
+            generate_outputs = [audio_output, audio_file_output]
+        else:
+            audio_output = gr.Audio(label="オーディオ", format="mp3", interactive=False, autoplay=False)
+            generate_fn = process_feedback_and_regenerate_async if ASYNC_PIPELINE else process_feedback_and_regenerate
+            generate_outputs = [audio_output]
         transcript_output = gr.Textbox(label="トランスクリプト", lines=20, show_copy_button=True)
         original_text_output = gr.Textbox(label="元のテキスト", lines=10, visible=False)
         error_output = gr.Textbox(visible=False, elem_id="error_output")  # Hidden textbox to store error message
+        result_outputs = generate_outputs + [transcript_output, original_text_output, error_output]
+        if BACKGROUND_JOBS:
+            result_outputs.append(job_id_output)
 
         use_edited_transcript = gr.Checkbox(label="編集済みトランスクリプトを使用（最初に生成されたトランスクリプトを編集する場合はチェックしてください）", value=False)
         edited_transcript = gr.Textbox(label="ここでトランスクリプトを編集してください。例: テキストに編集指示を明確に記載します。例: '[マテリオミクスの定義を追加]'", lines=20, visible=False,
                                        show_copy_button=True, interactive=False)
 
         user_feedback = gr.Textbox(label="フィードバックやメモを入力", lines=10)
+        fresh_sample = gr.Checkbox(label="保存済みの結果を使用せずに新しく生成する", value=False)
+        strip_sections = gr.CheckboxGroup(
+            label="抽出したテキストから除去するセクション（LLMの入力トークンを削減します）",
+            choices=SECTION_CHOICES,
+            value=[]
+        )
         regenerate_btn = gr.Button("編集とフィードバックを反映してオーディオを再生成")
 
         def update_edit_box(checkbox_value):
@@ -180,7 +220,7 @@ def gradio_ui():
         )
 
         submit_btn.click(
-            fn=process_feedback_and_regenerate,
+            fn=generate_fn,
             inputs=[
                 files,
                 text_model,
@@ -199,15 +239,17 @@ def gradio_ui():
                 prelude_dialog,
                 podcast_dialog_instructions,
                 edited_transcript,
-                user_feedback
+                user_feedback,
+                fresh_sample,
+                strip_sections
             ],
-            outputs=[audio_output, transcript_output, original_text_output, error_output]
+            outputs=result_outputs
         ).then(
-            fn=lambda audio, transcript, original_text, error: (
+            fn=lambda transcript, error: (
                 transcript if transcript else "",
                 error if error else None
             ),
-            inputs=[audio_output, transcript_output, original_text_output, error_output],
+            inputs=[transcript_output, error_output],
             outputs=[edited_transcript, error_output]
         ).then(
             fn=lambda error: gr.Warning(error) if error else None,
@@ -216,7 +258,7 @@ def gradio_ui():
         )
 
         regenerate_btn.click(
-            fn=process_feedback_and_regenerate,
+            fn=generate_fn,
             inputs=[
                 files,
                 text_model,
@@ -235,20 +277,33 @@ def gradio_ui():
                 prelude_dialog,
                 podcast_dialog_instructions,
                 edited_transcript,
-                user_feedback
+                user_feedback,
+                fresh_sample,
+                strip_sections
             ],
-            outputs=[audio_output, transcript_output, original_text_output, error_output]
+            outputs=result_outputs
         ).then(
-            fn=lambda audio, transcript, original_text, error: (
+            fn=lambda transcript, error: (
                 transcript if transcript else "",
                 error if error else None
             ),
-            inputs=[audio_output, transcript_output, original_text_output, error_output],
+            inputs=[transcript_output, error_output],
             outputs=[edited_transcript, error_output]
         ).then(
             fn=lambda error: gr.Warning(error) if error else None,
             inputs=[error_output],
             outputs=[]
         )
-                
+
+        if BACKGROUND_JOBS:
+            job_result_btn.click(
+                fn=get_job_result,
+                inputs=[job_id_output],
+                outputs=[audio_output, transcript_output, original_text_output, error_output]
+            ).then(
+                fn=lambda error: gr.Warning(error) if error else None,
+                inputs=[error_output],
+                outputs=[]
+            )
+
     return demo
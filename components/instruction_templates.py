@@ -1,57 +1,92 @@
 import os
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Tuple
 
-def load_prompt(filepath):
-    with open(filepath, 'r') as f:
-        return f.read()
+# 作業ディレクトリに依存しないよう、このファイルからの相対パスで読み込む
+PROMPTS_DIR = os.getenv("PROMPTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"))
 
-# Define multiple sets of instruction templates
-INSTRUCTION_TEMPLATES = {
-################# PODCAST ##################
-    "podcast": {
-        "intro": load_prompt(os.path.join("components", "prompts", "podcast_intro.md")),
-        "text_instructions": load_prompt(os.path.join("components", "prompts", "podcast_text_instructions.md")),
-        "scratch_pad": load_prompt(os.path.join("components", "prompts", "podcast_scratch_pad.md")),
-        "prelude": load_prompt(os.path.join("components", "prompts", "podcast_prelude.md")),
-        "dialog": load_prompt(os.path.join("components", "prompts", "podcast_dialog.md")),
-    },
-################# PODCAST-JP ##################
-    "podcast-jp": {
-        "intro": load_prompt(os.path.join("components", "prompts", "podcast_jp_intro.md")),
-        "text_instructions": load_prompt(os.path.join("components", "prompts", "podcast_jp_text_instructions.md")),
-        "scratch_pad": load_prompt(os.path.join("components", "prompts", "podcast_jp_scratch_pad.md")),
-        "prelude": load_prompt(os.path.join("components", "prompts", "podcast_jp_prelude.md")),
-        "dialog": load_prompt(os.path.join("components", "prompts", "podcast_jp_dialog.md")),
-    },
-################# MATERIAL DISCOVERY SUMMARY ##################
-    "SciAgents material discovery summary": {
-        "intro": load_prompt(os.path.join("components", "prompts", "sciagents_intro.md")),
-        "text_instructions": load_prompt(os.path.join("components", "prompts", "sciagents_text_instructions.md")),
-        "scratch_pad": load_prompt(os.path.join("components", "prompts", "sciagents_scratch_pad.md")),
-        "prelude": load_prompt(os.path.join("components", "prompts", "sciagents_prelude.md")),
-        "dialog": load_prompt(os.path.join("components", "prompts", "sciagents_dialog.md")),
-    },
-################# LECTURE ##################
-    "lecture": {
-        "intro": load_prompt(os.path.join("components", "prompts", "lecture_intro.md")),
-        "text_instructions": load_prompt(os.path.join("components", "prompts", "lecture_text_instructions.md")),
-        "scratch_pad": load_prompt(os.path.join("components", "prompts", "lecture_scratch_pad.md")),
-        "prelude": load_prompt(os.path.join("components", "prompts", "lecture_prelude.md")),
-        "dialog": load_prompt(os.path.join("components", "prompts", "lecture_dialog.md")),
-    },
-################# SUMMARY ##################
-    "summary": {
-        "intro": load_prompt(os.path.join("components", "prompts", "summary_intro.md")),
-        "text_instructions": load_prompt(os.path.join("components", "prompts", "summary_text_instructions.md")),
-        "scratch_pad": load_prompt(os.path.join("components", "prompts", "summary_scratch_pad.md")),
-        "prelude": load_prompt(os.path.join("components", "prompts", "summary_prelude.md")),
-        "dialog": load_prompt(os.path.join("components", "prompts", "summary_dialog.md")),
-    },
-################# SHORT SUMMARY ##################
-    "short summary": {
-        "intro": load_prompt(os.path.join("components", "prompts", "short_summary_intro.md")),
-        "text_instructions": load_prompt(os.path.join("components", "prompts", "short_summary_text_instructions.md")),
-        "scratch_pad": load_prompt(os.path.join("components", "prompts", "short_summary_scratch_pad.md")),
-        "prelude": load_prompt(os.path.join("components", "prompts", "short_summary_prelude.md")),
-        "dialog": load_prompt(os.path.join("components", "prompts", "short_summary_dialog.md")),
-    },
+# テンプレート名 -> プロンプトファイル名の接頭辞
+TEMPLATE_FILES = {
+    "podcast": "podcast",
+    "podcast-jp": "podcast_jp",
+    "SciAgents material discovery summary": "sciagents",
+    "lecture": "lecture",
+    "summary": "summary",
+    "short summary": "short_summary",
+}
+
+# テンプレートの項目 -> プロンプトファイル名の接尾辞
+TEMPLATE_FIELDS = {
+    "intro": "intro",
+    "text_instructions": "text_instructions",
+    "scratch_pad": "scratch_pad",
+    "prelude": "prelude",
+    "dialog": "dialog",
 }
+
+# ファイルパス -> (更新日時, 内容)
+_prompt_cache: Dict[str, Tuple[int, str]] = {}
+_prompt_cache_lock = threading.Lock()
+
+def load_prompt(filepath: str) -> str:
+    """プロンプトファイルを読み込む
+
+    内容は更新日時とともにキャッシュし、ファイルが更新された場合だけ読み直す。
+
+    Args:
+        filepath (str): プロンプトファイルのパス
+
+    Returns:
+        str: ファイルの内容
+    """
+    mtime = os.stat(filepath).st_mtime_ns
+    cached = _prompt_cache.get(filepath)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    with _prompt_cache_lock:
+        _prompt_cache[filepath] = (mtime, content)
+    return content
+
+def template_names() -> List[str]:
+    """利用できるテンプレート名の一覧を返す（ファイルは読み込まない）"""
+    return list(TEMPLATE_FILES)
+
+def get_template(name: str) -> Dict[str, str]:
+    """テンプレートのプロンプトを読み込む
+
+    Args:
+        name (str): テンプレート名
+
+    Returns:
+        Dict[str, str]: 項目名 -> プロンプト
+
+    Raises:
+        KeyError: テンプレートが存在しない場合
+    """
+    prefix = TEMPLATE_FILES[name]
+    return {
+        field: load_prompt(os.path.join(PROMPTS_DIR, f"{prefix}_{suffix}.md"))
+        for field, suffix in TEMPLATE_FIELDS.items()
+    }
+
+class _LazyTemplates(Mapping):
+    """参照されたテンプレートだけを読み込む辞書
+
+    インポート時にはファイルを読み込まず、参照のたびに更新日時を確認して
+    変更されたプロンプトファイルだけを読み直す。
+    """
+
+    def __getitem__(self, name: str) -> Dict[str, str]:
+        return get_template(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(TEMPLATE_FILES)
+
+    def __len__(self) -> int:
+        return len(TEMPLATE_FILES)
+
+# Define multiple sets of instruction templates
+INSTRUCTION_TEMPLATES = _LazyTemplates()
@@ -0,0 +1,445 @@
+import concurrent.futures as cf
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from loguru import logger
+from pydantic import BaseModel
+from .dialogue_generation import DialogueConfig
+from .metrics import JOB_QUEUE_DEPTH, JOBS_IN_FLIGHT
+from .pipeline import PIPELINE_JOB_TTL_DAYS, PipelineInputError, PipelineJob, make_job_id, run_pipeline
+from .text_cleanup import CleanupOptions
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "/app/gradio_cached_examples/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class JobRecord(BaseModel):
+    """ジョブストアに保存されるジョブ"""
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    params: Dict[str, Any]
+    audio_path: Optional[str] = None
+    transcript: Optional[str] = None
+    original_text: Optional[str] = None
+    error: Optional[str] = None
+    owner: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+def make_owner_id() -> str:
+    """ジョブを実行するプロセスの識別子（ホスト名:PID）を返す"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _is_owner_alive(owner: str) -> bool:
+    """ジョブを実行していたプロセスが生きているかどうか（別のホストのプロセスは確認できないため生きているとみなす）"""
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def is_audio_available(audio_path: Optional[str]) -> bool:
+    """完了したジョブの音声ファイルが残っているかどうか（保持期間やディスク使用量の上限で削除される）"""
+    return bool(audio_path) and os.path.exists(audio_path)
+
+class JobStore:
+    """SQLiteに保存されるジョブの一覧
+
+    ジョブのパラメータ・状態・最後に完了したステージ・結果を保存する。
+    ステージの出力そのものはPipelineJobのジョブディレクトリに保存される。
+    APIキーは保存しない。同じデータベースを複数のプロセスで共有する場合も、
+    ジョブはclaimで実行権を得た1つのプロセスだけが実行する。
+    """
+
+    def __init__(self, db_path: str = JOB_DB_PATH):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    params TEXT NOT NULL,
+                    audio_path TEXT,
+                    transcript TEXT,
+                    original_text TEXT,
+                    error TEXT,
+                    owner TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                # 実行中のプロセスを記録する列がない既存のデータベースに追加する
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """接続を開き、終了時にコミット（例外の場合はロールバック）して閉じる
+
+        sqlite3.Connectionのwith文はトランザクションを終了するだけで接続を閉じないため、
+        ポーリングのたびに接続とファイルディスクリプタが残らないようにここで閉じる。
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, job_id: str, params: Dict[str, Any]) -> bool:
+        """ジョブを登録する（失敗したジョブと、音声ファイルが削除された完了済みのジョブは再度キューに入れる）
+
+        Args:
+            job_id (str): ジョブID
+            params (Dict[str, Any]): ジョブのパラメータ（APIキーを除く）
+
+        Returns:
+            bool: 実行が必要な場合はTrue（完了済み・実行中の場合はFalse）
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, audio_path FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, json.dumps(params, ensure_ascii=False), now, now)
+                )
+                return True
+            if row["status"] == FAILED or (row["status"] == DONE and not is_audio_available(row["audio_path"])):
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+                    (QUEUED, now, job_id)
+                )
+                return True
+            return row["status"] == QUEUED
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """待機中のジョブの実行権を取得する
+
+        状態の確認と更新を1つのUPDATE文で行うため、複数のプロセスが同時に
+        取得しようとしても実行権を得るのは1つだけになる。
+
+        Args:
+            job_id (str): ジョブID
+            owner (str): 実行するプロセスの識別子
+
+        Returns:
+            bool: 実行権を取得できた場合はTrue
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (RUNNING, owner, time.time(), job_id, QUEUED)
+            )
+            return cursor.rowcount == 1
+
+    def requeue_orphaned(self, owner: str, active: Set[str] = frozenset()) -> List[str]:
+        """実行していたプロセスが終了した実行中のジョブを待機中に戻す
+
+        実行者が記録されていないジョブ、同じホストで終了したプロセスのジョブ、
+        同じ識別子（再起動でPIDが再利用された場合）で現在実行していないジョブを戻す。
+
+        Args:
+            owner (str): このプロセスの識別子
+            active (Set[str], optional): このプロセスで実行中のジョブID. Defaults to frozenset().
+
+        Returns:
+            List[str]: 待機中に戻したジョブID
+        """
+        requeued = []
+        with self._connect() as conn:
+            rows = conn.execute("SELECT job_id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            for row in rows:
+                previous = row["owner"]
+                if previous == owner:
+                    if row["job_id"] in active:
+                        continue
+                elif previous is not None and _is_owner_alive(previous):
+                    continue
+                # 確認してから更新するまでに別のプロセスが戻した場合は更新しない
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? "
+                    "WHERE job_id = ? AND status = ? AND owner IS ?",
+                    (QUEUED, time.time(), row["job_id"], RUNNING, previous)
+                )
+                if cursor.rowcount == 1:
+                    requeued.append(row["job_id"])
+        return requeued
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """ジョブの状態や結果を更新する"""
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        """ジョブを取得する（存在しない場合はNone）"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        data = dict(row)
+        data["params"] = json.loads(data["params"])
+        return JobRecord(**data)
+
+    def unfinished(self, statuses: Tuple[str, ...] = (QUEUED, RUNNING)) -> List[str]:
+        """未完了（待機中・実行中）のジョブIDを登録順に返す
+
+        Args:
+            statuses (Tuple[str, ...], optional): 対象の状態. Defaults to (QUEUED, RUNNING).
+        """
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT job_id FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at",
+                statuses
+            ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def purge(self, max_age_days: float = PIPELINE_JOB_TTL_DAYS) -> int:
+        """保持期間を過ぎた完了・失敗済みのジョブを削除する
+
+        Returns:
+            int: 削除されたジョブの数
+        """
+        cutoff = time.time() - max_age_days * 24 * 60 * 60
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, cutoff)
+            )
+            return cursor.rowcount
+
+def _copy_inputs(job: PipelineJob, files: Any) -> List[str]:
+    """アップロードされたファイルをジョブディレクトリに複製する
+
+    Gradioの一時ファイルは再起動後に残らないため、再開できるようにジョブ側に保存する。
+    """
+    if isinstance(files, str):
+        files = [files]
+    inputs_dir = job.dir / "inputs"
+    inputs_dir.mkdir(exist_ok=True)
+    copied = []
+    for i, file_path in enumerate(files or []):
+        if not file_path or not os.path.isfile(file_path):
+            continue
+        destination = inputs_dir / f"{i:03d}-{Path(file_path).name}"
+        if not destination.exists():
+            shutil.copyfile(file_path, destination)
+        copied.append(str(destination))
+    return copied
+
+class JobRunner:
+    """ジョブストアのジョブをバックグラウンドのワーカーで実行する
+
+    ジョブはGradioのリクエストとは独立して実行されるため、ブラウザの切断後も
+    処理が続く。プロセスの再起動後は未完了のジョブを最後に完了したステージと
+    セグメントから再開する。
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.owner = make_owner_id()
+        self._executor = cf.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._active: set = set()
+        self._api_keys: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, files: Any, params: Dict[str, Any], api_key: Optional[str] = None) -> str:
+        """ジョブを登録してバックグラウンドで実行する
+
+        同じ入力と設定のジョブは同じIDになり、完了済みの場合は再実行しない。
+
+        Args:
+            files (Any): アップロードされたファイル
+            params (Dict[str, Any]): 生成設定（APIキーを除く）
+            api_key (Optional[str], optional): 実行に使用するAPIキー（ジョブストアには保存しない）. Defaults to None.
+
+        Returns:
+            str: ジョブID
+        """
+        job_id = make_job_id(files, params, params.get("edited_transcript"), params.get("user_feedback"))
+        job = PipelineJob(job_id)
+        params = dict(params, files=_copy_inputs(job, files))
+        with self._lock:
+            self._api_keys[job_id] = api_key
+        if self.store.enqueue(job_id, params):
+            logger.info(f"ジョブを登録しました: {job_id}")
+            self._start(job_id)
+        else:
+            logger.info(f"登録済みのジョブを使用します: {job_id}")
+        return job_id
+
+    def resume(self) -> int:
+        """未完了のジョブを再開する
+
+        実行していたプロセスが終了したジョブを待機中に戻してから、待機中のジョブを
+        実行する。別のプロセスが実行中のジョブと、先に実行権を取得されたジョブは実行しない。
+
+        Returns:
+            int: 再開したジョブの数
+        """
+        with self._lock:
+            active = set(self._active)
+        for job_id in self.store.requeue_orphaned(self.owner, active):
+            logger.info(f"中断されたジョブを待機中に戻しました: {job_id}")
+        job_ids = self.store.unfinished((QUEUED,))
+        for job_id in job_ids:
+            logger.info(f"未完了のジョブを再開します: {job_id}")
+            self._start(job_id)
+        return len(job_ids)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[JobRecord]:
+        """ジョブが完了または失敗するまで待機する
+
+        Args:
+            job_id (str): ジョブID
+            timeout (Optional[float], optional): 最大待機時間[秒]. Defaults to None.
+
+        Returns:
+            Optional[JobRecord]: ジョブ（タイムアウトした場合は未完了の状態）
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            record = self.store.get(job_id)
+            if record is None or record.status in (DONE, FAILED):
+                return record
+            if deadline is not None and time.monotonic() >= deadline:
+                return record
+            time.sleep(JOB_POLL_SECONDS)
+
+    def _start(self, job_id: str) -> None:
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        JOB_QUEUE_DEPTH.inc()
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id: str) -> None:
+        JOB_QUEUE_DEPTH.dec()
+        JOBS_IN_FLIGHT.inc()
+        try:
+            if not self.store.claim(job_id, self.owner):
+                logger.info(f"ジョブは別のワーカーが実行しています: {job_id}")
+                return
+            record = self.store.get(job_id)
+            # 再起動後はAPIキーが残っていないため、環境変数のAPIキーを使用する
+            api_key = self._api_keys.get(job_id) or os.getenv("LLM_API_KEY")
+            audio_path, transcript, original_text = execute_job(self.store, record, api_key)
+            self.store.update(
+                job_id, status=DONE, stage="done",
+                audio_path=audio_path, transcript=transcript, original_text=original_text
+            )
+            logger.info(f"ジョブが完了しました: {job_id}")
+        except PipelineInputError as e:
+            self.store.update(job_id, status=FAILED, error=str(e))
+        except Exception as e:
+            import traceback
+            error_msg = f"エラーが発生しました: {str(e)}\n{traceback.format_exc()}"
+            logger.error(error_msg)
+            self.store.update(job_id, status=FAILED, error=error_msg)
+        finally:
+            JOBS_IN_FLIGHT.dec()
+            with self._lock:
+                self._active.discard(job_id)
+                self._api_keys.pop(job_id, None)
+            self.store.purge()
+
+def execute_job(store: JobStore, record: JobRecord, api_key: Optional[str]) -> tuple:
+    """ジョブのパラメータでチェックポイント付きのパイプラインを実行する
+
+    Args:
+        store (JobStore): 完了したステージを記録するジョブストア
+        record (JobRecord): 実行するジョブ
+        api_key (Optional[str]): APIキー
+
+    Returns:
+        tuple: (音声ファイルのパス, トランスクリプト, 抽出されたテキスト)
+    """
+    params = record.params
+    dialogue_config = DialogueConfig(
+        model_name=params["text_model"],
+        template_type=params["template_dropdown"],
+        intro_instructions=params["intro_instructions"],
+        text_instructions=params["text_instructions"],
+        scratch_pad_instructions=params["scratch_pad_instructions"],
+        prelude_dialog=params["prelude_dialog"],
+        podcast_dialog_instructions=params["podcast_dialog_instructions"],
+        api_base=params.get("llm_api_base"),
+        bypass_cache=bool(params.get("fresh_sample"))
+    )
+    job = PipelineJob(record.job_id, on_stage=lambda stage: store.update(record.job_id, stage=stage))
+    audio_path, dialogue_lines, combined_text = run_pipeline(
+        job,
+        params["files"],
+        dialogue_config,
+        speaker_1_voice=params["speaker_1_voice"],
+        speaker_2_voice=params["speaker_2_voice"],
+        audio_model=params["audio_model"],
+        api_key=api_key,
+        edited_transcript=params.get("edited_transcript"),
+        user_feedback=params.get("user_feedback"),
+        stream=params.get("stream", False),
+        cleanup=CleanupOptions.from_sections(params.get("strip_sections"))
+    )
+    transcript = "\n\n".join([f"{line.speaker}: {line.text}" for line in dialogue_lines])
+    return audio_path, transcript, combined_text
+
+def unfinished_job_ids(db_path: str = JOB_DB_PATH) -> Set[str]:
+    """ジョブストアの未完了（待機中・実行中）のジョブIDを返す（ディスク使用量の管理で削除しない）
+
+    Args:
+        db_path (str, optional): ジョブストアのパス. Defaults to JOB_DB_PATH.
+
+    Returns:
+        Set[str]: ジョブID（ジョブストアがない場合は空）
+    """
+    if not os.path.exists(db_path):
+        return set()
+    return set(JobStore(db_path).unfinished())
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+def get_job_runner() -> JobRunner:
+    """共有のジョブランナーを取得する（初回の取得時に未完了のジョブを再開する）
+
+    Returns:
+        JobRunner: ジョブランナー
+    """
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                runner = JobRunner(JobStore())
+                runner.resume()
+                _runner = runner
+    return _runner
@@ -0,0 +1,89 @@
+import os
+import sys
+import threading
+from typing import Dict
+from loguru import logger
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# 空文字の場合はファイルに出力しない
+LOG_FILE = os.getenv("LOG_FILE", "processing.log")
+LOG_ROTATION = os.getenv("LOG_ROTATION", "500 MB")
+LOG_RETENTION = os.getenv("LOG_RETENTION", "7 days")
+# 1行のログの最大文字数（超えた分は切り詰める）
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+# truncate()で切り詰めるテキスト（プロンプト・応答・セグメントなど）の最大文字数
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "200"))
+# サンプリング対象のログは同じキーのN件に1件だけ出力する（1で全件出力）
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "20"))
+
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+def truncate(text, limit: int = LOG_PAYLOAD_CHARS) -> str:
+    """ログに出力するテキストを切り詰める
+
+    Args:
+        text: 出力するテキスト
+        limit (int, optional): 最大文字数. Defaults to LOG_PAYLOAD_CHARS.
+
+    Returns:
+        str: 切り詰めたテキスト（省略した文字数を末尾に付ける）
+    """
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit}文字)"
+
+class _Sampler:
+    """logger.bind(sample=キー)で出力されたログを同じキーのN件に1件だけ残す
+
+    判定はレコードごとに1回だけ行い、すべての出力先で同じレコードを残す。
+    警告以上のログは常に残す。
+    """
+
+    def __init__(self, every: int):
+        self.every = max(1, every)
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def patch(self, record) -> None:
+        if len(record["message"]) > LOG_MAX_MESSAGE_CHARS:
+            record["message"] = truncate(record["message"], LOG_MAX_MESSAGE_CHARS)
+        key = record["extra"].get("sample")
+        if key is None or self.every == 1 or record["level"].no >= 30:  # WARNING以上
+            return
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        record["extra"]["sampled_out"] = count % self.every != 0
+
+    @staticmethod
+    def filter(record) -> bool:
+        return not record["extra"].get("sampled_out", False)
+
+def setup_logging() -> None:
+    """ログの出力先を設定する（プロセスごとに1回だけ実行される）
+
+    出力はキュー経由で別スレッドから書き込むため、呼び出し側はI/Oを待たない。
+    長いメッセージは切り詰め、サンプリング対象のログは間引く。
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        sampler = _Sampler(LOG_SAMPLE_EVERY)
+        handlers = [
+            dict(sink=sys.stderr, level=LOG_LEVEL, format=LOG_FORMAT, filter=sampler.filter, enqueue=True)
+        ]
+        if LOG_FILE:
+            handlers.append(dict(
+                sink=LOG_FILE, level=LOG_LEVEL, filter=sampler.filter, enqueue=True,
+                rotation=LOG_ROTATION, retention=LOG_RETENTION, compression="gz"
+            ))
+        logger.configure(handlers=handlers, patcher=sampler.patch)
+        _configured = True
@@ -0,0 +1,138 @@
+import os
+from contextlib import ContextDecorator
+from typing import Callable, Optional
+from loguru import logger
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+Counter = Gauge = Histogram = make_asgi_app = None
+if METRICS_ENABLED:
+    try:
+        # prometheus_clientは任意の依存関係（未インストールの場合はメトリクスを記録しない）
+        from prometheus_client import Counter, Gauge, Histogram, make_asgi_app
+    except ImportError:
+        pass
+
+class _NoopContext(ContextDecorator):
+    def __enter__(self) -> "_NoopContext":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+class _NoopMetric:
+    """prometheus_clientが利用できない場合の何もしないメトリクス"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        pass
+
+    def observe(self, amount: float) -> None:
+        pass
+
+    def track_inprogress(self) -> _NoopContext:
+        return _NoopContext()
+
+def is_metrics_available() -> bool:
+    """メトリクスを記録・公開できるかどうか"""
+    return METRICS_ENABLED and Counter is not None
+
+def _metric(metric_type, name: str, documentation: str, labelnames=(), **kwargs):
+    if not is_metrics_available():
+        return _NoopMetric()
+    return metric_type(name, documentation, labelnames, **kwargs)
+
+_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# テキスト抽出
+PDF_PAGES_EXTRACTED = _metric(Counter, "pdf2audio_pdf_pages_extracted", "抽出したPDFのページ数")
+PDF_PAGES_PER_SECOND = _metric(
+    Histogram, "pdf2audio_pdf_pages_per_second", "PDFファイルごとの抽出速度（ページ/秒）",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+PDF_EXTRACTION_SECONDS = _metric(
+    Histogram, "pdf2audio_pdf_extraction_seconds", "PDFの並列抽出1回あたりの所要時間", buckets=_LATENCY_BUCKETS
+)
+TEXT_CLEANUP_REMOVED_CHARS = _metric(
+    Counter, "pdf2audio_text_cleanup_removed_chars", "クリーンアップで除去した文字数", ("kind",)
+)
+
+# LLM
+LLM_REQUEST_SECONDS = _metric(
+    Histogram, "pdf2audio_llm_request_seconds", "LLMリクエストのレイテンシ",
+    ("operation", "model", "status"), buckets=_LATENCY_BUCKETS
+)
+LLM_TOKENS = _metric(Counter, "pdf2audio_llm_tokens", "LLMのトークン数", ("operation", "model", "kind"))
+
+# TTS
+TTS_REQUEST_SECONDS = _metric(
+    Histogram, "pdf2audio_tts_request_seconds", "セグメントごとのTTSリクエストのレイテンシ",
+    ("model", "status"), buckets=_LATENCY_BUCKETS
+)
+TTS_SEGMENT_BYTES = _metric(
+    Histogram, "pdf2audio_tts_segment_bytes", "セグメントごとの音声データのサイズ",
+    ("model",), buckets=(1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+)
+TTS_IN_FLIGHT = _metric(Gauge, "pdf2audio_tts_in_flight", "実行中のTTSリクエスト数", ("endpoint",))
+TTS_CONCURRENCY_LIMIT = _metric(Gauge, "pdf2audio_tts_concurrency_limit", "TTSの同時実行数の上限", ("endpoint",))
+
+# 音声の結合
+AUDIO_CONCAT_SECONDS = _metric(
+    Histogram, "pdf2audio_audio_concat_seconds", "全セグメントの受信後に結合が完了するまでの時間",
+    ("mode",), buckets=_LATENCY_BUCKETS
+)
+
+# キャッシュ
+CACHE_LOOKUPS = _metric(Counter, "pdf2audio_cache_lookups", "キャッシュの参照回数", ("cache", "result"))
+
+# ジョブ・リクエスト
+PIPELINE_IN_FLIGHT = _metric(Gauge, "pdf2audio_pipeline_in_flight", "実行中の生成パイプライン数")
+JOB_QUEUE_DEPTH = _metric(Gauge, "pdf2audio_job_queue_depth", "実行待ちのバックグラウンドジョブ数")
+JOBS_IN_FLIGHT = _metric(Gauge, "pdf2audio_jobs_in_flight", "実行中のバックグラウンドジョブ数")
+
+def observe_llm(
+    operation: str,
+    model: str,
+    seconds: float,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    error: bool = False
+) -> None:
+    """LLMリクエストのレイテンシとトークン数を記録する
+
+    Args:
+        operation (str): 処理の種類（dialogue, dialogue_stream, chunk_analysisなど）
+        model (str): モデル名
+        seconds (float): レイテンシ[秒]
+        prompt_tokens (Optional[int], optional): 入力トークン数. Defaults to None.
+        completion_tokens (Optional[int], optional): 出力トークン数. Defaults to None.
+        error (bool, optional): 失敗した場合はTrue. Defaults to False.
+    """
+    LLM_REQUEST_SECONDS.labels(operation, model, "error" if error else "ok").observe(seconds)
+    if prompt_tokens:
+        LLM_TOKENS.labels(operation, model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(operation, model, "completion").inc(completion_tokens)
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """キャッシュの参照結果を記録する（ヒット率は hit / (hit + miss) で求める）"""
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+def metrics_asgi_app():
+    """/metricsとしてマウントするASGIアプリを返す（利用できない場合はNone）"""
+    if not is_metrics_available():
+        if METRICS_ENABLED:
+            logger.warning("prometheus_clientがインストールされていないため、/metricsは無効です")
+        return None
+    return make_asgi_app()
@@ -0,0 +1,555 @@
+import concurrent.futures as cf
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Set, Tuple
+from loguru import logger
+from .audio.audio_cache import SegmentCache, get_segment_cache, make_segment_key
+from .audio.audio_concurrency import TTS_CONCURRENCY_MAX, classify_error
+from .audio.audio_ffmpeg import AUDIO_ASSEMBLY_MODE, SegmentEncoder, is_stream_copy_enabled
+from .audio.audio_generation import prepare_segment_for_assembly, synthesize_segment
+from .audio.audio_manifest import INCREMENTAL_AUDIO_ENABLED, SegmentManifest, build_manifest, diff_segments, reuse_segment
+from .audio.audio_planner import PlannedSegment, longest_first, plan_segments
+from .dialogue_chunking import analyze_chunk, prepare_dialogue_source
+from .dialogue_generation import DialogueConfig, DialogueLine, generate_dialogue, stream_dialogue
+from .document_extraction import load_combined_text
+from .artifact_store import EPISODE_CACHE_ENABLED, ArtifactStore, get_artifact_store
+from .extraction_cache import file_digest
+from .metrics import PIPELINE_IN_FLIGHT, record_cache_lookup
+from .text_cleanup import CleanupOptions
+
+PIPELINE_JOBS_DIR = os.getenv("PIPELINE_JOBS_DIR", "/app/gradio_cached_examples/jobs/")
+PIPELINE_RETRY_BUDGET = int(os.getenv("PIPELINE_RETRY_BUDGET", "6"))
+PIPELINE_JOB_TTL_DAYS = float(os.getenv("PIPELINE_JOB_TTL_DAYS", "1"))
+
+# 実行中のジョブ（ディスク使用量の管理で削除しない）
+_active_jobs: Set[str] = set()
+_active_jobs_lock = threading.Lock()
+
+def active_job_ids() -> Set[str]:
+    """実行中のジョブIDを返す"""
+    with _active_jobs_lock:
+        return set(_active_jobs)
+
+class PipelineInputError(Exception):
+    """入力に問題があり、再試行しても解決しないエラー（メッセージはユーザーに表示する）"""
+
+class RetryBudget:
+    """ジョブ全体で共有される再試行回数の上限"""
+
+    def __init__(self, total: int = PIPELINE_RETRY_BUDGET):
+        self.total = total
+        self.remaining = total
+        self._lock = threading.Lock()
+
+    def consume(self, unit: str) -> bool:
+        """再試行を1回分消費する
+
+        Args:
+            unit (str): 再試行する単位（ステージ名やセグメント番号）
+
+        Returns:
+            bool: 再試行できる場合はTrue
+        """
+        with self._lock:
+            if self.remaining <= 0:
+                logger.error(f"再試行の上限に達しました: {unit} (上限 {self.total}回)")
+                return False
+            self.remaining -= 1
+            logger.warning(f"再試行します: {unit} (残り {self.remaining}/{self.total}回)")
+            return True
+
+# 再試行しても解決しない（設定や環境の問題による）OSError
+_PERMANENT_OS_ERRORS = (FileNotFoundError, PermissionError, IsADirectoryError, NotADirectoryError)
+
+def classify_pipeline_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    """例外が再試行可能かどうかとRetry-Afterの秒数を判定する
+
+    入力の問題、ffmpegやファイルが見つからないなどの環境の問題、認証エラーや不正なリクエストなど
+    429/5xx以外のAPIエラーは再試行しない。それ以外（通信エラー、対話の解析の失敗など）は再試行する。
+
+    Args:
+        error (Exception): 発生した例外
+
+    Returns:
+        Tuple[bool, Optional[float]]: (再試行可能か, Retry-Afterの秒数)
+    """
+    if isinstance(error, (PipelineInputError,) + _PERMANENT_OS_ERRORS):
+        return False, None
+    # openaiの読み込みは重いため、読み込み済みの場合（APIを呼び出した後）だけ判定する
+    if "openai" in sys.modules:
+        from openai import APIError
+        if isinstance(error, APIError):
+            return classify_error(error)
+    return True, None
+
+def call_with_retries(unit: str, budget: RetryBudget, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """失敗した単位のみを、ジョブの再試行回数の範囲内で再実行する
+
+    再試行しても解決しないエラー（classify_pipeline_error）は再試行せずにすぐに送出する。
+
+    Args:
+        unit (str): 再試行する単位（ステージ名やセグメント番号）
+        budget (RetryBudget): ジョブの再試行回数
+        fn (Callable[..., Any]): 実行する関数
+
+    Returns:
+        Any: 関数の戻り値
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            retryable, retry_after = classify_pipeline_error(e)
+            if not retryable:
+                if not isinstance(e, PipelineInputError):
+                    logger.error(f"{unit} で再試行しても解決しないエラーが発生しました: {str(e)}")
+                raise
+            logger.error(f"{unit} でエラーが発生しました: {str(e)}")
+            if not budget.consume(unit):
+                raise
+            time.sleep(retry_after if retry_after is not None else min(10, 2 ** attempt))
+            attempt += 1
+
+def _tmp_path(path: Path) -> Path:
+    """書き込み途中のファイルのパス（同じ入力のジョブを同時に実行しても衝突しない）
+
+    ジョブIDは入力から決まるため、同じ入力のジョブはジョブディレクトリを共有する。
+    一時ファイルをプロセス・スレッドごとに分け、完成したファイルだけを置き換えで公開する。
+    拡張子はffmpegが出力形式を判定するために残す。
+    """
+    return path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}")
+
+class PipelineJob:
+    """ステージごとの出力をディスクに保存するジョブ
+
+    各ステージ（抽出 → 対話 → セグメントごとの音声 → 結合）の出力を
+    ジョブディレクトリに保存し、再実行時は完了済みのステージを読み込む。
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        jobs_dir: str = PIPELINE_JOBS_DIR,
+        on_stage: Optional[Callable[[str], None]] = None
+    ):
+        self.job_id = job_id
+        self.on_stage = on_stage
+        self.dir = Path(jobs_dir) / job_id
+        self.dir.mkdir(parents=True, exist_ok=True)
+        (self.dir / "segments").mkdir(exist_ok=True)
+        # 保持期間の判定に使用するため、再開時にも更新日時を更新する
+        os.utime(self.dir)
+
+    def load(self, stage: str) -> Optional[Any]:
+        """ステージのチェックポイントを読み込む（存在しない場合はNone）"""
+        path = self.dir / f"{stage}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            logger.info(f"チェックポイントを使用します: {self.job_id}/{stage}")
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"チェックポイントの読み込みに失敗: {path} - {str(e)}")
+            return None
+
+    def save(self, stage: str, data: Any) -> None:
+        """ステージのチェックポイントを保存する"""
+        path = self.dir / f"{stage}.json"
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        if self.on_stage is not None:
+            self.on_stage(stage)
+
+    def segment_path(self, index: int, text: str, voice: str, audio_model: str) -> Path:
+        """セグメントの保存先（内容が変わった場合は別のファイルになる）"""
+        content_hash = hashlib.sha256(
+            f"{AUDIO_ASSEMBLY_MODE}\n{audio_model}\n{voice}\n{text}".encode("utf-8")
+        ).hexdigest()[:12]
+        return self.dir / "segments" / f"{index:05d}-{content_hash}.mp3"
+
+    @property
+    def episode_path(self) -> Path:
+        return self.dir / "episode.mp3"
+
+def _file_keys(files: Any) -> List[str]:
+    """アップロードされたファイルの内容のダイジェスト（読めない場合はパス）"""
+    if isinstance(files, str):
+        files = [files]
+    file_keys = []
+    for file_path in files or []:
+        try:
+            file_keys.append(file_digest(Path(file_path)))
+        except Exception:
+            file_keys.append(str(file_path))
+    return file_keys
+
+def make_job_id(files: Any, settings: dict, edited_transcript: Optional[str], user_feedback: Optional[str]) -> str:
+    """入力内容からジョブIDを生成する（同じ入力の再実行は同じジョブを再開する）
+
+    Args:
+        files (Any): アップロードされたファイル
+        settings (dict): APIキーを除いた生成設定
+        edited_transcript (Optional[str]): 編集済みトランスクリプト
+        user_feedback (Optional[str]): ユーザーフィードバック
+
+    Returns:
+        str: ジョブID
+    """
+    payload = json.dumps(
+        [_file_keys(files), settings, edited_transcript or "", user_feedback or ""],
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def make_lineage_key(files: Any) -> str:
+    """入力文書のキーを生成する（設定・編集・フィードバックが異なる再生成でも同じキーになる）
+
+    Args:
+        files (Any): アップロードされたファイル
+
+    Returns:
+        str: 入力文書のキー
+    """
+    payload = json.dumps(_file_keys(files), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def _extract_stage(files: Any, cleanup: Optional[CleanupOptions]) -> str:
+    combined_text, error_message = load_combined_text(files, cleanup)
+    if error_message:
+        raise PipelineInputError(error_message)
+    return combined_text
+
+def _dialogue_source_stage(combined_text: str, dialogue_config: DialogueConfig, budget: RetryBudget) -> str:
+    # 失敗したセクションだけをジョブの再試行回数の範囲内で再実行する
+    def analyze(chunk: str, index: int, total: int, config: DialogueConfig) -> Tuple[str, int, int]:
+        return call_with_retries(
+            f"セクション分析 {index + 1}/{total}", budget, analyze_chunk, chunk, index, total, config
+        )
+
+    return prepare_dialogue_source(combined_text, dialogue_config, analyze)
+
+def _synthesize_segment_file(
+    path: Path,
+    index: int,
+    text: str,
+    voice: str,
+    audio_model: str,
+    api_key: Optional[str],
+    cache: Optional[SegmentCache],
+    cache_key: Optional[str],
+    budget: RetryBudget
+) -> str:
+    """1セグメントを生成してジョブディレクトリに保存する"""
+    audio_chunk = cache.get(cache_key) if cache else None
+    if audio_chunk is None:
+        # 再試行は同時実行数のコントローラーがジョブの再試行回数の範囲内で行う（429/5xxは上限の縮小と待機を伴う）
+        audio_chunk = synthesize_segment(
+            text, voice, audio_model, api_key, cache, cache_key,
+            allow_retry=lambda: budget.consume(f"音声セグメント {index + 1}")
+        )
+    audio_chunk = prepare_segment_for_assembly(audio_chunk)
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "wb") as f:
+        f.write(audio_chunk)
+    os.replace(tmp_path, path)
+    return str(path)
+
+def synthesize_segments(
+    job: PipelineJob,
+    transcript: Iterable[DialogueLine],
+    speaker_1_voice: str,
+    speaker_2_voice: str,
+    audio_model: str,
+    api_key: Optional[str],
+    budget: RetryBudget,
+    previous: Optional[SegmentManifest] = None,
+    on_segment: Optional[Callable[[int, str], None]] = None
+) -> List[str]:
+    """保存済みのセグメントを除いて音声を生成し、トランスクリプト順のファイルパスを返す
+
+    Args:
+        job (PipelineJob): ジョブ
+        transcript (Iterable[DialogueLine]): トランスクリプト（ジェネレータも可）
+        speaker_1_voice (str): ホストの声
+        speaker_2_voice (str): ゲストの声
+        audio_model (str): 使用する音声モデル
+        api_key (Optional[str]): APIキー
+        budget (RetryBudget): ジョブの再試行回数
+        previous (Optional[SegmentManifest], optional): 前回のエピソードの対応表（内容が同じセグメントを再利用する）. Defaults to None.
+        on_segment (Optional[Callable[[int, str], None]], optional): 先頭から完成したセグメントごとに
+            (セグメント番号, ファイルパス) で呼び出す関数. Defaults to None.
+
+    Returns:
+        List[str]: セグメントのファイルパス
+    """
+    cache = get_segment_cache()
+    endpoint = os.getenv("TTS_API_BASE")
+    previous_segments = previous.by_key() if previous is not None else {}
+    reused = spliced = 0
+
+    segments = plan_segments(transcript, speaker_1_voice, speaker_2_voice)
+    futures: List[cf.Future] = []
+    delivered = 0
+
+    def deliver_ready(block: bool) -> None:
+        """先頭から完成しているセグメントを再生順に通知する"""
+        nonlocal delivered
+        while delivered < len(futures):
+            future = futures[delivered]
+            # 失敗したセグメントの例外は残りのセグメントを投入した後に送出する
+            if not block and (not future.done() or future.exception() is not None):
+                return
+            path = future.result()
+            if on_segment is not None:
+                on_segment(delivered, path)
+            delivered += 1
+
+    with cf.ThreadPoolExecutor(max_workers=TTS_CONCURRENCY_MAX) as executor:
+        def submit(segment: PlannedSegment) -> cf.Future:
+            nonlocal reused, spliced
+            path = job.segment_path(segment.index, segment.text, segment.voice, audio_model)
+            segment_key = make_segment_key(segment.text, segment.voice, audio_model, endpoint)
+            if not path.exists() and previous is not None:
+                previous_segment = previous_segments.get(segment_key)
+                hit = previous_segment is not None and reuse_segment(previous, previous_segment, path)
+                record_cache_lookup("episode_segment", hit)
+                spliced += hit
+            if path.exists():
+                future = cf.Future()
+                future.set_result(str(path))
+                reused += 1
+                return future
+            cache_key = segment_key if cache else None
+            return executor.submit(
+                _synthesize_segment_file, path, segment.index, segment.text, segment.voice,
+                audio_model, api_key, cache, cache_key, budget
+            )
+
+        if isinstance(transcript, Sequence):
+            # 長いセグメントから投入し、結果は再生順に並べる
+            planned = list(segments)
+            submitted = {segment.index: submit(segment) for segment in longest_first(planned)}
+            futures.extend(submitted[segment.index] for segment in planned)
+        else:
+            for segment in segments:
+                futures.append(submit(segment))
+                deliver_ready(block=False)
+        logger.info(f"音声セグメント: 合計{len(futures)}個 (保存済み: {reused}個, うち前回のエピソードから: {spliced}個)")
+        # 失敗したセグメントがあっても、完了したセグメントは保存されて次回の実行で再利用される
+        deliver_ready(block=True)
+        return [future.result() for future in futures]
+
+@PIPELINE_IN_FLIGHT.track_inprogress()
+def run_pipeline(
+    job: PipelineJob,
+    files: Any,
+    dialogue_config: DialogueConfig,
+    speaker_1_voice: str,
+    speaker_2_voice: str,
+    audio_model: str,
+    api_key: Optional[str],
+    edited_transcript: Optional[str] = None,
+    user_feedback: Optional[str] = None,
+    stream: bool = False,
+    cleanup: Optional[CleanupOptions] = None,
+    on_segment: Optional[Callable[[int, str], None]] = None
+) -> Tuple[str, List[DialogueLine], str]:
+    """チェックポイント付きで生成パイプラインを実行する
+
+    Args:
+        job (PipelineJob): ジョブ
+        files (Any): アップロードされたファイル
+        dialogue_config (DialogueConfig): 対話生成の設定
+        speaker_1_voice (str): ホストの声
+        speaker_2_voice (str): ゲストの声
+        audio_model (str): 使用する音声モデル
+        api_key (Optional[str]): TTSに使用するAPIキー
+        edited_transcript (Optional[str], optional): 編集済みトランスクリプト. Defaults to None.
+        user_feedback (Optional[str], optional): ユーザーフィードバック. Defaults to None.
+        stream (bool, optional): 対話をストリーミングで生成し、音声生成と並行させる. Defaults to False.
+        cleanup (Optional[CleanupOptions], optional): 抽出したテキストから除去するセクションの設定. Defaults to None.
+        on_segment (Optional[Callable[[int, str], None]], optional): 完成したセグメントを再生順に
+            (セグメント番号, ファイルパス) で受け取る関数（対話のストリーミング生成後の音声生成では
+            同じ番号が再度通知される。保存済みのエピソードを使用する場合は呼び出されない）. Defaults to None.
+
+    Returns:
+        Tuple[str, List[DialogueLine], str]: (音声ファイルのパス, 対話行, 抽出されたテキスト)
+
+    Raises:
+        PipelineInputError: 入力ファイルに問題がある場合
+    """
+    store = get_artifact_store() if EPISODE_CACHE_ENABLED or INCREMENTAL_AUDIO_ENABLED else None
+    if store is not None and EPISODE_CACHE_ENABLED:
+        cached = store.get_episode(job.job_id)
+        if cached is not None:
+            logger.info(f"保存済みのエピソードを使用します: {job.job_id}")
+            return cached.audio_path, [DialogueLine(**line) for line in cached.lines], cached.combined_text
+
+    with _active_jobs_lock:
+        _active_jobs.add(job.job_id)
+    try:
+        return _run_stages(
+            job, files, dialogue_config, speaker_1_voice, speaker_2_voice, audio_model, api_key,
+            edited_transcript, user_feedback, stream, cleanup, store, on_segment
+        )
+    finally:
+        with _active_jobs_lock:
+            _active_jobs.discard(job.job_id)
+
+def _run_stages(
+    job: PipelineJob,
+    files: Any,
+    dialogue_config: DialogueConfig,
+    speaker_1_voice: str,
+    speaker_2_voice: str,
+    audio_model: str,
+    api_key: Optional[str],
+    edited_transcript: Optional[str],
+    user_feedback: Optional[str],
+    stream: bool,
+    cleanup: Optional[CleanupOptions],
+    store: Optional[ArtifactStore],
+    on_segment: Optional[Callable[[int, str], None]]
+) -> Tuple[str, List[DialogueLine], str]:
+    budget = RetryBudget()
+    logger.info(f"ジョブを開始します: {job.job_id} (再試行上限 {budget.total}回)")
+
+    # 同じ文書から最後に生成したエピソードの対応表（変更のないセグメントの音声を再利用する）
+    lineage = previous = None
+    if store is not None and INCREMENTAL_AUDIO_ENABLED:
+        lineage = make_lineage_key(files)
+        previous = store.get_manifest(lineage)
+        if previous is not None and previous.assembly_mode != AUDIO_ASSEMBLY_MODE:
+            previous = None
+
+    # 1. テキスト抽出
+    checkpoint = job.load("extract")
+    if checkpoint:
+        combined_text = checkpoint["combined_text"]
+    else:
+        combined_text = call_with_retries("テキスト抽出", budget, _extract_stage, files, cleanup)
+        job.save("extract", {"combined_text": combined_text})
+
+    # 2. 対話生成
+    checkpoint = job.load("dialogue")
+    dialogue_lines = [DialogueLine(**line) for line in checkpoint["lines"]] if checkpoint else None
+
+    if dialogue_lines is None:
+        checkpoint = job.load("dialogue_source")
+        if checkpoint:
+            dialogue_source = checkpoint["text"]
+        else:
+            dialogue_source = _dialogue_source_stage(combined_text, dialogue_config, budget)
+            job.save("dialogue_source", {"text": dialogue_source})
+
+        if stream:
+            # 対話生成と音声生成を並行して実行し、完了した行のセグメントは保存される
+            streamed_lines: List[DialogueLine] = []
+
+            def collect_dialogue_lines():
+                for dialogue_line in stream_dialogue(dialogue_source, dialogue_config, edited_transcript, user_feedback):
+                    streamed_lines.append(dialogue_line)
+                    yield dialogue_line
+
+            try:
+                synthesize_segments(
+                    job, collect_dialogue_lines(), speaker_1_voice, speaker_2_voice, audio_model, api_key, budget,
+                    previous, on_segment
+                )
+                dialogue_lines = streamed_lines
+            except Exception as e:
+                logger.error(f"ストリーミング生成中にエラーが発生しました: {str(e)}")
+                if not classify_pipeline_error(e)[0] or not budget.consume("対話生成（ストリーミング）"):
+                    raise
+
+        if dialogue_lines is None:
+            dialogue_lines = call_with_retries(
+                "対話生成", budget, generate_dialogue, dialogue_source, dialogue_config, edited_transcript, user_feedback
+            )
+        job.save("dialogue", {"lines": [line.model_dump() for line in dialogue_lines]})
+
+    # 3. セグメントごとの音声生成（保存済みのセグメントと前回のエピソードから変更のないセグメントは再利用）
+    planned = list(plan_segments(dialogue_lines, speaker_1_voice, speaker_2_voice))
+    endpoint = os.getenv("TTS_API_BASE")
+    segment_keys = [make_segment_key(segment.text, segment.voice, audio_model, endpoint) for segment in planned]
+    if previous is not None:
+        logger.info(f"前回のエピソード {previous.job_id} との差分: {diff_segments(previous, segment_keys)}")
+    segment_files = synthesize_segments(
+        job, dialogue_lines, speaker_1_voice, speaker_2_voice, audio_model, api_key, budget, previous, on_segment
+    )
+
+    # 4. 結合
+    checkpoint = job.load("concat")
+    if not (checkpoint and checkpoint.get("segments") == segment_files and job.episode_path.exists()):
+        def concat() -> None:
+            tmp_path = _tmp_path(job.episode_path)
+            with SegmentEncoder(str(tmp_path), stream_copy=is_stream_copy_enabled()) as encoder:
+                for segment_file in segment_files:
+                    with open(segment_file, "rb") as f:
+                        encoder.write(f.read())
+            os.replace(tmp_path, job.episode_path)
+
+        call_with_retries("音声の結合", budget, concat)
+        job.save("concat", {"segments": segment_files})
+
+    logger.info(f"ジョブが完了しました: {job.job_id} (再試行 {budget.total - budget.remaining}回)")
+    audio_path = str(job.episode_path)
+    if store is not None and EPISODE_CACHE_ENABLED:
+        # 次回の同じ生成はパイプラインを実行せずに返す
+        cached_path = store.put_episode(
+            job.job_id, audio_path, [line.model_dump() for line in dialogue_lines], combined_text
+        )
+        if cached_path:
+            audio_path = cached_path
+
+    # 5. 対応表（次回の再生成では変更のあったセグメントだけを生成する）
+    manifest = build_manifest(job.job_id, planned, segment_keys, segment_files, audio_model, audio_path)
+    job.save("manifest", manifest.model_dump())
+    if lineage is not None:
+        store.put_manifest(lineage, manifest)
+    return audio_path, dialogue_lines, combined_text
+
+def cleanup_old_jobs(
+    max_age_days: float = PIPELINE_JOB_TTL_DAYS,
+    jobs_dir: str = PIPELINE_JOBS_DIR,
+    exclude: Optional[Set[str]] = None
+) -> int:
+    """保持期間を過ぎたジョブディレクトリを削除する（実行中のジョブは除く）
+
+    Args:
+        max_age_days (float, optional): 保持する最大日数. Defaults to PIPELINE_JOB_TTL_DAYS.
+        jobs_dir (str, optional): ジョブディレクトリ. Defaults to PIPELINE_JOBS_DIR.
+        exclude (Optional[Set[str]], optional): 削除しないジョブID（待機中のジョブなど）. Defaults to None.
+
+    Returns:
+        int: 削除されたジョブの数
+    """
+    removed_count = 0
+    root = Path(jobs_dir)
+    if not root.exists():
+        return removed_count
+    now = time.time()
+    active = active_job_ids() | (exclude or set())
+    for job_dir in root.iterdir():
+        try:
+            if job_dir.name in active:
+                continue
+            if job_dir.is_dir() and now - job_dir.stat().st_mtime > max_age_days * 24 * 60 * 60:
+                shutil.rmtree(job_dir)
+                removed_count += 1
+        except Exception as e:
+            logger.warning(f"ジョブの削除に失敗: {job_dir} - {str(e)}")
+    if removed_count:
+        logger.info(f"古いジョブを削除しました: {removed_count}件")
+    return removed_count
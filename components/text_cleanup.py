@@ -0,0 +1,266 @@
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from pydantic import BaseModel
+from .metrics import TEXT_CLEANUP_REMOVED_CHARS
+
+# 抽出したテキストから柱・ノンブル・ハイフネーションなどを除去してからLLMに渡す
+TEXT_CLEANUP_ENABLED = os.getenv("TEXT_CLEANUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# 柱・フッターとみなす行を探すページの先頭・末尾の行数
+TEXT_CLEANUP_MARGIN_LINES = int(os.getenv("TEXT_CLEANUP_MARGIN_LINES", "3"))
+# この割合以上のページ（かつTEXT_CLEANUP_MIN_PAGES以上）に現れる行を柱・フッターとして除去する
+TEXT_CLEANUP_REPEAT_RATIO = float(os.getenv("TEXT_CLEANUP_REPEAT_RATIO", "0.3"))
+TEXT_CLEANUP_MIN_PAGES = int(os.getenv("TEXT_CLEANUP_MIN_PAGES", "3"))
+# 参考文献・付録の見出しとみなす最小の位置（文書全体に対する割合。目次の見出しを除外する）
+TEXT_CLEANUP_SECTION_MIN_POSITION = float(os.getenv("TEXT_CLEANUP_SECTION_MIN_POSITION", "0.3"))
+
+# 除去できるセクション
+REFERENCES = "references"
+APPENDIX = "appendix"
+SECTION_CHOICES = [("参考文献", REFERENCES), ("付録", APPENDIX)]
+
+# 柱の先頭・末尾のページ番号（"12 Journal of ..." / "... Vol. 3 | 12"）
+_EDGE_PAGE_NUMBER = re.compile(r"^\d{1,4}(?=\s)|(?<=\s)\d{1,4}$")
+_SPACES = re.compile("[ \t\u3000\u00a0]+")
+# 行頭の字下げ（Markdownのリストやコードブロック）は残し、行中の空白の連続だけをまとめる
+_INTERIOR_SPACES = re.compile("(?<=[^ \t\u3000\u00a0\n])[ \t\u3000\u00a0]{2,}(?=[^ \t\u3000\u00a0\n])")
+_PAGE_NUMBER = re.compile(
+    r"^[-–—\s]*(?:(?:page|p\.)\s*)?\d{1,4}(?:\s*(?:/|of)\s*\d{1,4})?\s*(?:ページ|頁)?[-–—\s]*$",
+    re.IGNORECASE
+)
+_INVISIBLE = re.compile("[\u00ad\u200b\u200c\u200d\ufeff]")
+_HYPHENATION = re.compile(r"([A-Za-z])-\n[ \t]*([a-z])")
+_TRAILING_SPACES = re.compile(r"[ \t]+\n")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_SECTION_HEADINGS = {
+    REFERENCES: re.compile(
+        r"^[ \t]*(?:\d+\.?[ \t]*)?(?:references|bibliography|works cited|literature cited|参考文献|引用文献)[ \t]*:?[ \t]*$",
+        re.IGNORECASE | re.MULTILINE
+    ),
+    APPENDIX: re.compile(
+        # 「付録A」「付録１」は単語の境界（\b）がないため、続く文字で判定する
+        r"^[ \t]*(?:(?:appendix|appendices|supplementary (?:material|information))\b"
+        r"|(?:付録|補遺)(?=[A-ZＡ-Ｚ0-9０-９IVXⅠ-Ⅻ（(:：.．\s]|$)).{0,80}$",
+        re.IGNORECASE | re.MULTILINE
+    ),
+}
+
+class CleanupOptions(BaseModel):
+    """テキストのクリーンアップの設定"""
+    drop_references: bool = False
+    drop_appendix: bool = False
+
+    @classmethod
+    def from_sections(cls, sections: Optional[Iterable[str]]) -> "CleanupOptions":
+        """UIやジョブのパラメータ（除去するセクション名のリスト）から設定を作成する"""
+        sections = set(sections or [])
+        return cls(drop_references=REFERENCES in sections, drop_appendix=APPENDIX in sections)
+
+    def sections(self) -> List[str]:
+        """除去するセクション名"""
+        return [name for name, enabled in ((REFERENCES, self.drop_references), (APPENDIX, self.drop_appendix)) if enabled]
+
+class CleanupStats(BaseModel):
+    """クリーンアップで除去した内容の集計"""
+    original_chars: int = 0
+    cleaned_chars: int = 0
+    # 種類 -> 除去した文字数
+    removed_chars_by_kind: Dict[str, int] = {}
+    removed_tokens: int = 0
+
+    @property
+    def removed_chars(self) -> int:
+        return self.original_chars - self.cleaned_chars
+
+    def add(self, kind: str, chars: int) -> None:
+        if chars > 0:
+            self.removed_chars_by_kind[kind] = self.removed_chars_by_kind.get(kind, 0) + chars
+
+    def merge(self, other: "CleanupStats") -> None:
+        """別のファイルの集計を加算する"""
+        self.original_chars += other.original_chars
+        self.cleaned_chars += other.cleaned_chars
+        self.removed_tokens += other.removed_tokens
+        for kind, chars in other.removed_chars_by_kind.items():
+            self.add(kind, chars)
+
+def is_cleanup_enabled(options: Optional[CleanupOptions] = None) -> bool:
+    """クリーンアップを行うかどうか（無効の場合もセクションの除去を指定されていれば行う）"""
+    return TEXT_CLEANUP_ENABLED or bool(options and options.sections())
+
+def _line_key(line: str) -> str:
+    """ページ番号が異なる柱も同じ行とみなすため、先頭・末尾の数字と空白を正規化する"""
+    return _EDGE_PAGE_NUMBER.sub("#", _SPACES.sub(" ", line.strip())).lower()
+
+def find_repeated_lines(pages: List[List[str]]) -> set:
+    """複数のページの先頭・末尾に繰り返し現れる行（柱・フッター）を検出する
+
+    Args:
+        pages (List[List[str]]): ページごとの行
+
+    Returns:
+        set: 除去する行の正規化したキー
+    """
+    if len(pages) < TEXT_CLEANUP_MIN_PAGES:
+        return set()
+    margin = TEXT_CLEANUP_MARGIN_LINES
+    counts: Counter = Counter()
+    for lines in pages:
+        content = [line for line in lines if line.strip()]
+        # 1ページ内で同じ行が複数回あっても1回と数える
+        counts.update({_line_key(line) for line in content[:margin] + content[-margin:]})
+    threshold = max(TEXT_CLEANUP_MIN_PAGES, int(len(pages) * TEXT_CLEANUP_REPEAT_RATIO))
+    return {key for key, count in counts.items() if key and count >= threshold}
+
+def _strip_page_margins(lines: List[str], repeated: set, stats: CleanupStats, removed: List[str]) -> List[str]:
+    """ページの先頭・末尾にある柱・フッター・ページ番号の行を除去する"""
+    content_indexes = [i for i, line in enumerate(lines) if line.strip()]
+    margin = TEXT_CLEANUP_MARGIN_LINES
+    candidates = set(content_indexes[:margin] + content_indexes[-margin:])
+    kept = []
+    for i, line in enumerate(lines):
+        if i in candidates:
+            if _line_key(line) in repeated:
+                stats.add("repeated_lines", len(line) + 1)
+                removed.append(line)
+                continue
+            if _PAGE_NUMBER.match(line):
+                stats.add("page_numbers", len(line) + 1)
+                removed.append(line)
+                continue
+        kept.append(line)
+    return kept
+
+def _drop_sections(text: str, options: CleanupOptions, stats: CleanupStats, removed: List[str]) -> str:
+    """参考文献・付録のセクションを除去する
+
+    各セクションは見出しから、除去しない種類の次の見出し（なければ文書の末尾）までとする。
+    目次などに現れる見出しを除外するため、文書の前半の見出しは無視する。
+    """
+    requested = options.sections()
+    if not requested:
+        return text
+    min_position = int(len(text) * TEXT_CLEANUP_SECTION_MIN_POSITION)
+    headings = {
+        kind: [match.start() for match in pattern.finditer(text) if match.start() >= min_position]
+        for kind, pattern in _SECTION_HEADINGS.items()
+    }
+
+    spans: List[Tuple[int, int, str]] = []
+    for kind in requested:
+        if not headings[kind]:
+            continue
+        # 参考文献は末尾にまとめられるため最後の見出し、付録は最初の見出しから除去する
+        start = headings[kind][-1] if kind == REFERENCES else headings[kind][0]
+        following = [
+            position for other, positions in headings.items() if other not in requested
+            for position in positions if position > start
+        ]
+        spans.append((start, min(following, default=len(text)), kind))
+    if not spans:
+        return text
+
+    parts = []
+    position = 0
+    for start, end, kind in sorted(spans):
+        start = max(start, position)
+        if start >= end:
+            continue
+        parts.append(text[position:start])
+        stats.add(kind, end - start)
+        removed.append(text[start:end])
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+def _normalize_whitespace(text: str, stats: CleanupStats, from_pdf: bool) -> str:
+    """不可視文字と行末の空白・余分な空行を除去する
+
+    PDFから抽出したテキストでは、さらに行末で分割された英単語をつなぎ、行中の空白の連続をまとめる。
+    テキストファイルの改行やハイフン（"state-\nof-the-art"）は書かれたとおりに残す。
+    """
+    before = len(text)
+    text = _INVISIBLE.sub("", text)
+    if from_pdf:
+        text = _HYPHENATION.sub(r"\1\2", text)
+    stats.add("hyphenation", before - len(text))
+    before = len(text)
+    if from_pdf:
+        text = _INTERIOR_SPACES.sub(" ", text)
+    text = _TRAILING_SPACES.sub("\n", text)
+    text = _BLANK_LINES.sub("\n\n", text)
+    stats.add("whitespace", before - len(text))
+    return text
+
+def clean_pages(
+    pages: List[str],
+    options: Optional[CleanupOptions] = None,
+    from_pdf: bool = True
+) -> Tuple[List[str], CleanupStats]:
+    """1つの文書のページごとのテキストから繰り返しの柱・フッター・ページ番号などを除去する
+
+    テキストファイル（from_pdf=False）では不可視文字と空白・空行の整形と、指定されたセクションの除去だけを行う。
+
+    Args:
+        pages (List[str]): ページごとのテキスト
+        options (Optional[CleanupOptions], optional): 除去するセクションの設定. Defaults to None.
+        from_pdf (bool, optional): PDFから抽出したテキストの場合はTrue（柱・フッター・ページ番号の除去と、
+            ハイフネーションと行中の空白の整形も行う）. Defaults to True.
+
+    Returns:
+        Tuple[List[str], CleanupStats]: (クリーンアップしたページ, 除去した内容の集計)
+    """
+    options = options or CleanupOptions()
+    stats = CleanupStats(original_chars=sum(len(page) for page in pages))
+    removed: List[str] = []
+
+    # テキストファイルでは先頭の行の字下げを残すため、前後の空行だけを除く
+    strip = str.strip if from_pdf else lambda page: page.strip("\n")
+    page_lines = [page.splitlines() for page in pages]
+    if from_pdf:
+        # 柱・フッター・ページ番号はPDFのページレイアウトによるもの（テキストファイルの数字だけの行は本文として残す）
+        repeated = find_repeated_lines(page_lines)
+        page_lines = [_strip_page_margins(lines, repeated, stats, removed) for lines in page_lines]
+    cleaned = [strip(_normalize_whitespace("\n".join(lines), stats, from_pdf)) for lines in page_lines]
+
+    if options.sections():
+        # セクションはページをまたぐため、ページの区切りを保ったまま文書全体で除去する
+        separator = "\f"
+        document = _drop_sections(separator.join(cleaned), options, stats, removed)
+        cleaned = [strip(page) for page in document.split(separator)]
+
+    stats.cleaned_chars = sum(len(page) for page in cleaned)
+    stats.add("whitespace", stats.removed_chars - sum(stats.removed_chars_by_kind.values()))
+    if removed:
+        # tiktokenの読み込みが重いため、除去した場合だけ読み込む
+        from .dialogue_chunking import estimate_tokens
+        stats.removed_tokens = estimate_tokens("\n".join(removed))
+    return cleaned, stats
+
+def clean_text(text: str, options: Optional[CleanupOptions] = None) -> Tuple[str, CleanupStats]:
+    """テキストファイル1つ分をクリーンアップする（改ページ文字があればページとして扱う）
+
+    Args:
+        text (str): テキスト
+        options (Optional[CleanupOptions], optional): 除去するセクションの設定. Defaults to None.
+
+    Returns:
+        Tuple[str, CleanupStats]: (クリーンアップしたテキスト, 除去した内容の集計)
+    """
+    pages, stats = clean_pages(text.split("\f"), options, from_pdf=False)
+    return "\n\n".join(page for page in pages if page), stats
+
+def report_cleanup(stats: CleanupStats) -> None:
+    """除去した文字数と推定トークン数をログとメトリクスに記録する"""
+    if not stats.original_chars:
+        return
+    for kind, chars in stats.removed_chars_by_kind.items():
+        TEXT_CLEANUP_REMOVED_CHARS.labels(kind).inc(chars)
+    breakdown = ", ".join(f"{kind} {chars}" for kind, chars in sorted(stats.removed_chars_by_kind.items()))
+    logger.info(
+        f"テキストのクリーンアップ: {stats.original_chars} -> {stats.cleaned_chars} 文字 | "
+        f"除去 {stats.removed_chars} 文字 ({stats.removed_chars / stats.original_chars:.1%}) | "
+        f"推定 約{stats.removed_tokens} トークン削減 | 内訳: {breakdown or 'なし'}"
+    )
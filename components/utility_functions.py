@@ -14,11 +14,12 @@ def read_readme():
 
 # Function to update instruction fields based on template selection
 def update_instructions(template):
-    from components.instruction_templates import INSTRUCTION_TEMPLATES
+    from components.instruction_templates import get_template
+    prompts = get_template(template)
     return (
-        INSTRUCTION_TEMPLATES[template]["intro"],
-        INSTRUCTION_TEMPLATES[template]["text_instructions"],
-        INSTRUCTION_TEMPLATES[template]["scratch_pad"],
-        INSTRUCTION_TEMPLATES[template]["prelude"],
-        INSTRUCTION_TEMPLATES[template]["dialog"]
+        prompts["intro"],
+        prompts["text_instructions"],
+        prompts["scratch_pad"],
+        prompts["prelude"],
+        prompts["dialog"]
            )
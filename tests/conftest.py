@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# リポジトリのルートからcomponentsを読み込めるようにする
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,61 @@
+import os
+import threading
+from components import artifact_store, jobs, pipeline
+from components.artifact_store import ArtifactStore
+
+def make_entry(root, name, size, mtime):
+    entry = root / name
+    entry.mkdir(parents=True)
+    (entry / "episode.mp3").write_bytes(b"x" * size)
+    os.utime(entry, (mtime, mtime))
+    return entry
+
+def test_enforce_quota_evicts_least_recently_used(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"), max_bytes=250)
+    jobs_dir = tmp_path / "jobs"
+    oldest = make_entry(store.episodes_dir, "episode-old", 100, 1000)
+    active = make_entry(jobs_dir, "job-active", 100, 2000)
+    older = make_entry(jobs_dir, "job-older", 100, 3000)
+    newest = make_entry(store.episodes_dir, "episode-new", 100, 4000)
+
+    removed, total = store.enforce_quota(extra_roots=[jobs_dir], exclude={"job-active"})
+
+    assert removed == 2
+    assert total == 200
+    assert not oldest.exists() and not older.exists()
+    assert active.exists() and newest.exists()
+
+def test_enforce_quota_keeps_entries_under_limit(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"), max_bytes=1000)
+    entry = make_entry(store.episodes_dir, "episode", 100, 1000)
+
+    assert store.enforce_quota() == (0, 100)
+    assert entry.exists()
+
+def test_start_artifact_janitor_sweeps_on_start(tmp_path, monkeypatch):
+    swept = threading.Event()
+    monkeypatch.setattr(artifact_store, "_store", None)
+    monkeypatch.setattr(artifact_store, "_sweep", lambda store: swept.set())
+    monkeypatch.setattr(ArtifactStore.__init__, "__defaults__", (str(tmp_path / "artifacts"), 1000))
+
+    store = artifact_store.start_artifact_janitor()
+
+    assert swept.wait(5)
+    assert store is artifact_store.get_artifact_store()
+    assert store.dir == tmp_path / "artifacts"
+
+def test_sweep_keeps_queued_jobs_of_other_processes(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path / "artifacts"), max_bytes=150)
+    jobs_dir = tmp_path / "jobs"
+    queued = make_entry(jobs_dir, "job-queued", 100, 1000)
+    expired = make_entry(jobs_dir, "job-expired", 100, 1000)
+    job_store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_store.enqueue("job-queued", {})
+    monkeypatch.setattr(pipeline, "PIPELINE_JOBS_DIR", str(jobs_dir))
+    monkeypatch.setattr(jobs.unfinished_job_ids, "__defaults__", (job_store.db_path,))
+
+    artifact_store._sweep(store)
+
+    # 待機中のジョブは保持期間を過ぎていても、容量の上限を超えていても削除しない
+    assert queued.exists()
+    assert not expired.exists()
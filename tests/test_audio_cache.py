@@ -0,0 +1,54 @@
+import os
+from components.audio.audio_cache import SegmentCache, make_segment_key
+
+def test_segment_key_normalizes_text_and_separates_settings():
+    key = make_segment_key("こんにちは、 世界。", "alloy", "tts-1", None)
+
+    # 全角英数字と連続する空白の違いは同じキーになる
+    assert make_segment_key(" こんにちは、\n世界。 ", "alloy", "tts-1", "") == key
+    assert make_segment_key("ＡＢＣ", "alloy", "tts-1", None) == make_segment_key("ABC", "alloy", "tts-1", None)
+    assert make_segment_key("こんにちは、世界。", "alloy", "tts-1", None) != key
+    assert make_segment_key("こんにちは、 世界。", "echo", "tts-1", None) != key
+    assert make_segment_key("こんにちは、 世界。", "alloy", "tts-1-hd", None) != key
+    assert make_segment_key("こんにちは、 世界。", "alloy", "tts-1", "https://tts.example.com/v1") != key
+
+def test_least_recently_used_segments_are_evicted(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert cache.get("a") == b"a" * 100
+
+    cache.put("c", b"c" * 100)
+
+    # 最後に参照されていない"b"が削除される
+    assert cache.get("b") is None
+    assert not os.path.exists(tmp_path / "b.mp3")
+    assert cache.get("a") == b"a" * 100
+    assert cache.get("c") == b"c" * 100
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 200
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+def test_segments_larger_than_the_cache_are_not_stored(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_bytes=100)
+    cache.put("a", b"a" * 50)
+
+    cache.put("large", b"x" * 101)
+
+    assert cache.get("large") is None
+    assert cache.get("a") == b"a" * 50
+
+def test_index_is_restored_in_access_order(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_bytes=250)
+    for key in ["a", "b"]:
+        cache.put(key, key.encode() * 100)
+    os.utime(tmp_path / "a.mp3", (1000, 1000))
+    os.utime(tmp_path / "b.mp3", (2000, 2000))
+
+    restored = SegmentCache(str(tmp_path), max_bytes=250)
+    restored.put("c", b"c" * 100)
+
+    assert restored.stats()["bytes"] == 200
+    assert restored.get("a") is None
+    assert restored.get("b") == b"b" * 100
@@ -0,0 +1,107 @@
+import time
+import httpx
+import openai
+import pytest
+from components.audio import audio_concurrency
+from components.audio.audio_concurrency import AdaptiveConcurrencyController
+
+def api_error(error_class, status_code: int, headers=None):
+    request = httpx.Request("POST", "https://api.example.com/v1/audio/speech")
+    response = httpx.Response(status_code, request=request, headers=headers)
+    return error_class("error", response=response, body=None)
+
+@pytest.fixture
+def controller(monkeypatch):
+    # 再試行前の待機をなくす
+    monkeypatch.setattr(audio_concurrency, "TTS_BACKOFF_SECONDS", 0)
+    return AdaptiveConcurrencyController("test", initial=4, min_limit=1, max_limit=8, latency_target=1.0)
+
+def test_fast_successes_grow_the_window_additively(controller):
+    for _ in range(4):
+        controller.acquire()
+        controller.release(0.1)
+
+    # 1リクエストごとに 1/limit ずつ増え、4回でおよそ1増える
+    assert 4.9 < controller.limit < 5.0
+    assert controller.successes == 4
+    assert controller.in_flight == 0
+
+def test_window_is_capped_at_max_limit(controller):
+    for _ in range(200):
+        controller.acquire()
+        controller.release(0.1)
+
+    assert controller.limit == 8
+
+def test_throttling_halves_the_window(controller):
+    controller.acquire()
+    controller.release(0.1, throttled=True)
+    assert controller.limit == 2
+
+    for _ in range(3):
+        controller.acquire()
+        controller.release(0.1, throttled=True)
+    assert controller.limit == 1
+    assert controller.throttled == 4
+
+def test_slow_responses_shrink_the_window(controller):
+    controller.acquire()
+    controller.release(5.0)
+
+    assert controller.limit == pytest.approx(3.6)
+    assert controller.successes == 0
+
+def test_retry_after_blocks_new_requests(controller):
+    controller.acquire()
+    controller.release(0.1, throttled=True, retry_after=0.2)
+
+    started = time.monotonic()
+    controller.acquire()
+    assert time.monotonic() - started >= 0.15
+    controller.release(0.1)
+
+def test_acquire_waits_for_a_free_slot(controller):
+    controller.limit = 1
+    controller.acquire()
+    assert controller._try_acquire_locked() > 0
+
+    controller.release(0.1)
+    assert controller._try_acquire_locked() == 0
+
+class Failing:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return b"mp3"
+
+def test_run_retries_throttled_requests_and_shrinks_the_window(controller):
+    fn = Failing(api_error(openai.RateLimitError, 429, headers={"retry-after": "0"}))
+
+    assert controller.run(fn) == b"mp3"
+    assert fn.calls == 2
+    assert controller.throttled == 1
+    assert controller.limit == pytest.approx(2.5)
+
+def test_run_does_not_retry_permanent_errors(controller):
+    fn = Failing(api_error(openai.BadRequestError, 400))
+
+    with pytest.raises(openai.BadRequestError):
+        controller.run(fn)
+    assert fn.calls == 1
+    # 429/5xx以外の失敗では同時実行数を縮小しない
+    assert controller.limit == 4
+    assert controller.in_flight == 0
+
+def test_run_retries_only_within_the_job_budget(controller):
+    fn = Failing(*[api_error(openai.InternalServerError, 500, headers={"retry-after": "0"})] * 5)
+    allowed = [True, False]
+
+    with pytest.raises(openai.InternalServerError):
+        controller.run(fn, allow_retry=lambda: allowed.pop(0))
+    assert fn.calls == 2
+    assert controller.in_flight == 0
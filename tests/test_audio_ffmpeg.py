@@ -0,0 +1,83 @@
+import shutil
+import subprocess
+import pytest
+from components.audio.audio_ffmpeg import SegmentEncoder, normalize_segment
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegがインストールされていません")
+
+def make_mp3(seconds: float, frequency: int = 440) -> bytes:
+    """TTSの出力の代わりに正弦波のMP3を作成する"""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}",
+            "-ar", "44100", "-f", "mp3", "pipe:1"
+        ],
+        check=True, capture_output=True
+    )
+    return result.stdout
+
+def decoded_seconds(path) -> float:
+    """デコードしたPCMの長さから再生時間を求める"""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", str(path), "-f", "s16le", "-ac", "1", "-ar", "8000", "pipe:1"],
+        check=True, capture_output=True
+    )
+    return len(result.stdout) / 2 / 8000
+
+def stream_info(path) -> str:
+    """ffmpegが表示する音声ストリームの情報（例: "mp3, 24000 Hz, mono, fltp, 128 kb/s"）"""
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-i", str(path)], capture_output=True, text=True)
+    return next(line for line in result.stderr.splitlines() if "Audio:" in line)
+
+@pytest.fixture(scope="module")
+def segments():
+    return [make_mp3(1.0, 440), make_mp3(0.5, 880)]
+
+def test_reencode_joins_segments_in_order(tmp_path, segments):
+    output_file = tmp_path / "episode.mp3"
+
+    with SegmentEncoder(str(output_file)) as encoder:
+        for segment in segments:
+            encoder.write(segment)
+
+    assert encoder.segments == 2
+    assert decoded_seconds(output_file) == pytest.approx(1.5, abs=0.1)
+
+def test_stream_copy_concatenates_normalized_frames(tmp_path, segments):
+    output_file = tmp_path / "episode.mp3"
+    normalized = [normalize_segment(segment) for segment in segments]
+
+    with SegmentEncoder(str(output_file), stream_copy=True) as encoder:
+        for segment in normalized:
+            encoder.write(segment)
+
+    # 再エンコードせず、揃えたMP3フレームをそのまま連結する
+    assert output_file.read_bytes() == b"".join(normalized)
+    assert "24000 Hz, mono" in stream_info(output_file)
+    # 各セグメントのエンコーダーの遅延とパディングもそのまま残る
+    expected = 0.0
+    for i, segment in enumerate(normalized):
+        segment_file = tmp_path / f"{i}.mp3"
+        segment_file.write_bytes(segment)
+        expected += decoded_seconds(segment_file)
+    assert decoded_seconds(output_file) == pytest.approx(expected, abs=0.01)
+
+@pytest.mark.parametrize("stream_copy", [False, True])
+def test_abort_removes_the_partial_output(tmp_path, segments, stream_copy):
+    output_file = tmp_path / "episode.mp3"
+
+    with pytest.raises(RuntimeError):
+        with SegmentEncoder(str(output_file), stream_copy=stream_copy) as encoder:
+            encoder.write(segments[0])
+            raise RuntimeError("セグメントの生成に失敗しました")
+
+    assert not output_file.exists()
+
+def test_invalid_input_raises_an_encoder_error(tmp_path):
+    output_file = tmp_path / "episode.mp3"
+    encoder = SegmentEncoder(str(output_file))
+    encoder.write(b"not an mp3 stream" * 100)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        encoder.close()
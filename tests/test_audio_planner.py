@@ -0,0 +1,65 @@
+from components.audio.audio_planner import longest_first, plan_segments, split_text_for_tts
+from components.data_models import DialogueItem
+
+def line(speaker, text):
+    return DialogueItem(speaker=speaker, text=text)
+
+def test_consecutive_lines_of_the_same_speaker_are_merged():
+    transcript = [
+        line("ホスト", "こんにちは。"),
+        line("ホスト", "今日のテーマです。"),
+        line("ゲスト", "よろしくお願いします。"),
+        line("ホスト", "まず一つ目。"),
+    ]
+
+    segments = list(plan_segments(transcript, "alloy", "echo", max_chars=100, merge_chars=100))
+
+    assert [(s.speaker, s.voice, s.text) for s in segments] == [
+        ("ホスト", "alloy", "こんにちは。\n今日のテーマです。"),
+        ("ゲスト", "echo", "よろしくお願いします。"),
+        ("ホスト", "alloy", "まず一つ目。"),
+    ]
+    assert [(s.first_line, s.last_line) for s in segments] == [(0, 1), (2, 2), (3, 3)]
+    assert [s.index for s in segments] == [0, 1, 2]
+
+def test_merging_stops_at_merge_chars():
+    transcript = [line("ホスト", "あ" * 6), line("ホスト", "い" * 6), line("ホスト", "う" * 6)]
+
+    segments = list(plan_segments(transcript, "alloy", "echo", max_chars=100, merge_chars=14))
+
+    assert [s.text for s in segments] == ["あ" * 6 + "\n" + "い" * 6, "う" * 6]
+    assert [(s.first_line, s.last_line) for s in segments] == [(0, 1), (2, 2)]
+
+def test_long_lines_are_split_at_sentence_ends():
+    text = "一文目です。二文目です。三文目です。"
+
+    segments = list(plan_segments([line("ゲスト", text)], "alloy", "echo", max_chars=12, merge_chars=0))
+
+    assert [s.text for s in segments] == ["一文目です。二文目です。", "三文目です。"]
+    assert all(s.first_line == s.last_line == 0 for s in segments)
+    assert [s.index for s in segments] == [0, 1]
+
+def test_sentences_over_the_limit_are_split_at_clauses_and_characters():
+    assert split_text_for_tts("短い、" + "長" * 10, max_chars=4) == ["短い、", "長長長長", "長長長長", "長長"]
+    assert split_text_for_tts("そのまま。", max_chars=10) == ["そのまま。"]
+
+def test_segments_are_planned_from_a_generator():
+    def transcript():
+        yield line("ホスト", "ホスト: 話者名付きの行。")
+        yield line("ゲスト", "   ")
+        yield line("ゲスト", "ゲストの行。")
+
+    segments = list(plan_segments(transcript(), "alloy", "echo"))
+
+    # 話者名は読み上げず、空の行は飛ばす
+    assert [s.text for s in segments] == ["話者名付きの行。", "ゲストの行。"]
+    assert [(s.first_line, s.last_line) for s in segments] == [(0, 0), (2, 2)]
+
+def test_longest_first_orders_by_length_and_keeps_indexes():
+    transcript = [line("ホスト", "短い。"), line("ゲスト", "とても長い行です。"), line("ホスト", "中くらい。")]
+    segments = list(plan_segments(transcript, "alloy", "echo"))
+
+    ordered = longest_first(segments)
+
+    assert [s.index for s in ordered] == [1, 2, 0]
+    assert longest_first([]) == []
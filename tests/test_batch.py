@@ -0,0 +1,80 @@
+import argparse
+import functools
+import json
+import pytest
+from components import batch
+from components.pipeline import PipelineJob
+
+@pytest.fixture
+def converted(monkeypatch, tmp_path):
+    """変換を記録し、音声とトランスクリプトの代わりに空のファイルを作成する"""
+    calls = []
+
+    def convert_document(document, job_id, output_name, output_dir, dialogue_config, args):
+        calls.append({"document": document.name, "job_id": job_id, "bypass_cache": dialogue_config.bypass_cache})
+        if document.name.startswith("broken"):
+            raise ValueError("変換に失敗しました")
+        audio_output = output_dir / f"{output_name}.mp3"
+        audio_output.write_bytes(b"mp3")
+        return {"status": "done", "audio": str(audio_output), "seconds": 0.0}
+
+    monkeypatch.setattr(batch, "convert_document", convert_document)
+    monkeypatch.setattr(batch, "PipelineJob", functools.partial(PipelineJob, jobs_dir=str(tmp_path / "jobs")))
+    return calls
+
+@pytest.fixture
+def docs(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("文書A", encoding="utf-8")
+    (docs / "b.md").write_text("文書B", encoding="utf-8")
+    return docs
+
+def make_args(source, output_dir, force=False) -> argparse.Namespace:
+    return argparse.Namespace(
+        source=str(source), output_dir=str(output_dir), template="podcast", text_model="test-model",
+        audio_model="tts-1", host_voice="alloy", guest_voice="echo", jobs=1, recursive=False,
+        force=force, strip_sections=[]
+    )
+
+def test_completed_documents_are_skipped(converted, docs, tmp_path):
+    output_dir = tmp_path / "output"
+
+    assert batch.run_batch(make_args(docs, output_dir)) == 0
+    assert sorted(call["document"] for call in converted) == ["a.txt", "b.md"]
+
+    converted.clear()
+    assert batch.run_batch(make_args(docs, output_dir)) == 0
+    assert converted == []
+
+    # 内容が変わった文書と音声が削除された文書だけを再変換する
+    (docs / "a.txt").write_text("文書A（改訂版）", encoding="utf-8")
+    (output_dir / "b.mp3").unlink()
+    assert batch.run_batch(make_args(docs, output_dir)) == 0
+    assert sorted(call["document"] for call in converted) == ["a.txt", "b.md"]
+
+def test_failed_documents_are_resumed(converted, docs, tmp_path):
+    output_dir = tmp_path / "output"
+    (docs / "broken.txt").write_text("壊れた文書", encoding="utf-8")
+
+    assert batch.run_batch(make_args(docs, output_dir)) == 1
+    results = json.loads((output_dir / batch.RESULTS_FILE).read_text(encoding="utf-8"))
+    assert results[str(docs / "broken.txt")]["status"] == "failed"
+    failed_job_id = results[str(docs / "broken.txt")]["job_id"]
+
+    converted.clear()
+    assert batch.run_batch(make_args(docs, output_dir)) == 1
+    # 同じジョブとして再実行され、完了済みのステージから再開される
+    assert converted == [{"document": "broken.txt", "job_id": failed_job_id, "bypass_cache": False}]
+
+def test_force_regenerates_as_a_fresh_job(converted, docs, tmp_path):
+    output_dir = tmp_path / "output"
+    batch.run_batch(make_args(docs, output_dir))
+    job_ids = {call["document"]: call["job_id"] for call in converted}
+
+    converted.clear()
+    assert batch.run_batch(make_args(docs, output_dir, force=True)) == 0
+
+    assert sorted(call["document"] for call in converted) == ["a.txt", "b.md"]
+    assert all(call["bypass_cache"] for call in converted)
+    assert all(call["job_id"] != job_ids[call["document"]] for call in converted)
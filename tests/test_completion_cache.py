@@ -0,0 +1,74 @@
+import os
+from components import dialogue_generation
+from components.completion_cache import CompletionCache, make_completion_key
+from components.dialogue_generation import DialogueConfig, lookup_completion
+
+MESSAGES = [{"role": "user", "content": "要約してください"}]
+
+def make_config(bypass_cache=False) -> DialogueConfig:
+    return DialogueConfig(
+        model_name="test-model", template_type="podcast", intro_instructions="", text_instructions="",
+        scratch_pad_instructions="", prelude_dialog="", podcast_dialog_instructions="", bypass_cache=bypass_cache
+    )
+
+def test_completion_key_covers_every_request_setting():
+    key = make_completion_key("test-model", MESSAGES, 0.7, 100, None)
+
+    assert make_completion_key("test-model", MESSAGES, 0.7, 100, "") == key
+    assert make_completion_key("other-model", MESSAGES, 0.7, 100, None) != key
+    assert make_completion_key("test-model", [{"role": "user", "content": "翻訳してください"}], 0.7, 100, None) != key
+    assert make_completion_key("test-model", MESSAGES, 0.3, 100, None) != key
+    assert make_completion_key("test-model", MESSAGES, 0.7, 200, None) != key
+    assert make_completion_key("test-model", MESSAGES, 0.7, 100, "https://llm.example.com/v1") != key
+
+def test_completions_are_stored_and_restored(tmp_path):
+    cache = CompletionCache(str(tmp_path))
+    cache.put("key", "応答", prompt_tokens=10, completion_tokens=5)
+
+    cached = CompletionCache(str(tmp_path)).get("key")
+
+    assert (cached.content, cached.prompt_tokens, cached.completion_tokens) == ("応答", 10, 5)
+    assert cache.get("missing") is None
+
+def test_expired_completions_are_removed(tmp_path, monkeypatch):
+    cache = CompletionCache(str(tmp_path), ttl_seconds=60)
+    cache.put("key", "応答")
+    created_at = cache.get("key").created_at
+
+    monkeypatch.setattr("components.completion_cache.time.time", lambda: created_at + 61)
+
+    assert cache.get("key") is None
+    assert not os.path.exists(tmp_path / "key.json")
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_completions_are_evicted(tmp_path):
+    cache = CompletionCache(str(tmp_path))
+    cache.put("a", "あ" * 10)
+    size = cache.stats()["bytes"]
+    # 応答2件分（作成日時の桁数の違いを許容する）
+    cache.max_bytes = size * 2 + 10
+    cache.put("b", "い" * 10)
+    assert cache.get("a") is not None
+
+    cache.put("c", "う" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+def test_bypass_cache_skips_the_lookup_but_keeps_the_key(tmp_path, monkeypatch):
+    cache = CompletionCache(str(tmp_path))
+    monkeypatch.setattr(dialogue_generation, "get_completion_cache", lambda: cache)
+    _, key, cached = lookup_completion(make_config(), MESSAGES, 0.7, 100)
+    assert cached is None
+    cache.put(key, "応答")
+
+    assert lookup_completion(make_config(), MESSAGES, 0.7, 100)[2].content == "応答"
+    # 再生成では保存済みの応答を使わず、新しい応答で上書きできるようにキーだけ返す
+    bypass_cache, bypass_key, bypass_cached = lookup_completion(make_config(bypass_cache=True), MESSAGES, 0.7, 100)
+    assert (bypass_cache, bypass_key, bypass_cached) == (cache, key, None)
+
+def test_lookup_is_skipped_when_the_cache_is_disabled(monkeypatch):
+    monkeypatch.setattr(dialogue_generation, "get_completion_cache", lambda: None)
+
+    assert lookup_completion(make_config(), MESSAGES, 0.7, 100) == (None, None, None)
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+import pytest
+from components import dialogue_generation
+from components.dialogue_generation import DialogueConfig, generate_dialogue
+from components.dialogue_parsing import DialogueStreamParser, needs_repair
+
+DOCUMENT = "入力文書の本文です。"
+
+class FakeCompletions:
+    """順に応答を返し、受け取ったリクエストを記録するクライアント"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        content, finish_reason = self.replies.pop(0)
+        choice = SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)
+        return SimpleNamespace(choices=[choice], usage=None)
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    def install(*replies):
+        completions = FakeCompletions(replies)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        monkeypatch.setattr(dialogue_generation, "get_llm_client", lambda base_url=None: client)
+        monkeypatch.setattr(dialogue_generation, "save_debug_info", lambda data, prefix="debug": None)
+        monkeypatch.setattr(dialogue_generation, "get_completion_cache", lambda: None)
+        return completions
+    return install
+
+def make_config() -> DialogueConfig:
+    return DialogueConfig(
+        model_name="test-model",
+        template_type="podcast",
+        intro_instructions="",
+        text_instructions="",
+        scratch_pad_instructions="",
+        prelude_dialog="",
+        podcast_dialog_instructions=""
+    )
+
+@pytest.mark.parametrize("reply", ["", "申し訳ありませんが、このリクエストにはお応えできません。"])
+def test_reply_without_valid_lines_is_not_repaired(fake_llm, reply):
+    completions = fake_llm((reply, "stop"))
+
+    with pytest.raises(ValueError):
+        generate_dialogue(DOCUMENT, make_config())
+
+    assert len(completions.requests) == 1
+
+def test_truncated_last_line_is_continued_with_document_context(fake_llm):
+    completions = fake_llm(
+        ("ホスト: こんにちは。\nゲスト: よろしくお願いします。\nホスト: 今日は", "length"),
+        ("ゲスト: よろしくお願いします。\nホスト: 今日の話題です。\nゲスト: ありがとうございました。", "stop"),
+    )
+
+    lines = generate_dialogue(DOCUMENT, make_config())
+
+    assert [line.text for line in lines] == [
+        "こんにちは。", "よろしくお願いします。", "今日の話題です。", "ありがとうございました。"
+    ]
+    assert len(completions.requests) == 2
+    first, repair = (request["messages"] for request in completions.requests)
+    assert repair[:len(first)] == first
+    assert DOCUMENT in repair[1]["content"]
+
+def test_length_cutoff_at_line_boundary_is_not_repaired(fake_llm):
+    completions = fake_llm(("ホスト: こんにちは。\nゲスト: よろしくお願いします。\n", "length"))
+
+    lines = generate_dialogue(DOCUMENT, make_config())
+
+    assert len(lines) == 2
+    assert len(completions.requests) == 1
+
+def test_needs_repair_for_unclosed_json_array():
+    parser = DialogueStreamParser("json")
+    parser.feed('{"scratchpad": "", "dialogue": [{"speaker": "ホスト", "text": "こんにちは。"}, {"speaker": "ゲ')
+    parser.close(truncated=True)
+
+    assert len(parser.items) == 1
+    assert needs_repair(parser)
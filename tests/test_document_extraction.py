@@ -0,0 +1,30 @@
+from components import document_extraction
+from components.document_extraction import iter_text_chunks, read_text_file
+
+def test_iter_text_chunks_with_unaligned_chunk_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_extraction, "TEXT_MMAP_THRESHOLD_BYTES", 1000)
+    text = "ポッドキャストの原稿です。Podcast script.\n" * 2000
+    path = tmp_path / "large.txt"
+    path.write_text(text, encoding="utf-8")
+
+    chunks = list(iter_text_chunks(path, "utf-8", chunk_bytes=1000))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+
+def test_read_text_file_with_unaligned_chunk_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_extraction, "TEXT_MMAP_THRESHOLD_BYTES", 1000)
+    monkeypatch.setattr(document_extraction.iter_text_chunks, "__defaults__", (1000,))
+    text = "シフトJISのテキストです。\n" * 500
+    path = tmp_path / "large.md"
+    path.write_bytes(text.encode("shift-jis"))
+
+    assert read_text_file(path) == text
+
+def test_read_text_file_falls_back_after_a_late_decode_error(tmp_path):
+    # 判定に使う先頭はASCIIのみのためUTF-8と判定され、後半のShift_JISで読み込み直す
+    text = "a" * document_extraction.TEXT_ENCODING_SAMPLE_BYTES + "シフトJISのテキストです。"
+    path = tmp_path / "late.txt"
+    path.write_bytes(text.encode("shift-jis"))
+
+    assert read_text_file(path) == text
@@ -0,0 +1,93 @@
+import asyncio
+import functools
+from components import feedback_processing
+from components.dialogue_generation import DialogueLine
+from components.pipeline import PipelineInputError, PipelineJob
+
+UI_ARGS = [
+    ["doc.pdf"], "test-model", "tts-1", "alloy", "echo",
+    "podcast", "sk-llm", None, "https://llm.example.com/v1", "sk-tts", None,
+    "intro", "text", "scratch", "prelude", "dialog",
+]
+
+def test_build_configs_excludes_api_keys_from_settings():
+    config, dialogue_config, settings = feedback_processing._build_configs(*UI_ARGS, False, ["references"])
+
+    assert config.llm_api_key == "sk-llm"
+    assert dialogue_config.model_name == "test-model"
+    assert dialogue_config.api_base == "https://llm.example.com/v1"
+    assert not dialogue_config.bypass_cache
+    assert settings["strip_sections"] == ["references"]
+    assert not {"files", "llm_api_key", "tts_api_key", "fresh_sample"} & settings.keys()
+    # 同じ入力からは同じ設定（同じジョブID）になる
+    assert feedback_processing._build_configs(*UI_ARGS)[2] == dict(settings, strip_sections=[])
+
+def test_build_configs_fresh_sample_makes_a_new_job():
+    _, dialogue_config, settings = feedback_processing._build_configs(*UI_ARGS, True)
+    _, _, other_settings = feedback_processing._build_configs(*UI_ARGS, True)
+
+    assert dialogue_config.bypass_cache
+    assert settings["fresh_sample"] != other_settings["fresh_sample"]
+
+def test_async_handler_runs_the_checkpointed_pipeline(monkeypatch, tmp_path):
+    calls = []
+
+    def run_pipeline(job, files, dialogue_config, **kwargs):
+        calls.append(job.job_id)
+        return "episode.mp3", [DialogueLine(speaker="ホスト", text="こんにちは。")], "本文"
+
+    monkeypatch.setattr(feedback_processing, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(feedback_processing, "PipelineJob", functools.partial(PipelineJob, jobs_dir=str(tmp_path)))
+
+    result = asyncio.run(feedback_processing.process_feedback_and_regenerate_async(*UI_ARGS, None, None))
+    asyncio.run(feedback_processing.process_feedback_and_regenerate_async(*UI_ARGS, None, None))
+
+    assert result == ("episode.mp3", "ホスト: こんにちは。", "本文", None)
+    # 同じ入力は同じジョブとして再開される
+    assert len(calls) == 2 and calls[0] == calls[1]
+
+def test_async_handler_reports_input_errors(monkeypatch, tmp_path):
+    def run_pipeline(job, files, dialogue_config, **kwargs):
+        raise PipelineInputError("ファイルが読み込めません")
+
+    monkeypatch.setattr(feedback_processing, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(feedback_processing, "PipelineJob", functools.partial(PipelineJob, jobs_dir=str(tmp_path)))
+
+    result = asyncio.run(feedback_processing.process_feedback_and_regenerate_async(*UI_ARGS, None, None))
+
+    assert result == (None, None, None, "ファイルが読み込めません")
+
+def test_stream_handler_sends_each_segment_once_in_order(monkeypatch, tmp_path):
+    segment_files = []
+    for i in range(3):
+        path = tmp_path / f"{i}.mp3"
+        path.write_bytes(f"segment-{i}".encode())
+        segment_files.append(str(path))
+
+    def run_pipeline(job, files, dialogue_config, on_segment=None, **kwargs):
+        # 対話のストリーミング生成中に2セグメント、その後の音声生成で全セグメントが通知される
+        for i in range(2):
+            on_segment(i, segment_files[i])
+        for i in range(3):
+            on_segment(i, segment_files[i])
+        return "episode.mp3", [DialogueLine(speaker="ホスト", text="こんにちは。")], "本文"
+
+    monkeypatch.setattr(feedback_processing, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(feedback_processing, "PipelineJob", functools.partial(PipelineJob, jobs_dir=str(tmp_path)))
+
+    outputs = list(feedback_processing.process_feedback_and_regenerate_stream(*UI_ARGS, None, None))
+
+    assert [output[0] for output in outputs[:-1]] == [b"segment-0", b"segment-1", b"segment-2"]
+    assert outputs[-1][1:] == ("episode.mp3", "ホスト: こんにちは。", "本文", None)
+
+def test_stream_handler_reports_input_errors(monkeypatch, tmp_path):
+    def run_pipeline(job, files, dialogue_config, **kwargs):
+        raise PipelineInputError("ファイルが読み込めません")
+
+    monkeypatch.setattr(feedback_processing, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(feedback_processing, "PipelineJob", functools.partial(PipelineJob, jobs_dir=str(tmp_path)))
+
+    outputs = list(feedback_processing.process_feedback_and_regenerate_stream(*UI_ARGS, None, None))
+
+    assert len(outputs) == 1
+    assert outputs[0][1:] == (None, None, None, "ファイルが読み込めません")
@@ -0,0 +1,162 @@
+import socket
+import sqlite3
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from components import feedback_processing, jobs
+from components.jobs import DONE, FAILED, QUEUED, RUNNING, JobRunner, JobStore
+
+PARAMS = {"text_model": "test-model", "strip_sections": ["references"]}
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+def test_enqueue_and_get(store):
+    assert store.enqueue("job-1", PARAMS)
+
+    record = store.get("job-1")
+    assert record.status == QUEUED
+    assert record.params == PARAMS
+    assert store.get("missing") is None
+
+def test_enqueue_does_not_rerun_running_or_done_jobs(store, tmp_path):
+    audio_path = tmp_path / "episode.mp3"
+    audio_path.write_bytes(b"mp3")
+    store.enqueue("job-1", PARAMS)
+
+    store.update("job-1", status=RUNNING)
+    assert not store.enqueue("job-1", PARAMS)
+
+    store.update("job-1", status=DONE, audio_path=str(audio_path))
+    assert not store.enqueue("job-1", PARAMS)
+
+@pytest.mark.parametrize("status", [FAILED, DONE])
+def test_failed_and_expired_jobs_are_requeued(store, tmp_path, status):
+    store.enqueue("job-1", PARAMS)
+    store.update("job-1", status=status, audio_path=str(tmp_path / "deleted.mp3"), error="失敗")
+
+    assert store.enqueue("job-1", PARAMS)
+    record = store.get("job-1")
+    assert record.status == QUEUED
+    assert record.error is None
+
+def test_unfinished_jobs_in_submission_order(store):
+    for job_id in ["job-1", "job-2", "job-3"]:
+        store.enqueue(job_id, PARAMS)
+    store.update("job-2", status=RUNNING)
+    store.update("job-3", status=DONE)
+
+    assert store.unfinished() == ["job-1", "job-2"]
+
+def test_connections_are_closed(store):
+    with store._connect() as conn:
+        conn.execute("SELECT 1")
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+def test_runner_claims_job_and_stores_result(store, tmp_path, monkeypatch):
+    audio_path = tmp_path / "episode.mp3"
+    audio_path.write_bytes(b"mp3")
+    executed = []
+
+    def execute_job(job_store, record, api_key):
+        executed.append(record.job_id)
+        assert job_store.get(record.job_id).status == RUNNING
+        return str(audio_path), "ホスト: こんにちは。", "原文"
+
+    monkeypatch.setattr(jobs, "execute_job", execute_job)
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.01)
+    runner = JobRunner(store, workers=1)
+    store.enqueue("job-1", PARAMS)
+    runner._start("job-1")
+
+    record = runner.wait("job-1", timeout=5)
+
+    assert executed == ["job-1"]
+    assert record.status == DONE
+    assert record.audio_path == str(audio_path)
+    assert record.transcript == "ホスト: こんにちは。"
+
+def test_get_job_result_reports_expired_audio(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(feedback_processing, "get_job_runner", lambda: SimpleNamespace(store=store))
+    audio_path = tmp_path / "episode.mp3"
+    audio_path.write_bytes(b"mp3")
+    store.enqueue("job-1", PARAMS)
+    store.update("job-1", status=DONE, audio_path=str(audio_path), transcript="ホスト: こんにちは。")
+
+    assert feedback_processing.get_job_result("job-1") == (str(audio_path), "ホスト: こんにちは。", None, None)
+
+    audio_path.unlink()
+    audio, transcript, _, error = feedback_processing.get_job_result("job-1")
+    assert audio is None
+    assert transcript == "ホスト: こんにちは。"
+    assert "削除されました" in error
+
+def test_only_one_worker_claims_a_queued_job(store, tmp_path):
+    store.enqueue("job-1", PARAMS)
+    other = JobStore(store.db_path)
+
+    assert store.claim("job-1", "host:1")
+    assert not other.claim("job-1", "host:2")
+    record = store.get("job-1")
+    assert record.status == RUNNING
+    assert record.owner == "host:1"
+
+def test_orphaned_jobs_are_requeued(store):
+    finished = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    dead_owner = f"{socket.gethostname()}:{finished.stdout.strip()}"
+    owners = {
+        "job-dead": dead_owner,
+        "job-alive": jobs.make_owner_id(),
+        "job-remote": "other-host:1",
+        "job-legacy": None,
+    }
+    for job_id, owner in owners.items():
+        store.enqueue(job_id, PARAMS)
+        store.update(job_id, status=RUNNING, owner=owner)
+
+    # 同じ識別子のジョブも、このプロセスで実行中でなければ前回のプロセスのジョブとして戻す
+    requeued = store.requeue_orphaned("this-host:1")
+    assert sorted(requeued) == ["job-dead", "job-legacy"]
+    assert store.requeue_orphaned(jobs.make_owner_id(), active={"job-alive"}) == []
+    assert store.requeue_orphaned(jobs.make_owner_id()) == ["job-alive"]
+    assert store.get("job-remote").status == RUNNING
+
+def test_owner_column_is_added_to_existing_databases(tmp_path):
+    db_path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, params TEXT NOT NULL, "
+            "audio_path TEXT, transcript TEXT, original_text TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+    conn.close()
+
+    store = JobStore(db_path)
+    store.enqueue("job-1", PARAMS)
+
+    assert store.claim("job-1", "host:1")
+    assert store.get("job-1").owner == "host:1"
+
+def test_resume_skips_jobs_claimed_by_another_process(store, monkeypatch):
+    started = []
+    runner = JobRunner(store, workers=1)
+    monkeypatch.setattr(runner, "_start", started.append)
+    for job_id in ["job-1", "job-2"]:
+        store.enqueue(job_id, PARAMS)
+    store.claim("job-2", "other-host:1")
+
+    assert runner.resume() == 1
+    assert started == ["job-1"]
+
+def test_unfinished_job_ids(store, tmp_path):
+    assert jobs.unfinished_job_ids(str(tmp_path / "missing.sqlite3")) == set()
+    for job_id in ["job-1", "job-2", "job-3"]:
+        store.enqueue(job_id, PARAMS)
+    store.claim("job-2", "host:1")
+    store.update("job-3", status=DONE)
+
+    assert jobs.unfinished_job_ids(store.db_path) == {"job-1", "job-2"}
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+import httpx
+import openai
+import pytest
+from components import pipeline
+from components.dialogue_generation import DialogueConfig, DialogueLine
+from components.pipeline import PipelineInputError, PipelineJob, RetryBudget, call_with_retries
+
+def api_error(error_class, status_code: int, headers=None):
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    response = httpx.Response(status_code, request=request, headers=headers)
+    return error_class("error", response=response, body=None)
+
+class Failing:
+    """指定した例外を順に送出し、最後に値を返す関数"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(pipeline.time, "sleep", recorded.append)
+    return recorded
+
+@pytest.mark.parametrize("error", [
+    PipelineInputError("入力ファイルがありません"),
+    FileNotFoundError("ffmpeg"),
+    PermissionError("denied"),
+    api_error(openai.AuthenticationError, 401),
+    api_error(openai.BadRequestError, 400),
+])
+def test_permanent_errors_fail_fast(sleeps, error):
+    fn = Failing(error)
+    budget = RetryBudget(total=3)
+
+    with pytest.raises(type(error)):
+        call_with_retries("テスト", budget, fn)
+
+    assert fn.calls == 1
+    assert budget.remaining == 3
+    assert sleeps == []
+
+@pytest.mark.parametrize("error", [
+    ValueError("対話生成に失敗しました"),
+    api_error(openai.InternalServerError, 500),
+    openai.APIConnectionError(request=httpx.Request("POST", "https://api.example.com")),
+])
+def test_transient_errors_are_retried(sleeps, error):
+    fn = Failing(error)
+    budget = RetryBudget(total=3)
+
+    assert call_with_retries("テスト", budget, fn) == "ok"
+    assert fn.calls == 2
+    assert budget.remaining == 2
+    assert sleeps == [1]
+
+def test_retry_after_is_respected(sleeps):
+    fn = Failing(api_error(openai.RateLimitError, 429, headers={"retry-after": "3"}))
+
+    assert call_with_retries("テスト", RetryBudget(total=3), fn) == "ok"
+    assert sleeps == [3.0]
+
+def test_retry_budget_is_exhausted(sleeps):
+    fn = Failing(*[ValueError("失敗")] * 5)
+
+    with pytest.raises(ValueError):
+        call_with_retries("テスト", RetryBudget(total=2), fn)
+    assert fn.calls == 3
+
+def test_tmp_paths_are_unique_per_writer(tmp_path):
+    job = PipelineJob("job", jobs_dir=str(tmp_path))
+    paths = []
+
+    def record():
+        paths.append(pipeline._tmp_path(job.episode_path))
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    thread.join()
+    record()
+
+    assert len(set(paths)) == 2
+    assert all(path.suffix == ".mp3" and path.parent == job.dir for path in paths)
+    assert str(os.getpid()) in paths[0].name
+
+def test_save_publishes_checkpoint(tmp_path):
+    job = PipelineJob("job", jobs_dir=str(tmp_path))
+
+    job.save("dialogue", {"lines": []})
+
+    assert job.load("dialogue") == {"lines": []}
+    assert sorted(path.name for path in job.dir.iterdir()) == ["dialogue.json", "segments"]
+
+def chunking_config() -> DialogueConfig:
+    return DialogueConfig(
+        model_name="test-model", template_type="podcast", intro_instructions="", text_instructions="",
+        scratch_pad_instructions="", prelude_dialog="", podcast_dialog_instructions="",
+        chunking_threshold_tokens=1, chunk_tokens=1, chunk_concurrency=1
+    )
+
+def test_section_analysis_retries_only_the_failed_chunk(sleeps, monkeypatch):
+    calls = []
+
+    def analyze_chunk(chunk, index, total, config):
+        calls.append(index)
+        if index == 1 and calls.count(1) == 1:
+            raise ValueError("一時的なエラー")
+        return f"メモ{index}", 1, 1
+
+    monkeypatch.setattr(pipeline, "analyze_chunk", analyze_chunk)
+    config = chunking_config()
+    budget = RetryBudget(total=3)
+
+    source = pipeline._dialogue_source_stage("aaaa\n\nbbbb\n\ncccc", config, budget)
+
+    assert sorted(calls) == [0, 1, 1, 2]
+    assert budget.remaining == 2
+    assert "メモ2" in source
+
+def test_section_analysis_fails_fast_on_permanent_errors(sleeps, monkeypatch):
+    def analyze_chunk(chunk, index, total, config):
+        raise api_error(openai.AuthenticationError, 401)
+
+    monkeypatch.setattr(pipeline, "analyze_chunk", analyze_chunk)
+    config = chunking_config()
+    budget = RetryBudget(total=3)
+
+    with pytest.raises(openai.AuthenticationError):
+        pipeline._dialogue_source_stage("aaaa\n\nbbbb", config, budget)
+    assert budget.remaining == 3
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    """先頭のセグメントほど遅く完了する音声生成"""
+    def synthesize_segment_file(path, index, text, voice, audio_model, api_key, cache, cache_key, budget):
+        time.sleep(0.05 * (3 - index))
+        path.write_bytes(text.encode("utf-8"))
+        return str(path)
+
+    monkeypatch.setattr(pipeline, "_synthesize_segment_file", synthesize_segment_file)
+    monkeypatch.setattr(pipeline, "get_segment_cache", lambda: None)
+
+DIALOGUE = [
+    DialogueLine(speaker="ホスト", text="こんにちは。"),
+    DialogueLine(speaker="ゲスト", text="よろしくお願いします。"),
+    DialogueLine(speaker="ホスト", text="それでは始めましょう。"),
+]
+
+@pytest.mark.parametrize("as_generator", [False, True])
+def test_segments_are_delivered_in_playback_order(fake_tts, tmp_path, as_generator):
+    job = PipelineJob("job", jobs_dir=str(tmp_path))
+    delivered = []
+    transcript = iter(DIALOGUE) if as_generator else DIALOGUE
+
+    paths = pipeline.synthesize_segments(
+        job, transcript, "alloy", "echo", "tts-1", None, RetryBudget(), on_segment=lambda i, p: delivered.append((i, p))
+    )
+
+    assert delivered == list(enumerate(paths))
+    assert [open(path, encoding="utf-8").read() for _, path in delivered] == [line.text for line in DIALOGUE]
@@ -0,0 +1,100 @@
+import pytest
+from components.text_cleanup import CleanupOptions, clean_pages, clean_text
+
+BODY = "本文の段落です。ポッドキャストで紹介する内容を説明します。\n" * 20
+
+MARKDOWN = """# 見出し
+
+- リストの項目
+  - 入れ子の項目
+    - さらに入れ子の項目
+
+```python
+def main():
+    if True:
+        print("hello")
+```
+
+The state-
+of-the-art method needs to co-
+operate with  aligned  columns.
+"""
+
+def test_markdown_keeps_indentation_and_hyphens():
+    cleaned, _ = clean_text(MARKDOWN)
+
+    assert "  - 入れ子の項目\n    - さらに入れ子の項目" in cleaned
+    assert "    if True:\n        print(\"hello\")" in cleaned
+    assert "state-\nof-the-art" in cleaned
+    assert "co-\noperate" in cleaned
+    assert "with  aligned  columns" in cleaned
+
+def test_markdown_removes_invisible_characters_and_extra_blank_lines():
+    cleaned, stats = clean_text("一行目\u200b \n\n\n\n二行目\n")
+
+    assert cleaned == "一行目\n\n二行目"
+    assert stats.removed_chars > 0
+
+def test_pdf_pages_are_dehyphenated_and_interior_spaces_collapsed():
+    pages, stats = clean_pages(["  The state-of-the-art recog-\nnition   model."])
+
+    assert pages == ["The state-of-the-art recognition model."]
+    assert stats.removed_chars_by_kind["hyphenation"] == 2
+
+def test_text_files_keep_number_only_lines():
+    text = "2024\n\nThis year was good.\nMore text here.\nAnd more.\n\n42\n"
+
+    cleaned, stats = clean_text(text)
+
+    assert cleaned == text.strip("\n")
+    assert "page_numbers" not in stats.removed_chars_by_kind
+
+def test_text_files_keep_lines_repeated_across_pages():
+    pages = ["## まとめ\n" + BODY for _ in range(4)]
+
+    cleaned, _ = clean_text("\f".join(pages))
+
+    assert cleaned.count("## まとめ") == 4
+
+def test_pdf_page_numbers_and_running_headers_are_removed():
+    bodies = [f"第{number}章の本文です。\n" * 5 for number in range(1, 5)]
+    pages = [f"Journal of Examples\n{body}\n{number}" for number, body in enumerate(bodies, 1)]
+
+    cleaned, stats = clean_pages(pages)
+
+    assert cleaned == [body.strip() for body in bodies]
+    assert stats.removed_chars_by_kind["repeated_lines"] > 0
+    assert stats.removed_chars_by_kind["page_numbers"] > 0
+
+@pytest.mark.parametrize("heading", [
+    "Appendix A: Proofs",
+    "APPENDIX",
+    "Appendices",
+    "付録A 実験の詳細",
+    "付録１　実験の詳細",
+    "付録",
+    "補遺：追加の結果",
+])
+def test_appendix_headings_are_dropped(heading):
+    text = f"{BODY}\n{heading}\n付録の本文です。\n"
+
+    cleaned, stats = clean_text(text, CleanupOptions(drop_appendix=True))
+
+    assert "付録の本文です。" not in cleaned
+    assert cleaned.endswith("説明します。")
+    assert stats.removed_chars_by_kind["appendix"] > 0
+
+@pytest.mark.parametrize("line", ["付録を参照してください。", "Appendixes are described in the manual."])
+def test_body_lines_are_not_appendix_headings(line):
+    text = f"{BODY}\n{line}\n"
+
+    cleaned, _ = clean_text(text, CleanupOptions(drop_appendix=True))
+
+    assert line in cleaned
+
+def test_references_are_dropped():
+    text = f"{BODY}\n参考文献\n[1] 著者. 論文の題名. 2024.\n"
+
+    cleaned, _ = clean_text(text, CleanupOptions(drop_references=True))
+
+    assert "論文の題名" not in cleaned